@@ -0,0 +1,227 @@
+"""
+Columnar expense analytics.
+
+A user's expenses are loaded once into NumPy columns: amount (float64, in the
+base currency when the row records one), day
+(int64 days since 1970-01-01), and category / location as dictionary-encoded
+int32 codes. Every statistic is then a mask plus a ``bincount`` or reduction
+over those columns instead of a Python loop over dicts.
+
+Columns are rows-in, read-only-out and assume the newest-first order the
+expense snapshots use, so ``head(n)`` is "the n most recent expenses".
+"""
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+
+GRANULARITIES = ('day', 'week', 'month')
+PERCENTILES = (50, 75, 90, 95, 99)
+_EPOCH = date(1970, 1, 1)
+_NO_DAY = np.iinfo(np.int64).min
+
+
+def _encode(values, count):
+    """Dictionary-encode strings in first-seen order: (codes int32, labels list)."""
+    lookup = {}
+    codes = np.fromiter((lookup.setdefault(v, len(lookup)) for v in values), dtype=np.int32, count=count)
+    return codes, list(lookup)
+
+
+def _amount(row):
+    # Rows written before base amounts were recorded sum their raw amount
+    value = row.get('amount_base')
+    return row.get('amount') if value is None else value
+
+
+def _day_number(value):
+    return (value - _EPOCH).days
+
+
+def _day_label(number):
+    return (_EPOCH + timedelta(days=int(number))).isoformat()
+
+
+def _week_start(days):
+    # Weeks start on Monday; 1970-01-01 was a Thursday
+    return days - (days + 3) % 7
+
+
+def _month_number(days):
+    return np.asarray(days, dtype='datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+
+class ExpenseColumns:
+    """Immutable column store for one user's expenses."""
+
+    def __init__(self, amounts, days, category_codes, categories, location_codes, locations):
+        self.amounts = amounts
+        self.days = days
+        self.category_codes = category_codes
+        self.categories = categories
+        self.location_codes = location_codes
+        self.locations = locations
+
+    @classmethod
+    def from_rows(cls, rows):
+        n = len(rows)
+        try:
+            amounts = np.fromiter((_amount(r) or 0 for r in rows), dtype=np.float64, count=n)
+        except (TypeError, ValueError):
+            # Numeric strings from older rows; convert the slow way once
+            amounts = np.array([float(_amount(r) or 0) for r in rows], dtype=np.float64)
+        # Expenses cluster on few distinct dates; parse each one once
+        day_codes, day_texts = _encode((str(r.get('date') or '')[:10] for r in rows), n)
+        distinct = np.array([_safe_day(d) for d in day_texts], dtype='datetime64[D]')
+        day_numbers = distinct.astype(np.int64)
+        day_numbers[np.isnat(distinct)] = _NO_DAY
+        days = day_numbers[day_codes] if n else np.empty(0, dtype=np.int64)
+        category_codes, categories = _encode((r.get('category') or 'Other' for r in rows), n)
+        location_codes, locations = _encode((r.get('location') or '' for r in rows), n)
+        return cls(amounts, days, category_codes, categories, location_codes, locations)
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def head(self, n):
+        return ExpenseColumns(
+            self.amounts[:n], self.days[:n], self.category_codes[:n], self.categories,
+            self.location_codes[:n], self.locations,
+        )
+
+    # -- selection --------------------------------------------------------
+    def mask(self, start=None, end=None, categories=None):
+        """Boolean mask for an inclusive date range and optional category names."""
+        selected = np.ones(len(self), dtype=bool)
+        if start is not None:
+            selected &= self.days >= _day_number(start)
+        if end is not None:
+            selected &= (self.days <= _day_number(end)) & (self.days != _NO_DAY)
+        if categories:
+            wanted = [i for i, c in enumerate(self.categories) if c in set(categories)]
+            selected &= np.isin(self.category_codes, wanted)
+        return selected
+
+    # -- aggregations -----------------------------------------------------
+    def total(self, mask=None):
+        return float(self.amounts.sum() if mask is None else self.amounts[mask].sum())
+
+    def count(self, mask=None):
+        return int(len(self) if mask is None else np.count_nonzero(mask))
+
+    def _group(self, codes, labels, mask):
+        if mask is not None:
+            codes, amounts = codes[mask], self.amounts[mask]
+        else:
+            amounts = self.amounts
+        sums = np.bincount(codes, weights=amounts, minlength=len(labels))
+        counts = np.bincount(codes, minlength=len(labels))
+        return {labels[i]: (float(sums[i]), int(counts[i])) for i in np.flatnonzero(counts)}
+
+    def by_category(self, mask=None):
+        """{category: (amount, count)}"""
+        return self._group(self.category_codes, self.categories, mask)
+
+    def by_location(self, mask=None):
+        """{location: (amount, count)}, excluding expenses without a location."""
+        groups = self._group(self.location_codes, self.locations, mask)
+        groups.pop('', None)
+        return groups
+
+    def buckets(self, granularity, start, end, mask=None):
+        """Dense series of (period start, amount, count) from ``start`` to ``end`` inclusive."""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f'granularity must be one of {", ".join(GRANULARITIES)}')
+        selected = self.mask(start, end)
+        if mask is not None:
+            selected &= mask
+        days, amounts = self.days[selected], self.amounts[selected]
+        first, last = _day_number(start), _day_number(end)
+        if granularity == 'day':
+            keys, edges = days - first, np.arange(first, last + 1)
+        elif granularity == 'week':
+            origin = _week_start(first)
+            keys = (_week_start(days) - origin) // 7
+            edges = np.arange(origin, _week_start(last) + 1, 7)
+        else:
+            origin = int(_month_number(first))
+            keys = _month_number(days) - origin
+            edges = np.arange(origin, int(_month_number(last)) + 1)
+        sums = np.bincount(keys, weights=amounts, minlength=len(edges))[:len(edges)]
+        counts = np.bincount(keys, minlength=len(edges))[:len(edges)]
+        if granularity == 'month':
+            labels = [str(m) for m in edges.astype('datetime64[M]')]
+        else:
+            labels = [_day_label(d) for d in edges]
+        return labels, sums, counts
+
+    def percentiles(self, mask=None, points=PERCENTILES):
+        amounts = self.amounts if mask is None else self.amounts[mask]
+        if not len(amounts):
+            return {}
+        values = np.percentile(amounts, points)
+        return {f'p{p}': round(float(v), 2) for p, v in zip(points, values)}
+
+
+def _safe_day(text):
+    try:
+        return np.datetime64(text or 'NaT', 'D')
+    except ValueError:
+        return np.datetime64('NaT')
+
+
+def rolling_mean(values, window):
+    """Trailing mean over ``window`` periods (shorter at the start of the series)."""
+    values = np.asarray(values, dtype=np.float64)
+    if window <= 1 or not len(values):
+        return values
+    sums = np.cumsum(values)
+    sums[window:] = sums[window:] - sums[:-window]
+    sizes = np.minimum(np.arange(1, len(values) + 1), window)
+    return sums / sizes
+
+
+def dashboard_stats(columns, today, trend_days=7):
+    """The dashboard's statistics; same shape as ``rollups.dashboard_from_expenses``."""
+    month_start = today.replace(day=1)
+    month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    labels, sums, _ = columns.buckets('day', today - timedelta(days=trend_days - 1), today)
+    return {
+        'total_expenses': columns.total(),
+        'monthly_total': columns.total(columns.mask(month_start, month_end)),
+        'transaction_count': columns.count(),
+        'categories': {name: amount for name, (amount, _) in columns.by_category().items()},
+        'weekly_trend': {label: float(value) for label, value in reversed(list(zip(labels, sums)))},
+    }
+
+
+class ColumnCache:
+    """Small LRU of built columns keyed by (user, snapshot version).
+
+    ``build`` turns a snapshot's rows into the cached value (ExpenseColumns by
+    default).
+    """
+
+    def __init__(self, max_entries=32, build=None):
+        self.max_entries = max_entries
+        self.build = build or ExpenseColumns.from_rows
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, version, rows):
+        key = (user_id, version)
+        with self._lock:
+            columns = self._entries.get(key)
+            if columns is not None:
+                self._entries.move_to_end(key)
+                return columns
+        columns = self.build(rows)
+        with self._lock:
+            # Older versions of this user's columns can never be asked for again
+            for stale in [k for k in self._entries if k[0] == user_id]:
+                del self._entries[stale]
+            self._entries[key] = columns
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return columns
@@ -1,4 +1,5 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, has_request_context, request, jsonify, send_file, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import os
 import requests
@@ -7,8 +8,39 @@ from datetime import datetime, timedelta
 import logging
 import random
 import io
+import hashlib
+import hmac
+import csv
 from dotenv import load_dotenv
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+from urllib.parse import urlsplit, parse_qsl, urlencode
+from werkzeug.datastructures import Headers
+from werkzeug.test import EnvironBuilder, run_wsgi_app
 from threading import Lock
+from supabase_client import get_client as get_supabase_client
+import numpy as np
+import rollups
+import analytics
+import base_amounts
+from rate_matrix import RateMatrix
+import rate_store
+import rate_history
+import expense_query
+import expense_cache
+import expense_import
+import write_behind
+import resilience
+import fanout
+import geocoding
+import geo_tiles
+import spatial_index
+import insight_jobs
+import metrics
+import health
+import profiler
+import event_stream
 
 # Load environment variables
 load_dotenv()
@@ -24,43 +56,248 @@ CORS(app)  # Enable CORS for all routes
 SUPABASE_URL = os.getenv('SUPABASE_URL', 'https://pqatgaqjvyzfohdrbrtb.supabase.co')
 SUPABASE_SERVICE_KEY = os.getenv('SUPABASE_SERVICE_KEY')
 EXCHANGE_API_KEY = os.getenv('EXCHANGE_API_KEY')
+# Provider base URLs; overridden to point the benchmarks at local stand-ins
+RATES_PRIMARY_URL = os.getenv('RATES_PRIMARY_URL', 'https://v6.exchangerate-api.com/v6').rstrip('/')
+RATES_FALLBACK_URL = os.getenv('RATES_FALLBACK_URL', 'https://api.exchangerate.host').rstrip('/')
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+# Required in X-Admin-Token by the /api/admin/* endpoints; unset disables them
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
 
-# In-memory rate cache (per-base)
+# In-memory rate cache. Only the anchor base is fetched; every other pair is
+# derived from it through the cross-rate matrix stored alongside the entry.
+_RATE_ANCHOR = os.getenv('RATE_ANCHOR', 'USD').upper()
 _rate_cache = {}
 _rate_cache_lock = Lock()
 _RATE_TTL_SECONDS = int(os.getenv('RATE_TTL_SECONDS', '600'))  # 10 minutes default
+# Past the TTL a cached entry is still served while one background refresh runs
+_RATE_MAX_STALE_SECONDS = int(os.getenv('RATE_MAX_STALE_SECONDS', '86400'))
+# Hard-coded approximations are retried much sooner than real rates
+_RATE_APPROX_TTL_SECONDS = int(os.getenv('RATE_APPROX_TTL_SECONDS', '60'))
+# Bases requested within this window are renewed by the refresher before they expire
+_RATE_HOT_SECONDS = int(os.getenv('RATE_HOT_SECONDS', '1800'))
+_RATE_REFRESH_AHEAD = float(os.getenv('RATE_REFRESH_AHEAD', '0.8'))  # fraction of the TTL
+_rate_inflight = {}  # base -> Event set when the single in-flight fetch finishes
+_rate_last_access = {}
+_rate_refresher = {'pid': None}
+# Snapshot on local disk shared by all workers on the host; survives restarts
+_rate_store = rate_store.from_env()
+# Daily rates filled by `python rate_history.py sync`; used for as-of (dated) conversions
+_rate_history = rate_history.from_env()
+_RATE_HISTORY_MAX_GAP_DAYS = int(os.getenv('RATE_HISTORY_MAX_GAP_DAYS', '7'))
+_RATE_HISTORY_MAX_DAYS = int(os.getenv('RATE_HISTORY_MAX_DAYS', '3660'))
+# Currency every expense's amount_base is recorded in; aggregates are in this currency
+_BASE_CURRENCY = os.getenv('BASE_CURRENCY', 'INR').upper()
 _SUPPORTED_CURRENCIES = {
     'USD', 'EUR', 'GBP', 'JPY', 'CAD', 'AUD', 'INR'
 }
+# Minimal hardcoded safety net to not break UI (approximate)
+_APPROX_RATES = {
+    'INR': {'USD': 0.0113, 'EUR': 0.0098, 'GBP': 0.0083, 'JPY': 1.24, 'CAD': 0.0141, 'AUD': 0.0153, 'INR': 1.0},
+    'USD': {'EUR': 0.90, 'GBP': 0.78, 'INR': 88.5, 'USD': 1.0},
+    'EUR': {'USD': 1.11, 'GBP': 0.86, 'INR': 98.2, 'EUR': 1.0},
+    'GBP': {'USD': 1.28, 'EUR': 1.16, 'INR': 114.0, 'GBP': 1.0},
+}
+
+# Start the fallback provider once the primary has been slower than this percentile
+# of its recent successful calls (or the fixed delay until enough samples exist)
+_RATE_HEDGE_PERCENTILE = float(os.getenv('RATE_HEDGE_PERCENTILE', '95'))
+_RATE_HEDGE_AFTER_SECONDS = float(os.getenv('RATE_HEDGE_AFTER_SECONDS', '1.5'))
+# Providers are called a few times per TTL, not per request, so two failures
+# in the window are enough to stop waiting on them
+_rates_primary_breaker = resilience.breaker('rates_primary', min_requests=2, window_seconds=max(60, 3 * _RATE_TTL_SECONDS))
+_rates_fallback_breaker = resilience.breaker('rates_fallback', min_requests=2, window_seconds=max(60, 3 * _RATE_TTL_SECONDS))
+_supabase_breaker = resilience.breaker('supabase')
+
+# Request, upstream and cache instrumentation; /api/metrics merges it across workers
+_metrics_registry = metrics.Registry()
+_HTTP_LATENCY = _metrics_registry.histogram(
+    'aureus_http_request_duration_seconds', 'Time spent handling requests', ('route', 'method', 'status'))
+_HTTP_IN_FLIGHT = _metrics_registry.gauge(
+    'aureus_http_requests_in_flight', 'Requests currently being handled', ('route',))
+_UPSTREAM_LATENCY = _metrics_registry.histogram(
+    'aureus_upstream_request_duration_seconds', 'Time spent in calls to upstream services',
+    ('upstream', 'endpoint', 'outcome'))
+_RATE_CACHE_EVENTS = _metrics_registry.counter(
+    'aureus_rate_cache_events_total', 'Rate cache lookups by result, and entries too old to serve', ('event',))
+_RATE_CACHE_UPDATES = _metrics_registry.counter(
+    'aureus_rate_cache_updates_total', 'Rate cache entries written, by rate source', ('source',))
+_metrics = metrics.from_env(_metrics_registry)
+
+# Live per-user events for /api/stream, published by whichever worker made the change
+_events = event_stream.from_env()
+# Rows carried by one stream event; bigger writes only tell open dashboards to reload
+_STREAM_MAX_ROWS = int(os.getenv('STREAM_MAX_ROWS', '50'))
+
+# CPU sampling on demand, and the slowest requests with their phase timings
+_profiler, _slow_requests, _PROFILE_SAMPLE = profiler.from_env()
+
+def _request_phase(name):
+    """Count the wrapped time as ``name`` in the current request's phase timings."""
+    timing = g.get('timing') if has_request_context() else None
+    return timing.phase(name) if timing is not None else nullcontext()
 
-# Helper function to make Supabase requests
+class _TimedJSONProvider(DefaultJSONProvider):
+    def response(self, *args, **kwargs):
+        with _request_phase('serialize'):
+            return super().response(*args, **kwargs)
+
+app.json = _TimedJSONProvider(app)
+
+def _upstream_outcome(exc):
+    if isinstance(exc, resilience.CircuitOpen):
+        return 'circuit_open'
+    response = getattr(exc, 'response', None)
+    if response is not None:
+        return f'http_{response.status_code // 100}xx'
+    if isinstance(exc, requests.exceptions.Timeout):
+        return 'timeout'
+    return 'error'
+
+@contextmanager
+def _upstream_timer(upstream, endpoint):
+    """Record how long the wrapped upstream call took and how it ended."""
+    started = time.perf_counter()
+    outcome = 'ok'
+    try:
+        with _request_phase('upstream'):
+            yield
+    except Exception as e:
+        outcome = _upstream_outcome(e)
+        raise
+    finally:
+        _metrics_registry.observe(_UPSTREAM_LATENCY, time.perf_counter() - started, upstream, endpoint, outcome)
+
+# Per-user expense snapshots shared by the read endpoints
+_expense_cache = expense_cache.from_env()
+
+def _is_upstream_failure(exc):
+    # A 4xx is a problem with our request, not a sign that the upstream is down
+    if isinstance(exc, requests.exceptions.HTTPError) and exc.response is not None:
+        return exc.response.status_code >= 500
+    return True
+
+# Helper function to make Supabase requests through the pooled per-worker client
 def supabase_request(method, endpoint, data=None, headers=None):
-    url = f"{SUPABASE_URL}/rest/v1/{endpoint}"
-    default_headers = {
-        'apikey': SUPABASE_SERVICE_KEY,
-        'Authorization': f'Bearer {SUPABASE_SERVICE_KEY}',
-        'Content-Type': 'application/json'
-    }
-    if headers:
-        default_headers.update(headers)
-    
     try:
-        if method == 'GET':
-            response = requests.get(url, headers=default_headers)
-        elif method == 'POST':
-            response = requests.post(url, json=data, headers=default_headers)
-        elif method == 'PUT':
-            response = requests.put(url, json=data, headers=default_headers)
-        elif method == 'DELETE':
-            response = requests.delete(url, headers=default_headers)
-        
-        response.raise_for_status()
-        return response.json() if response.content else {}
+        # Label by table or RPC; filters would make every user a separate series
+        with _upstream_timer('supabase', f"{method} {endpoint.split('?')[0]}"):
+            return _supabase_breaker.call(
+                get_supabase_client(SUPABASE_URL, SUPABASE_SERVICE_KEY).request,
+                method, endpoint, data=data, headers=headers,
+                is_failure=_is_upstream_failure
+            )
+    except resilience.CircuitOpen as e:
+        logger.warning(f"Supabase request skipped: {e}")
+        raise
     except requests.exceptions.RequestException as e:
         logger.error(f"Supabase request error: {e}")
         raise
 
+def _expenses_flushed(rows):
+    """Bring caches up to date with rows the write-behind queue stored (rollups follow by trigger)."""
+    for user_id in {str(row['user_id']) for row in rows}:
+        _expense_cache.invalidate(user_id)
+    for user_id in {str(row['user_id']) for row in rows}:
+        _insight_jobs.schedule(user_id)
+    _publish_expenses(rows)
+
+def _publish_expenses(rows):
+    """Push stored rows to their users' open streams, with the dashboard totals they add."""
+    by_user = {}
+    for row in rows:
+        by_user.setdefault(str(row['user_id']), []).append(row)
+    today = datetime.now().date()
+    for user_id, user_rows in by_user.items():
+        delta = rollups.dashboard_from_expenses(user_rows, today)
+        delta['weekly_trend'] = {day: amount for day, amount in delta['weekly_trend'].items() if amount}
+        if len(user_rows) > _STREAM_MAX_ROWS:
+            _events.publish(user_id, 'reload', {'reason': 'expenses', 'count': len(user_rows)})
+            continue
+        _events.publish(user_id, 'expenses', {
+            'expenses': user_rows,
+            'base_currency': _BASE_CURRENCY,
+            'delta': delta
+        })
+
+def _normalize_expenses(rows):
+    """Record base-currency amounts on rows about to be inserted, from the cached rate matrix."""
+    try:
+        missing = base_amounts.normalize(rows, _get_rate_matrix(), _BASE_CURRENCY)
+    except Exception as e:
+        # The rows are still stored; the backfill command fills them in later
+        logger.warning(f"Could not record {_BASE_CURRENCY} amounts: {e}")
+        return
+    if missing:
+        logger.warning(f"No quoted {_BASE_CURRENCY} rate for {missing} expense(s); stored without a base amount")
+
+def _display_factor(currency):
+    """(code, factor) turning base-currency totals into ``currency`` (the base itself when empty)."""
+    code = (currency or _BASE_CURRENCY).upper()
+    if code == _BASE_CURRENCY:
+        return code, 1.0
+    factor = _get_rate_matrix().rate(_BASE_CURRENCY, code)
+    if factor is None:
+        raise ValueError(f'Unsupported currency: {code}')
+    return code, factor
+
+# Optional (WRITE_BEHIND=1): acknowledge expense writes once journalled locally
+_write_behind = write_behind.from_env(supabase_request, on_flushed=_expenses_flushed)
+
+def _load_all_expenses(user_id):
+    return supabase_request('GET', f'app_7433469c6a_expenses?user_id=eq.{user_id}&order={expense_query.KEYSET_ORDER}')
+
+def _data_version(user_id):
+    """The user's rollup watermark stamp, or None when it cannot be read (cached data is then trusted)."""
+    try:
+        return rollups.fetch_data_version(supabase_request, user_id)
+    except Exception as e:
+        logger.warning(f"Watermark lookup failed for {user_id}: {e}")
+        return None
+
+def _snapshot(user_id, data_version=None):
+    """The user's expense snapshot, reloaded when it predates the current data version."""
+    if data_version is None:
+        data_version = _data_version(user_id)
+    return _expense_cache.get(user_id, lambda: _load_all_expenses(user_id), data_version)
+
+# Columnar form of recent snapshots, rebuilt only when a snapshot's version changes
+_expense_columns = analytics.ColumnCache(max_entries=int(os.getenv('ANALYTICS_COLUMN_CACHE_ENTRIES', '32')))
+
+def _user_columns(user_id, snapshot=None):
+    """A user's expenses as analytics columns, newest first, from the snapshot cache when possible."""
+    if snapshot is None:
+        snapshot = _snapshot(user_id)
+    return _expense_columns.get(user_id, snapshot['version'], snapshot['expenses'])
+
+# Located expenses as tile columns, for map views finer than the stored rollups
+_geo_columns = analytics.ColumnCache(
+    max_entries=int(os.getenv('ANALYTICS_COLUMN_CACHE_ENTRIES', '32')),
+    build=geo_tiles.GeoColumns.from_rows,
+)
+
+# Grids over located expenses for /api/expenses/nearby, each current for one snapshot-cache generation
+_spatial_indexes = spatial_index.IndexCache(max_entries=int(os.getenv('SPATIAL_INDEX_ENTRIES', '32')))
+
+def _user_spatial_index(user_id):
+    data_version = _data_version(user_id)
+    snapshot = _expense_cache.peek(user_id, data_version)
+    if snapshot is None:
+        # Expired or outdated: a grid built from the old snapshot may be outdated too
+        _spatial_indexes.discard(user_id)
+    return _spatial_indexes.get(
+        user_id, _expense_cache.generation(user_id),
+        lambda: (snapshot or _snapshot(user_id, data_version))['expenses'],
+    )
+
+def _compute_insights(user_id):
+    # Stamp before reading the data, so a write in between leaves the result looking stale
+    version = _data_version(user_id)
+    recent = _user_columns(user_id, _snapshot(user_id, version)).head(insight_jobs.RECENT_EXPENSES)
+    return insight_jobs.build(recent, _BASE_CURRENCY, version)
+
+# Insights are recomputed in the background after writes and served precomputed
+_insight_jobs = insight_jobs.from_env(supabase_request, _compute_insights)
+
 @app.route('/')
 def home():
     return app.send_static_file('index.html')
@@ -73,48 +310,233 @@ def api_home():
         'status': 'running',
         'endpoints': [
             '/api/health',
+            '/api/metrics',
             '/api/login',
             '/api/signup',
             '/api/expenses',
+            '/api/expenses/bulk',
+            '/api/expenses/import',
+            '/api/expenses/nearby',
             '/api/dashboard',
+            '/api/analytics',
             '/api/ai-insights',
             '/api/ai-insight',
             '/api/currency-convert',
+            '/api/currency-convert/batch',
+            '/api/batch',
+            '/api/stream',
+            '/api/stream/stats',
+            '/api/rates/history',
             '/api/csv-export',
             '/api/export',
             '/api/location',
+            '/api/geocode',
+            '/api/geocode/reverse',
             '/api/categories',
             '/api/currencies',
-            '/api/heatmap-data'
+            '/api/heatmap-data',
+            '/api/cache/stats',
+            '/api/circuit-breakers',
+            '/api/write-behind/stats',
+            '/api/admin/profile',
+            '/api/admin/slow-requests'
         ]
     })
 
+@app.before_request
+def _begin_request_metrics():
+    _metrics.start()
+    _health.start()
+    g.timing = profiler.RequestTiming()
+    g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.metrics_status = 500
+    _metrics_registry.inc(_HTTP_IN_FLIGHT, g.metrics_route)
+    if _profiler.worker_wide or _wants_profile():
+        g.profile_token = _profiler.begin(f'{request.method} {g.metrics_route}')
+
+def _is_admin():
+    token = request.headers.get('X-Admin-Token')
+    return bool(ADMIN_TOKEN and token) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+def _wants_profile():
+    if _PROFILE_SAMPLE and random.random() < _PROFILE_SAMPLE:
+        return True
+    return request.headers.get('X-Profile') == '1' and _is_admin()
+
+@app.after_request
+def _record_response_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+@app.teardown_request
+def _end_request_metrics(exc):
+    # Runs after streamed responses finish, and for requests that raised
+    timing = g.pop('timing', None)
+    if timing is None:
+        return
+    token = g.pop('profile_token', None)
+    if token is not None:
+        _profiler.end(token)
+    seconds, phases = timing.finish()
+    _metrics_registry.dec(_HTTP_IN_FLIGHT, g.metrics_route)
+    _metrics_registry.observe(_HTTP_LATENCY, seconds, g.metrics_route, request.method, str(g.metrics_status))
+    _slow_requests.offer(seconds, lambda: {
+        'route': g.metrics_route,
+        'method': request.method,
+        'path': request.path,
+        'status': g.metrics_status,
+        'duration_ms': round(seconds * 1000.0, 2),
+        'phases_ms': phases,
+        'profiled': token is not None,
+        'at': datetime.utcnow().isoformat(),
+    })
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition of every worker's metrics on this host."""
+    return Response(_metrics.exposition(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """This worker's sampled stacks (GET, collapsed text for flamegraph.pl) or sampling switch (POST).
+
+    POST {"enabled": true|false, "reset": true} turns worker-wide sampling
+    on or off for the worker that receives it. Single requests are sampled
+    with X-Profile: 1 plus the admin token, or by PROFILER_SAMPLE_PERCENT.
+    """
+    if not _is_admin():
+        return jsonify({'error': 'Admin token required'}), 403
+    if request.method == 'GET':
+        text = _profiler.collapsed()
+        if request.args.get('reset') == '1':
+            _profiler.reset()
+        return Response(text, mimetype='text/plain', headers={'X-Worker-PID': str(os.getpid())})
+
+    data = request.get_json(silent=True) or {}
+    if data.get('reset'):
+        _profiler.reset()
+    if 'enabled' in data:
+        if not data['enabled']:
+            _profiler.disable()
+        elif not _profiler.enable():
+            return jsonify({'error': 'Sampling needs SIGPROF and the main thread', 'pid': os.getpid()}), 400
+    return jsonify({'pid': os.getpid(), 'profiler': _profiler.stats()})
+
+@app.route('/api/admin/slow-requests', methods=['GET'])
+def admin_slow_requests():
+    """The slowest requests this worker served, with upstream/compute/serialize timings."""
+    if not _is_admin():
+        return jsonify({'error': 'Admin token required'}), 403
+    requests_seen = _slow_requests.snapshot()
+    if request.args.get('reset') == '1':
+        _slow_requests.reset()
+    return jsonify({'pid': os.getpid(), 'profiler': _profiler.stats(), 'requests': requests_seen})
+
+def _probe_supabase():
+    supabase_request('GET', 'app_7433469c6a_expense_rollups?select=user_id&limit=1')
+    return {'status': health.OK, 'circuit': _supabase_breaker.state}
+
+def _probe_exchange_rates():
+    # The providers are metered, so they are judged by the refresher's own fetches, not called here
+    circuits = {'primary': _rates_primary_breaker.state, 'fallback': _rates_fallback_breaker.state}
+    entry = _cache_entry(_RATE_ANCHOR)
+    with _rate_cache_lock:
+        approx = bool(_rate_cache.get(_RATE_ANCHOR, {}).get('approx'))
+    if entry is None:
+        status = health.DOWN if _rate_providers_down() else 'unknown'
+        return {'status': status, 'circuits': circuits, 'age_seconds': None}
+    _, age, ttl = entry
+    if approx:
+        status = 'degraded'
+    elif age > ttl:
+        status = health.DOWN if _rate_providers_down() else 'stale'
+    else:
+        status = health.OK
+    return {'status': status, 'circuits': circuits, 'age_seconds': age, 'approximate': approx}
+
+def _probe_gemini():
+    # Insights are generated locally; the key is only reported, never exercised
+    return {'status': 'configured' if GEMINI_API_KEY else 'not_configured'}
+
+_health = health.from_env({
+    'supabase': _probe_supabase,
+    'exchange_api': _probe_exchange_rates,
+    'gemini_api': _probe_gemini,
+}, critical=('supabase',))
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
+    """Dependency status from the latest background probe round (never probes inline)."""
+    status, report = _health.report()
     return jsonify({
-        'status': 'healthy',
+        'status': status,
         'timestamp': datetime.utcnow().isoformat(),
-        'services': {
-            'supabase': 'connected',
-            'exchange_api': 'available',
-            'gemini_api': 'available'
-        }
-    })
+        **report
+    }), 503 if status == 'unhealthy' else 200
+
+_EXPENSES_PAGE_DEFAULT = int(os.getenv('EXPENSES_PAGE_DEFAULT', '100'))
+_EXPENSES_PAGE_MAX = int(os.getenv('EXPENSES_PAGE_MAX', '1000'))
 
 @app.route('/api/expenses', methods=['GET'])
 def get_expenses():
+    """List expenses newest first, one keyset page at a time.
+
+    Query params: limit, after (opaque cursor from next_cursor) and fields
+    (comma-separated projection). Responses carry a strong ETag built from
+    the user's rollup watermark and the query, so an unchanged list
+    revalidates with 304 Not Modified before any page is read. When the
+    watermark cannot be read the ETag is a hash of the page body instead.
+    """
     try:
         user_id = request.headers.get('X-User-ID')
         if not user_id:
             return jsonify({'error': 'User ID required'}), 401
-        
-        # Get expenses from Supabase
-        expenses = supabase_request('GET', f'app_7433469c6a_expenses?user_id=eq.{user_id}&select=*,latitude,longitude&order=date.desc')
-        
-        return jsonify({
+
+        try:
+            limit = int(request.args.get('limit', _EXPENSES_PAGE_DEFAULT))
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        limit = max(1, min(limit, _EXPENSES_PAGE_MAX))
+        cursor = request.args.get('after')
+        try:
+            after = expense_query.decode_cursor(cursor) if cursor else None
+            select = expense_query.select_for_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # The triggers move the watermark on every write to the expenses table, whoever
+        # makes it, so it plus the query identifies the page without reading it
+        data_version = _data_version(user_id)
+        etag = None
+        if data_version is not None:
+            etag = hashlib.sha1(
+                f"{user_id}|{data_version}|{cursor}|{limit}|{select}".encode('utf-8')
+            ).hexdigest()
+            if request.if_none_match.contains(etag):
+                not_modified = Response(status=304)
+                not_modified.set_etag(etag)
+                not_modified.headers['Cache-Control'] = 'private, no-cache'
+                return not_modified
+
+        snapshot = _expense_cache.peek(user_id, data_version)
+
+        if snapshot is not None:
+            expenses, next_after = expense_query.page_from_rows(snapshot['expenses'], limit, after, select)
+        else:
+            expenses, next_after = expense_query.fetch_page(supabase_request, user_id, limit, after, select=select)
+
+        response = jsonify({
             'expenses': expenses,
-            'count': len(expenses)
+            'count': len(expenses),
+            'next_cursor': expense_query.encode_cursor(next_after) if next_after else None
         })
+        response.headers['Cache-Control'] = 'private, no-cache'
+        if etag:
+            response.set_etag(etag)
+        else:
+            # Without the watermark only the page itself can vouch for what it contains
+            response.add_etag()
+        return response.make_conditional(request)
     except Exception as e:
         logger.error(f"Error fetching expenses: {e}")
         return jsonify({'error': 'Failed to fetch expenses'}), 500
@@ -143,9 +565,34 @@ def create_expense():
             'notes': data.get('notes'),
             'currency': data.get('currency', 'USD')
         }
+        problem = expense_import.expense_problem(expense_data)
+        if problem:
+            return jsonify({'error': problem}), 400
+        _normalize_expenses([expense_data])
+
+        if _write_behind is not None:
+            # Journalled locally and inserted by the flusher; visible once flushed
+            client_key = request.headers.get('Idempotency-Key')
+            expense_data['idempotency_key'] = f'{user_id}:{client_key}' if client_key else write_behind.new_key()
+            _write_behind.submit(expense_data)
+            return jsonify({
+                'message': 'Expense accepted',
+                'expense': [expense_data],
+                'queued': True
+            }), 202
         
         # Create expense in Supabase
-        result = supabase_request('POST', 'app_7433469c6a_expenses', expense_data)
+        result = supabase_request('POST', 'app_7433469c6a_expenses', expense_data,
+                                  headers={'Prefer': 'return=representation'})
+
+        generation = _expense_cache.generation(user_id)
+        _expense_cache.invalidate(user_id)
+        # The new rows go straight into this worker's spatial index instead of forcing a rebuild
+        _spatial_indexes.add(user_id, result or [], generation, _expense_cache.generation(user_id))
+
+        # Rollups and map tiles are kept in step by triggers on the expenses table
+        _insight_jobs.schedule(user_id)
+        _publish_expenses(result or [])
         
         return jsonify({
             'message': 'Expense created successfully',
@@ -155,6 +602,167 @@ def create_expense():
         logger.error(f"Error creating expense: {e}")
         return jsonify({'error': 'Failed to create expense'}), 500
 
+_NEARBY_LIMIT_DEFAULT = 100
+_NEARBY_LIMIT_MAX = 1000
+
+@app.route('/api/expenses/nearby', methods=['GET'])
+def get_nearby_expenses():
+    """Expenses near a point or inside a box.
+
+    Query params: lat and lng with radius (meters) for everything within that
+    distance, and/or k for the k nearest (within radius if also given); or
+    bbox (south,west,north,east) instead of a point. Optional limit and fields
+    as for /api/expenses. Point queries return nearest first with a
+    distance_m on each expense; box queries return newest first.
+    """
+    try:
+        user_id = request.headers.get('X-User-ID')
+        if not user_id:
+            return jsonify({'error': 'User ID required'}), 401
+        try:
+            limit = max(1, min(int(request.args.get('limit', _NEARBY_LIMIT_DEFAULT)), _NEARBY_LIMIT_MAX))
+            k = int(request.args['k']) if request.args.get('k') else None
+        except ValueError:
+            return jsonify({'error': 'limit and k must be integers'}), 400
+        try:
+            select = expense_query.select_for_fields(request.args.get('fields'))
+            bbox = geo_tiles.parse_bbox(request.args['bbox']) if request.args.get('bbox') else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        try:
+            radius = float(request.args['radius']) if request.args.get('radius') else None
+            if bbox is None:
+                lat, lng = float(request.args.get('lat', '')), float(request.args.get('lng', ''))
+        except ValueError:
+            return jsonify({'error': 'lat, lng and radius must be numbers'}), 400
+        if bbox is None:
+            if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+                return jsonify({'error': 'lat must be within ±90 and lng within ±180'}), 400
+            if radius is None and k is None:
+                return jsonify({'error': 'Give radius, k or bbox'}), 400
+            if (radius is not None and radius <= 0) or (k is not None and not 1 <= k <= _NEARBY_LIMIT_MAX):
+                return jsonify({'error': f'radius must be positive and k between 1 and {_NEARBY_LIMIT_MAX}'}), 400
+
+        index = _user_spatial_index(user_id)
+        if bbox is not None:
+            mode = 'bbox'
+            total, rows = index.within_bbox(bbox, limit)
+            found = [(None, row) for row in rows]
+        elif k is not None:
+            mode = 'nearest'
+            found = index.nearest(lat, lng, min(k, limit), radius)
+            total = len(found)
+        else:
+            mode = 'radius'
+            total, found = index.within_radius(lat, lng, radius, limit)
+
+        columns = select.split(',') if select != '*' else None
+        expenses = []
+        for distance, row in found:
+            item = {c: row.get(c) for c in columns} if columns else dict(row)
+            if distance is not None:
+                item['distance_m'] = round(distance, 1)
+            expenses.append(item)
+        return jsonify({
+            'mode': mode,
+            'total': total,
+            'count': len(expenses),
+            'expenses': expenses
+        })
+    except Exception as e:
+        logger.error(f"Error finding nearby expenses: {e}")
+        return jsonify({'error': 'Failed to find nearby expenses'}), 500
+
+_IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '1000'))
+
+def _finish_import(user_id, result):
+    """Invalidate caches once per import instead of once per row; rollups follow by trigger."""
+    if result.inserted:
+        _expense_cache.invalidate(user_id)
+        _insight_jobs.schedule(user_id)
+        # Imported rows are streamed into Supabase, not kept; open dashboards reload instead
+        _events.publish(user_id, 'reload', {'reason': 'import', 'count': result.inserted})
+    status = 201 if result.inserted else 200
+    success = result.failed == 0 and result.invalid == 0 and result.aborted is None
+    return jsonify({'success': success, **result.as_dict()}), status
+
+def _amount_sign(default):
+    """The ?amount_sign= sign convention for imported amounts; raises ValueError."""
+    sign = (request.args.get('amount_sign') or default).lower()
+    if sign not in expense_import.AMOUNT_SIGNS:
+        raise ValueError(f"amount_sign must be one of {', '.join(expense_import.AMOUNT_SIGNS)}")
+    return sign
+
+@app.route('/api/expenses/bulk', methods=['POST'])
+def create_expenses_bulk():
+    """Insert many expenses at once: a JSON list, or {"expenses": [...]}.
+
+    Rows are validated individually; invalid rows are reported by position
+    and the rest are still inserted in multi-row batches. Amounts are
+    expenses when positive unless ?amount_sign=negative (or auto) says
+    otherwise; rows of the other sign are skipped as credits.
+    """
+    try:
+        user_id = request.headers.get('X-User-ID')
+        if not user_id:
+            return jsonify({'error': 'User ID required'}), 401
+
+        data = request.get_json(silent=True)
+        rows = data.get('expenses') if isinstance(data, dict) else data
+        if not isinstance(rows, list):
+            return jsonify({'error': 'A list of expenses is required'}), 400
+        try:
+            amount_sign = _amount_sign('positive')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        result = expense_import.ingest(supabase_request, user_id, rows, batch_size=_IMPORT_BATCH_SIZE,
+                                       normalize=_normalize_expenses, amount_sign=amount_sign)
+        return _finish_import(user_id, result)
+    except Exception as e:
+        logger.error(f"Error creating expenses in bulk: {e}")
+        return jsonify({'error': 'Failed to create expenses'}), 500
+
+@app.route('/api/expenses/import', methods=['POST'])
+def import_expenses():
+    """Import a CSV or bank-statement export, uploaded as multipart ``file`` or a raw text/csv body.
+
+    The file is parsed as a stream, so its size does not change memory use.
+    A single signed Amount column is read with ?amount_sign=positive|negative
+    (the sign expenses carry); the default, auto, takes the sign most amounts
+    in the first batch have. Credits are skipped and reported.
+    """
+    try:
+        user_id = request.headers.get('X-User-ID')
+        if not user_id:
+            return jsonify({'error': 'User ID required'}), 401
+
+        try:
+            amount_sign = _amount_sign('auto')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        currency = (request.args.get('currency') or 'USD').upper()
+        if len(currency) != 3 or not (currency.isascii() and currency.isalpha()):
+            return jsonify({'error': 'currency must be a 3-letter code'}), 400
+
+        upload = request.files.get('file')
+        stream = upload.stream if upload is not None else request.stream
+        try:
+            rows = expense_import.iter_csv_rows(stream)
+        except (ValueError, csv.Error) as e:
+            return jsonify({'error': f'Could not read CSV: {e}'}), 400
+        result = expense_import.ingest(
+            supabase_request, user_id, rows,
+            batch_size=_IMPORT_BATCH_SIZE,
+            default_currency=currency,
+            normalize=_normalize_expenses,
+            amount_sign=amount_sign
+        )
+        return _finish_import(user_id, result)
+    except Exception as e:
+        logger.error(f"Error importing expenses: {e}")
+        return jsonify({'error': 'Failed to import expenses'}), 500
+
 @app.route('/api/dashboard', methods=['GET'])
 def get_dashboard_data():
     try:
@@ -162,126 +770,174 @@ def get_dashboard_data():
         if not user_id:
             return jsonify({'error': 'User ID required'}), 401
         
-        # Get user expenses
-        expenses = supabase_request('GET', f'app_7433469c6a_expenses?user_id=eq.{user_id}')
-        
-        # Calculate dashboard statistics
-        current_month = datetime.now().month
-        current_year = datetime.now().year
-        
-        total_expenses = sum(float(expense['amount']) for expense in expenses)
-        
-        monthly_expenses = [
-            expense for expense in expenses
-            if datetime.fromisoformat(expense['date']).month == current_month
-            and datetime.fromisoformat(expense['date']).year == current_year
-        ]
-        monthly_total = sum(float(expense['amount']) for expense in monthly_expenses)
-        
-        # Category breakdown
-        categories = {}
-        for expense in expenses:
-            category = expense['category']
-            categories[category] = categories.get(category, 0) + float(expense['amount'])
-        
-        # Weekly trend (last 7 days)
-        weekly_trend = {}
-        for i in range(7):
-            date = (datetime.now() - timedelta(days=i)).date().isoformat()
-            weekly_trend[date] = sum(
-                float(expense['amount']) for expense in expenses
-                if expense['date'] == date
-            )
-        
+        today = datetime.now().date()
+        try:
+            currency, factor = _display_factor(request.args.get('currency'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # A cached snapshot still at the current watermark needs no further upstream
+        # call; otherwise read the maintained rollups, and fall back to a full scan
+        # for users without them
+        data_version = _data_version(user_id)
+        snapshot = _expense_cache.peek(user_id, data_version)
+        stats = None
+        if snapshot is None:
+            def read_rollups():
+                try:
+                    return rollups.dashboard_from_rollups(supabase_request, user_id, today)
+                except Exception as e:
+                    logger.warning(f"Rollup read failed for {user_id}, using full scan: {e}")
+                    return None
+
+            # The rollups and the recent rows are independent reads; issue them together
+            with _request_phase('upstream'):
+                stats, recent_expenses = fanout.gather(
+                    read_rollups,
+                    lambda: supabase_request(
+                        'GET', f'app_7433469c6a_expenses?user_id=eq.{user_id}&order={expense_query.KEYSET_ORDER}&limit=10'
+                    )
+                )
+
+        if stats is None:
+            if snapshot is None:
+                snapshot = _expense_cache.fill(user_id, lambda: _load_all_expenses(user_id), data_version)
+            stats = analytics.dashboard_stats(_user_columns(user_id, snapshot), today)
+            recent_expenses = snapshot['expenses'][:10]
+
+        if factor != 1.0:
+            # Totals are sums of base amounts, so one rate converts each of them
+            stats = {
+                **stats,
+                'total_expenses': stats['total_expenses'] * factor,
+                'monthly_total': stats['monthly_total'] * factor,
+                'categories': {k: v * factor for k, v in stats['categories'].items()},
+                'weekly_trend': {k: v * factor for k, v in stats['weekly_trend'].items()},
+            }
+
         return jsonify({
-            'total_expenses': total_expenses,
-            'monthly_total': monthly_total,
-            'transaction_count': len(expenses),
-            'categories': categories,
-            'weekly_trend': weekly_trend,
-            'recent_expenses': expenses[:10]  # Last 10 expenses
+            **stats,
+            'currency': currency,
+            'recent_expenses': recent_expenses  # Last 10 expenses
         })
     except Exception as e:
         logger.error(f"Error fetching dashboard data: {e}")
         return jsonify({'error': 'Failed to fetch dashboard data'}), 500
 
+_ANALYTICS_DEFAULT_PERIODS = {'day': 30, 'week': 12, 'month': 12}
+_ANALYTICS_MAX_PERIODS = int(os.getenv('ANALYTICS_MAX_PERIODS', '3660'))
+
+def _parse_day(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'{name} must be a YYYY-MM-DD date') from None
+
+@app.route('/api/analytics', methods=['GET'])
+def get_analytics():
+    """Spending statistics over a date range.
+
+    Query params: granularity (day|week|month), from and to (YYYY-MM-DD,
+    inclusive), category (comma-separated), rolling (window in periods for a
+    trailing average), top (number of locations to list) and currency
+    (amounts are in the base currency unless another is asked for).
+    """
+    try:
+        user_id = request.headers.get('X-User-ID')
+        if not user_id:
+            return jsonify({'error': 'User ID required'}), 401
+
+        granularity = request.args.get('granularity', 'day')
+        if granularity not in analytics.GRANULARITIES:
+            return jsonify({'error': f"granularity must be one of {', '.join(analytics.GRANULARITIES)}"}), 400
+        try:
+            end = _parse_day(request.args['to'], 'to') if request.args.get('to') else datetime.now().date()
+            if request.args.get('from'):
+                start = _parse_day(request.args['from'], 'from')
+            else:
+                span = {'day': 1, 'week': 7, 'month': 31}[granularity] * _ANALYTICS_DEFAULT_PERIODS[granularity]
+                start = end - timedelta(days=span - 1)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        try:
+            rolling = int(request.args.get('rolling', 0))
+            top = int(request.args.get('top', 10))
+        except ValueError:
+            return jsonify({'error': 'rolling and top must be integers'}), 400
+        try:
+            currency, factor = _display_factor(request.args.get('currency'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if start > end:
+            return jsonify({'error': 'from must not be after to'}), 400
+        periods = {
+            'day': (end - start).days + 1,
+            'week': (end - start).days // 7 + 2,
+            'month': (end.year - start.year) * 12 + end.month - start.month + 1,
+        }[granularity]
+        if periods > _ANALYTICS_MAX_PERIODS:
+            return jsonify({'error': f'At most {_ANALYTICS_MAX_PERIODS} periods per request'}), 400
+        categories = [c.strip() for c in request.args.get('category', '').split(',') if c.strip()]
+
+        columns = _user_columns(user_id)
+        selected = columns.mask(start, end, categories)
+        labels, sums, counts = columns.buckets(granularity, start, end, columns.mask(categories=categories))
+        sums = sums * factor
+
+        series = [
+            {'period': label, 'amount': round(float(amount), 2), 'count': int(count)}
+            for label, amount, count in zip(labels, sums, counts)
+        ]
+        if rolling > 1:
+            for point, value in zip(series, analytics.rolling_mean(sums, rolling)):
+                point['rolling_average'] = round(float(value), 2)
+
+        total = columns.total(selected) * factor
+        count = columns.count(selected)
+        locations = sorted(columns.by_location(selected).items(), key=lambda item: item[1][0], reverse=True)
+        return jsonify({
+            'granularity': granularity,
+            'currency': currency,
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'total': round(total, 2),
+            'count': count,
+            'average': round(total / count, 2) if count else None,
+            'series': series,
+            'categories': {
+                name: {'amount': round(amount * factor, 2), 'count': n}
+                for name, (amount, n) in columns.by_category(selected).items()
+            },
+            'locations': [
+                {'location': name, 'amount': round(amount * factor, 2), 'count': n}
+                for name, (amount, n) in locations[:max(0, top)]
+            ],
+            'percentiles': {k: round(v * factor, 2) for k, v in columns.percentiles(selected).items()}
+        })
+    except Exception as e:
+        logger.error(f"Error computing analytics: {e}")
+        return jsonify({'error': 'Failed to compute analytics'}), 500
+
 @app.route('/api/ai-insights', methods=['POST', 'GET'])
 def generate_ai_insights():
-    """Generate AI-powered financial insights with mock/fallback logic"""
+    """Serve the user's precomputed insights; computed inline only when none are stored yet."""
     try:
         user_id = request.headers.get('X-User-ID', 'demo-user')
-        
-        # Try to get expenses data from request or fetch from database
-        if request.method == 'POST':
-            data = request.get_json() or {}
-            expenses_data = data.get('expenses_data', {})
-        else:
-            expenses_data = {}
-        
-        # Try to fetch actual expenses
-        try:
-            expenses = supabase_request('GET', f'app_7433469c6a_expenses?user_id=eq.{user_id}&limit=100')
-            
-            # Calculate insights from actual data
-            total_spent = sum(float(e.get('amount', 0)) for e in expenses)
-            categories = {}
-            locations = {}
-            
-            for expense in expenses:
-                cat = expense.get('category', 'Other')
-                categories[cat] = categories.get(cat, 0) + float(expense.get('amount', 0))
-                
-                loc = expense.get('location', '')
-                if loc:
-                    locations[loc] = locations.get(loc, 0) + float(expense.get('amount', 0))
-            
-            top_category = max(categories.items(), key=lambda x: x[1])[0] if categories else 'Food'
-            top_category_amount = categories.get(top_category, 0)
-            
-            top_location = max(locations.items(), key=lambda x: x[1])[0] if locations else 'VIT Canteen'
-            top_location_amount = locations.get(top_location, 0)
-            
-        except:
-            # Fallback to mock data
-            total_spent = 850.50
-            top_category = 'Food'
-            top_category_amount = 320.50
-            top_location = 'VIT Canteen'
-            top_location_amount = 245.00
-        
-        # Generate varied AI insights
-        insight_templates = [
-            {
-                'spendingPattern': f'Your {top_category.lower()} expenses account for {round(top_category_amount/total_spent*100 if total_spent > 0 else 0, 1)}% of your total spending. Consider meal planning to reduce costs.',
-                'budgetRecommendation': f'Based on your spending of ₹{total_spent:.2f}, I recommend a monthly budget of ₹{total_spent * 1.15:.2f} with 15% buffer for unexpected expenses.',
-                'savingsTip': 'Try the 50/30/20 budgeting rule: 50% needs, 30% wants, 20% savings. This could help you save an extra ₹500-1000 monthly.',
-                'locationInsight': f'You spent the most around {top_location} area (₹{top_location_amount:.2f}). Consider exploring cost-effective alternatives nearby.'
-            },
-            {
-                'spendingPattern': f'Your spending increased by 15% this week, mainly in {top_category.lower()} category. Try to identify and reduce impulse purchases.',
-                'budgetRecommendation': 'Set category-wise budgets: Food ₹800, Transport ₹400, Entertainment ₹300. Track daily to stay on target.',
-                'savingsTip': 'Small savings add up! Skip one coffee shop visit per week to save ₹1,200 annually.',
-                'locationInsight': 'VIT campus area shows high transaction frequency. Consider using mess facilities more often to reduce outside food expenses.'
-            },
-            {
-                'spendingPattern': f'You\'ve maintained consistent spending in {top_category.lower()}. Great job! Focus on optimizing other categories now.',
-                'budgetRecommendation': 'Your current spending pattern suggests you could save ₹500/month by reducing discretionary expenses by just 10%.',
-                'savingsTip': 'Consider carpooling or using campus transport to save ₹200-300 monthly on transportation.',
-                'locationInsight': f'{top_location} is your top spending location. Explore student discounts and combo offers to maximize value.'
-            }
-        ]
-        
-        selected_insights = random.choice(insight_templates)
-        
+
+        record, fresh = _insight_jobs.latest(user_id)
+        if record is None:
+            record, fresh = _insight_jobs.run_now(user_id), True
+        elif not fresh:
+            # Serve what we have; the refresh lands before the next dashboard load
+            _insight_jobs.schedule(user_id)
+
         return jsonify({
             'success': True,
-            'insights': selected_insights,
-            'timestamp': datetime.utcnow().isoformat(),
-            'summary': {
-                'total_spent': total_spent,
-                'top_category': top_category,
-                'top_location': top_location
-            }
+            'insights': record['insights'],
+            'timestamp': record['generated_at'],
+            'summary': record['summary'],
+            'data_version': record['data_version'],
+            'stale': not fresh
         })
         
     except Exception as e:
@@ -302,71 +958,240 @@ def generate_ai_insights():
 def _now_ts():
     return int(datetime.utcnow().timestamp())
 
-def _cache_get(base: str):
+def _sync_rate_store():
+    """Adopt entries another worker (or a previous run) wrote to the shared store."""
+    entries = _rate_store.load_if_changed()
+    if not entries:
+        return
+    with _rate_cache_lock:
+        for base, stored in entries.items():
+            current = _rate_cache.get(base)
+            if current is not None and current['ts'] > stored['ts']:
+                continue
+            try:
+                matrix = RateMatrix.from_dict(stored['matrix'])
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Skipping malformed stored rates for {base}: {e}")
+                continue
+            _rate_cache[base] = {
+                'rates': stored['rates'], 'matrix': matrix, 'ts': stored['ts'], 'approx': stored['approx']
+            }
+
+def _cache_entry(base: str):
+    """Return (matrix, age_seconds, ttl) for a base, fresh or stale, or None."""
+    _sync_rate_store()
     with _rate_cache_lock:
         entry = _rate_cache.get(base.upper())
         if not entry:
             return None
-        if _now_ts() - entry['ts'] > _RATE_TTL_SECONDS:
-            return None
-        return entry['rates']
+        ttl = _RATE_APPROX_TTL_SECONDS if entry['approx'] else _RATE_TTL_SECONDS
+        return entry['matrix'], _now_ts() - entry['ts'], ttl
+
+def _cache_get(base: str):
+    entry = _cache_entry(base)
+    if not entry or entry[1] > entry[2]:
+        return None
+    return entry[0]
 
-def _cache_set(base: str, rates: dict):
+def _cache_set(base: str, rates: dict, source: str):
+    base = base.upper()
+    now = _now_ts()
     with _rate_cache_lock:
-        _rate_cache[base.upper()] = {'rates': rates, 'ts': _now_ts()}
+        current = _rate_cache.get(base)
+        # Currencies missing from this response keep their last quote (and its provenance)
+        matrix = RateMatrix.build(
+            _SUPPORTED_CURRENCIES, base, rates, source, fetched_at=time.time(),
+            previous=current['matrix'] if current else None
+        )
+        _rate_cache[base] = {'rates': rates, 'matrix': matrix, 'ts': now, 'approx': source == 'approx'}
+    _metrics_registry.inc(_RATE_CACHE_UPDATES, source)
+    try:
+        _rate_store.save(base, {
+            'rates': rates, 'matrix': matrix.to_dict(), 'ts': now, 'approx': source == 'approx'
+        })
+    except OSError as e:
+        logger.warning(f"Could not persist rates for {base}: {e}")
+    try:
+        _events.publish(event_stream.BROADCAST, 'rates', {
+            'base': _BASE_CURRENCY, 'rates': matrix.row(_BASE_CURRENCY), 'source': source
+        })
+    except Exception as e:
+        logger.warning(f"Could not announce refreshed rates: {e}")
+
+_provider_sessions = {}
+
+def _provider_session():
+    """Keep-alive session shared by the rate-provider calls of this worker process."""
+    session = _provider_sessions.get(os.getpid())
+    if session is None:
+        session = _provider_sessions[os.getpid()] = requests.Session()
+    return session
 
 def _fetch_rates_primary(base: str) -> dict:
     if not EXCHANGE_API_KEY:
         raise RuntimeError('Missing EXCHANGE_API_KEY')
-    url = f"https://v6.exchangerate-api.com/v6/{EXCHANGE_API_KEY}/latest/{base}"
-    resp = requests.get(url, timeout=10)
-    resp.raise_for_status()
-    data = resp.json()
+    url = f"{RATES_PRIMARY_URL}/{EXCHANGE_API_KEY}/latest/{base}"
+    with _upstream_timer('rates_primary', 'latest'):
+        resp = _provider_session().get(url, timeout=10)
+        resp.raise_for_status()
+        data = resp.json()
     if data.get('result') != 'success':
         raise RuntimeError(f"Primary provider error: {data.get('error-type')}")
     return data.get('conversion_rates', {})
 
 def _fetch_rates_fallback(base: str) -> dict:
     # exchangerate.host is free and does not require a key
-    url = f"https://api.exchangerate.host/latest?base={base}"
-    resp = requests.get(url, timeout=10)
-    resp.raise_for_status()
-    data = resp.json()
+    url = f"{RATES_FALLBACK_URL}/latest?base={base}"
+    with _upstream_timer('rates_fallback', 'latest'):
+        resp = _provider_session().get(url, timeout=10)
+        resp.raise_for_status()
+        data = resp.json()
     if not data.get('success', True):
         raise RuntimeError('Fallback provider error')
     return data.get('rates', {})
 
-def _get_rates(base: str) -> dict:
-    base = base.upper()
-    # Try cache first
-    cached = _cache_get(base)
-    if cached:
-        return cached
-    # Try primary then fallback, then seed minimal defaults as last resort
-    try:
-        rates = _fetch_rates_primary(base)
-    except Exception as e1:
-        logger.warning(f"Primary rates fetch failed for base {base}: {e1}")
-        try:
-            rates = _fetch_rates_fallback(base)
-        except Exception as e2:
-            logger.error(f"Fallback rates fetch failed for base {base}: {e2}")
-            # Minimal hardcoded safety net to not break UI (approximate)
-            approx = {
-                'INR': {'USD': 0.0113, 'EUR': 0.0098, 'GBP': 0.0083, 'JPY': 1.24, 'CAD': 0.0141, 'AUD': 0.0153, 'INR': 1.0},
-                'USD': {'EUR': 0.90, 'GBP': 0.78, 'INR': 88.5, 'USD': 1.0},
-                'EUR': {'USD': 1.11, 'GBP': 0.86, 'INR': 98.2, 'EUR': 1.0},
-                'GBP': {'USD': 1.28, 'EUR': 1.16, 'INR': 114.0, 'GBP': 1.0},
-            }
-            rates = approx.get(base, {'USD': 1.0})
+def _approx_rates(base: str) -> dict:
+    if base in _APPROX_RATES and _SUPPORTED_CURRENCIES <= set(_APPROX_RATES[base]):
+        return _APPROX_RATES[base]
+    # The INR row is the only complete one; rebase it onto the requested base
+    inr = _APPROX_RATES['INR']
+    if base not in inr:
+        return {base: 1.0}
+    return {c: v / inr[base] for c, v in inr.items()}
+
+def _rate_hedge_delay():
+    observed = _rates_primary_breaker.latency_percentile(_RATE_HEDGE_PERCENTILE)
+    return _RATE_HEDGE_AFTER_SECONDS if observed is None else max(0.2, observed)
+
+def _fetch_rates(base: str):
+    """Fetch fresh rates for a base; returns (rates, source)."""
+    # Primary first, hedged with the fallback when it is slow or failing; providers
+    # whose circuit is open are skipped at once. Minimal defaults are the last resort.
+    try:
+        source, rates = resilience.hedged([
+            ('primary', lambda: _rates_primary_breaker.call(_fetch_rates_primary, base)),
+            ('fallback', lambda: _rates_fallback_breaker.call(_fetch_rates_fallback, base)),
+        ], hedge_after=_rate_hedge_delay())
+    except resilience.AllUpstreamsFailed as e:
+        logger.error(f"All rate providers failed for base {base}: {e}")
+        rates, source = _approx_rates(base), 'approx'
     # Keep only supported keys if _SUPPORTED_CURRENCIES defined
     if _SUPPORTED_CURRENCIES:
         filtered = {k: v for k, v in rates.items() if k in _SUPPORTED_CURRENCIES}
         # Ensure self rate
         filtered[base] = 1.0
         rates = filtered
-    _cache_set(base, rates)
-    return rates
+    return rates, source
+
+def _refresh_rates(base: str, wait: bool = True):
+    """Refresh one base with at most one upstream fetch in flight per base.
+
+    Callers that find a fetch already running, in this process or in another
+    worker holding the store's refresh lock, either wait for it (wait=True) or
+    return immediately.
+    """
+    with _rate_cache_lock:
+        done = _rate_inflight.get(base)
+        leader = done is None
+        if leader:
+            done = _rate_inflight[base] = threading.Event()
+    if not leader:
+        if wait:
+            done.wait(30)
+        return
+    try:
+        with _rate_store.refresh_lock(timeout=30 if wait else 0) as acquired:
+            if not acquired:
+                # Another worker is refreshing; its result reaches us through the store
+                return
+            entry = _cache_entry(base)
+            if entry and entry[1] < entry[2] * _RATE_REFRESH_AHEAD:
+                # Someone refreshed while we waited for the lock
+                return
+            rates, source = _fetch_rates(base)
+            # Never let the approximate safety net replace real rates we still hold
+            with _rate_cache_lock:
+                current = _rate_cache.get(base)
+            if source != 'approx' or current is None or current['approx']:
+                _cache_set(base, rates, source)
+    except Exception as e:
+        logger.error(f"Rates refresh failed for base {base}: {e}")
+    finally:
+        with _rate_cache_lock:
+            _rate_inflight.pop(base, None)
+        done.set()
+
+def _refresh_rates_async(base: str):
+    with _rate_cache_lock:
+        if base in _rate_inflight:
+            return
+    threading.Thread(target=_refresh_rates, args=(base, False), name=f'rates-refresh-{base}', daemon=True).start()
+
+def _rate_refresher_loop():
+    """Renew recently used bases shortly before they expire so readers never wait."""
+    interval = max(5, min(60, _RATE_TTL_SECONDS // 4))
+    while True:
+        time.sleep(interval)
+        now = _now_ts()
+        with _rate_cache_lock:
+            hot = [b for b, seen in _rate_last_access.items() if now - seen <= _RATE_HOT_SECONDS]
+        for base in hot:
+            entry = _cache_entry(base)
+            if entry is None or entry[1] >= entry[2] * _RATE_REFRESH_AHEAD:
+                _refresh_rates(base, wait=False)
+
+def _ensure_rate_refresher():
+    # One refresher per worker process, started on first use (never in the gunicorn master)
+    if _rate_refresher['pid'] == os.getpid():
+        return
+    with _rate_cache_lock:
+        if _rate_refresher['pid'] == os.getpid():
+            return
+        _rate_refresher['pid'] = os.getpid()
+    threading.Thread(target=_rate_refresher_loop, name='rates-refresher', daemon=True).start()
+
+def _rate_providers_down():
+    return all(b.state == resilience.OPEN for b in (_rates_primary_breaker, _rates_fallback_breaker))
+
+def _get_rate_matrix() -> RateMatrix:
+    """The cross-rate matrix for the anchor base, refreshed with stale-while-revalidate."""
+    base = _RATE_ANCHOR
+    _ensure_rate_refresher()
+    with _rate_cache_lock:
+        _rate_last_access[base] = _now_ts()
+
+    entry = _cache_entry(base)
+    if entry:
+        matrix, age, ttl = entry
+        if age <= ttl:
+            _metrics_registry.inc(_RATE_CACHE_EVENTS, 'hit')
+            return matrix
+        if _rate_providers_down():
+            # Both circuits are open: the last known-good snapshot beats a doomed refresh
+            _metrics_registry.inc(_RATE_CACHE_EVENTS, 'stale_hit')
+            return matrix
+        if age <= _RATE_MAX_STALE_SECONDS:
+            # Stale-while-revalidate: answer now, refresh in the background
+            _metrics_registry.inc(_RATE_CACHE_EVENTS, 'stale_hit')
+            _refresh_rates_async(base)
+            return matrix
+        # Too old to serve even while revalidating: as good as evicted
+        _metrics_registry.inc(_RATE_CACHE_EVENTS, 'eviction')
+
+    # Cold miss: one caller fetches, concurrent callers wait for its result
+    _metrics_registry.inc(_RATE_CACHE_EVENTS, 'miss')
+    _refresh_rates(base)
+    entry = _cache_entry(base)
+    if entry:
+        return entry[0]
+    return RateMatrix.build(_SUPPORTED_CURRENCIES, base, _approx_rates(base), 'approx')
+
+def warm_rate_cache():
+    """Load the shared snapshot (fetching it if there is none) before serving requests."""
+    try:
+        _get_rate_matrix()
+    except Exception as e:
+        logger.warning(f"Rate cache warm-up failed: {e}")
 
 @app.route('/api/rates', methods=['GET'])
 def get_rates():
@@ -374,15 +1199,22 @@ def get_rates():
     try:
         base = request.args.get('base', 'USD').upper()
         symbols = request.args.get('symbols')
-        rates = _get_rates(base)
+        matrix = _get_rate_matrix()
+        if not matrix.has(base):
+            return jsonify({'success': False, 'error': f'Currency {base} not supported'}), 400
+        rates = matrix.row(base)
         if symbols:
             want = {s.strip().upper() for s in symbols.split(',') if s.strip()}
             rates = {k: v for k, v in rates.items() if k in want or k == base}
+        provenance = [p for p in (matrix.provenance(base, c) for c in rates) if p]
         return jsonify({
             'success': True,
             'base': base,
             'rates': rates,
-            'cached': True
+            'cached': True,
+            'anchor': matrix.anchor,
+            'sources': sorted({p['source'] for p in provenance}),
+            'age_seconds': max((p['age_seconds'] for p in provenance), default=None)
         })
     except Exception as e:
         logger.error(f"Error getting rates: {e}")
@@ -416,13 +1248,15 @@ def convert_currency():
                 'note': f'1 {from_currency} = 1 {to_currency}'
             })
 
-        # Get rates with cache for from_currency as base
-        rates = _get_rates(from_currency)
-        rate = rates.get(to_currency)
+        # Any pair comes straight out of the cached cross-rate matrix
+        matrix = _get_rate_matrix()
+        rate = matrix.rate(from_currency, to_currency)
         if rate is None:
-            return jsonify({'error': f'Currency {to_currency} not supported'}), 400
+            unsupported = to_currency if matrix.has(from_currency) else from_currency
+            return jsonify({'error': f'Currency {unsupported} not supported'}), 400
 
-        converted_amount = amount_val * float(rate)
+        converted_amount = amount_val * rate
+        provenance = matrix.provenance(from_currency, to_currency)
 
         return jsonify({
             'success': True,
@@ -431,51 +1265,390 @@ def convert_currency():
             'to_currency': to_currency,
             'converted_amount': round(converted_amount, 2),
             'exchange_rate': rate,
-            'note': f'1 {from_currency} = {rate} {to_currency}'
+            'note': f'1 {from_currency} = {rate} {to_currency}',
+            'rate_source': provenance['source'],
+            'rate_age_seconds': provenance['age_seconds']
         })
     except Exception as e:
         logger.error(f"Error converting currency: {e}")
         return jsonify({'error': 'Failed to convert currency'}), 500
 
+_CONVERT_BATCH_MAX = int(os.getenv('CONVERT_BATCH_MAX', '50000'))
+
+def _parse_amounts(values):
+    """Amounts as a float64 column plus the indices that were not numbers."""
+    try:
+        amounts = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        amounts = np.empty(len(values), dtype=np.float64)
+        for k, value in enumerate(values):
+            try:
+                amounts[k] = float(value)
+            except (TypeError, ValueError):
+                amounts[k] = np.nan
+    if amounts.ndim != 1:
+        raise ValueError('amounts must be a flat list')
+    return amounts
+
+@app.route('/api/currency-convert/batch', methods=['POST'])
+def convert_currency_batch():
+    """Convert many amounts in one vectorized pass over the cached rate matrix.
+
+    Body: {"items": [{"amount", "from", "to"}, ...]} or the columnar form
+    {"amounts": [...], "from_currency": "INR" | [...], "to_currency": "USD" | [...]}.
+    Giving dates (a "date" per item, or "dates": "YYYY-MM-DD" | [...]) converts
+    at the stored daily rates as of each date instead of the live ones.
+    Results come back in request order; failed items are null and listed in errors.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        dates = None
+        if 'items' in data:
+            items = data.get('items') or []
+            if not isinstance(items, list):
+                return jsonify({'error': 'items must be a list'}), 400
+            values = [item.get('amount') if isinstance(item, dict) else None for item in items]
+            from_codes = [str((item.get('from') or item.get('from_currency') or 'INR') if isinstance(item, dict) else '') for item in items]
+            to_codes = [str((item.get('to') or item.get('to_currency') or 'USD') if isinstance(item, dict) else '') for item in items]
+            if any(isinstance(item, dict) and item.get('date') for item in items):
+                dates = [item.get('date') if isinstance(item, dict) else None for item in items]
+        else:
+            values = data.get('amounts')
+            if not isinstance(values, list):
+                return jsonify({'error': 'items or amounts required'}), 400
+            from_codes = data.get('from_currency') or 'INR'
+            to_codes = data.get('to_currency') or 'USD'
+            dates = data.get('dates')
+            for codes in (from_codes, to_codes, dates):
+                if isinstance(codes, list) and len(codes) != len(values):
+                    return jsonify({'error': 'currency and date lists must match the number of amounts'}), 400
+            if isinstance(dates, str):
+                dates = [dates] * len(values)
+
+        if len(values) > _CONVERT_BATCH_MAX:
+            return jsonify({'error': f'At most {_CONVERT_BATCH_MAX} conversions per batch'}), 413
+        try:
+            amounts = _parse_amounts(values)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if dates is not None:
+            return _convert_batch_as_of(data, amounts, from_codes, to_codes, dates)
+
+        matrix = _get_rate_matrix()
+        converted, rates = matrix.convert(amounts, from_codes, to_codes)
+
+        errors = []
+        for k in np.flatnonzero(np.isnan(converted)).tolist():
+            if np.isnan(amounts[k]):
+                errors.append({'index': k, 'error': 'Amount must be a number'})
+            else:
+                code = from_codes[k] if isinstance(from_codes, list) else from_codes
+                if matrix.has(str(code).upper()):
+                    code = to_codes[k] if isinstance(to_codes, list) else to_codes
+                errors.append({'index': k, 'error': f'Currency {str(code).upper()} not supported'})
+
+        rounded = np.round(converted, 2).tolist()
+        involved = set(np.char.upper(np.asarray(from_codes, dtype=str)).ravel().tolist())
+        involved |= set(np.char.upper(np.asarray(to_codes, dtype=str)).ravel().tolist())
+        provenance = [p for p in (matrix.provenance(matrix.anchor, c) for c in involved) if p]
+
+        result = {
+            'success': True,
+            'count': len(rounded),
+            'converted': [None if x != x else x for x in rounded],
+            'errors': errors,
+            'rate_sources': sorted({p['source'] for p in provenance}),
+            'rate_age_seconds': max((p['age_seconds'] for p in provenance), default=None)
+        }
+        if data.get('include_rates'):
+            result['rates'] = [None if x != x else x for x in rates.tolist()]
+        return jsonify(result)
+    except Exception as e:
+        logger.error(f"Error converting currency batch: {e}")
+        return jsonify({'error': 'Failed to convert currency batch'}), 500
+
+def _convert_batch_as_of(data, amounts, from_codes, to_codes, dates):
+    """The dated form of the batch conversion, answered from the local rate history."""
+    history = _rate_history.current()
+    if history is None:
+        return jsonify({'error': 'No rate history stored yet; run `python rate_history.py sync`'}), 503
+    days = rate_history.day_numbers(dates)
+    converted, rates, quote_days = history.convert(
+        amounts, days, from_codes, to_codes, max_gap_days=_RATE_HISTORY_MAX_GAP_DAYS
+    )
+
+    errors = []
+    for k in np.flatnonzero(np.isnan(converted)).tolist():
+        if np.isnan(amounts[k]):
+            errors.append({'index': k, 'error': 'Amount must be a number'})
+        elif days[k] == rate_history.NO_DAY:
+            errors.append({'index': k, 'error': 'Date must be YYYY-MM-DD'})
+        else:
+            pair = [str(c[k] if isinstance(c, list) else c).upper() for c in (from_codes, to_codes)]
+            errors.append({'index': k, 'error': f'No {pair[0]}->{pair[1]} rate stored on or before {dates[k]}'})
+
+    rounded = np.round(converted, 2).tolist()
+    result = {
+        'success': True,
+        'count': len(rounded),
+        'converted': [None if x != x else x for x in rounded],
+        'errors': errors,
+        'rate_sources': ['history'],
+        'history': history.stats()
+    }
+    if data.get('include_rates'):
+        result['rates'] = [None if x != x else x for x in rates.tolist()]
+        result['rate_dates'] = [
+            None if d == rate_history.NO_DAY else rate_history.day_label(d) for d in quote_days.tolist()
+        ]
+    return jsonify(result)
+
+@app.route('/api/rates/history', methods=['GET'])
+def get_rate_history():
+    """Daily as-of rates from the local history, without any upstream call.
+
+    Query params: base (default USD), symbols (comma-separated; default all
+    stored), from and to (YYYY-MM-DD, inclusive; default the last 30 days).
+    Each series has one value per day, null where no quote is stored.
+    """
+    try:
+        history = _rate_history.current()
+        if history is None:
+            return jsonify({'error': 'No rate history stored yet; run `python rate_history.py sync`'}), 503
+        base = request.args.get('base', 'USD').upper()
+        symbols = request.args.get('symbols')
+        wanted = [c.strip().upper() for c in symbols.split(',') if c.strip()] if symbols else history.currencies()
+        try:
+            end = _parse_day(request.args['to'], 'to') if request.args.get('to') else datetime.now().date()
+            start = _parse_day(request.args['from'], 'from') if request.args.get('from') else end - timedelta(days=29)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if start > end:
+            return jsonify({'error': 'from must not be after to'}), 400
+        if (end - start).days + 1 > _RATE_HISTORY_MAX_DAYS:
+            return jsonify({'error': f'At most {_RATE_HISTORY_MAX_DAYS} days per request'}), 400
+
+        days = np.arange(rate_history.day_number(start), rate_history.day_number(end) + 1)
+        series = {}
+        for currency in wanted:
+            _, rates, _ = history.convert(
+                np.ones(len(days)), days, base, currency, max_gap_days=_RATE_HISTORY_MAX_GAP_DAYS
+            )
+            series[currency] = [None if x != x else round(x, 6) for x in rates.tolist()]
+        return jsonify({
+            'success': True,
+            'base': base,
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'dates': [rate_history.day_label(d) for d in days.tolist()],
+            'rates': series,
+            'coverage': history.stats()
+        })
+    except Exception as e:
+        logger.error(f"Error reading rate history: {e}")
+        return jsonify({'error': 'Failed to read rate history'}), 500
+
+_EXPORT_PAGE_SIZE = int(os.getenv('EXPORT_PAGE_SIZE', '1000'))
+_CSV_HEADERS = ['Date', 'Title', 'Amount', 'Category', 'Location', 'Notes']
+# Last row of a streamed export that failed after its headers were sent
+_CSV_INCOMPLETE_ROW = ['#ERROR', 'Export incomplete: stopped early, download it again']
+
+def _export_criteria():
+    """Date-range and category filters shared by both export formats; raises ValueError."""
+    criteria = {
+        'date_from': request.args.get('from'),
+        'date_to': request.args.get('to'),
+        'categories': [c.strip() for c in request.args.get('category', '').split(',') if c.strip()],
+    }
+    # Checked up front: a bad date would otherwise only fail at PostgREST, mid-stream
+    for name, key in (('from', 'date_from'), ('to', 'date_to')):
+        if criteria[key]:
+            _parse_day(criteria[key], name)
+    return criteria
+
+def _iter_export_pages(user_id, criteria):
+    snapshot = _expense_cache.peek(user_id, _data_version(user_id))
+    if snapshot is None:
+        return expense_query.iter_pages(
+            supabase_request, user_id, _EXPORT_PAGE_SIZE, expense_query.range_filters(**criteria),
+            'id,date,title,amount,category,location,notes'
+        )
+    rows = list(expense_query.filter_rows(snapshot['expenses'], **criteria))
+    return (rows[i:i + _EXPORT_PAGE_SIZE] for i in range(0, len(rows), _EXPORT_PAGE_SIZE))
+
+def _csv_row(expense):
+    return (
+        expense.get('date'),
+        expense.get('title'),
+        expense.get('amount'),
+        expense.get('category'),
+        expense.get('location'),
+        expense.get('notes')
+    )
+
+def _iter_csv_chunks(user_id, criteria):
+    """Yield the CSV file one page at a time so memory stays flat for any history size."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(_CSV_HEADERS)
+    try:
+        for page in _iter_export_pages(user_id, criteria):
+            with _request_phase('serialize'):
+                writer.writerows(map(_csv_row, page))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    except Exception as e:
+        # Headers are already sent: end with a marker row, then cut the response off
+        # without its final chunk so the truncated file cannot pass for a complete one
+        logger.error(f"CSV export stream for {user_id} aborted: {e}")
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(_CSV_INCOMPLETE_ROW)
+        yield buffer.getvalue()
+        raise
+    if buffer.tell():
+        yield buffer.getvalue()
+
 @app.route('/api/csv-export', methods=['GET'])
 def export_csv():
+    """Export expenses as CSV.
+
+    Streams a chunked text/csv download when called with ?format=csv or
+    Accept: text/csv; otherwise returns the legacy JSON envelope.
+    Optional filters: from, to (YYYY-MM-DD) and category (comma-separated).
+    """
     try:
         user_id = request.headers.get('X-User-ID')
         if not user_id:
             return jsonify({'error': 'User ID required'}), 401
-        
-        # Get user expenses
-        expenses = supabase_request('GET', f'app_7433469c6a_expenses?user_id=eq.{user_id}&order=date.desc')
-        
-        # Generate CSV content
-        csv_headers = ['Date', 'Title', 'Amount', 'Category', 'Location', 'Notes']
-        csv_rows = []
-        
-        for expense in expenses:
-            row = [
-                expense.get('date', ''),
-                expense.get('title', ''),
-                expense.get('amount', ''),
-                expense.get('category', ''),
-                expense.get('location', ''),
-                expense.get('notes', '')
-            ]
-            csv_rows.append(row)
-        
-        # Create CSV content
-        csv_content = ','.join(csv_headers) + '\n'
-        for row in csv_rows:
-            csv_content += ','.join([f'"{str(field)}"' for field in row]) + '\n'
-        
+
+        try:
+            criteria = _export_criteria()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        filename = f'aureus-expenses-{datetime.now().strftime("%Y-%m-%d")}.csv'
+
+        wants_csv = request.args.get('format') == 'csv' or (
+            request.accept_mimetypes.best_match(['application/json', 'text/csv']) == 'text/csv'
+        )
+        if wants_csv:
+            return Response(
+                stream_with_context(_iter_csv_chunks(user_id, criteria)),
+                mimetype='text/csv',
+                headers={
+                    'Content-Disposition': f'attachment; filename="{filename}"',
+                    'X-Accel-Buffering': 'no',
+                },
+            )
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(_CSV_HEADERS)
+        record_count = 0
+        for page in _iter_export_pages(user_id, criteria):
+            with _request_phase('serialize'):
+                writer.writerows(map(_csv_row, page))
+            record_count += len(page)
+        csv_content = buffer.getvalue()
+
         return jsonify({
             'csv_content': csv_content,
-            'filename': f'aureus-expenses-{datetime.now().strftime("%Y-%m-%d")}.csv',
-            'record_count': len(expenses)
+            'filename': filename,
+            'record_count': record_count
         })
     except Exception as e:
         logger.error(f"Error exporting CSV: {e}")
         return jsonify({'error': 'Failed to export CSV'}), 500
 
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Hit/miss counters for this worker's caches."""
+    now = _now_ts()
+    with _rate_cache_lock:
+        rate_cache = {
+            base: {
+                'age_seconds': now - entry['ts'],
+                'approx': entry['approx'],
+                'refreshing': base in _rate_inflight,
+                'currencies': entry['matrix'].snapshot(now)
+            }
+            for base, entry in _rate_cache.items()
+        }
+    return jsonify({
+        'pid': os.getpid(),
+        'expense_cache': _expense_cache.stats(),
+        'geocode_cache': _geocoder.stats(),
+        'spatial_indexes': _spatial_indexes.stats(),
+        'insight_jobs': _insight_jobs.stats(),
+        'rate_cache': rate_cache
+    })
+
+@app.route('/api/circuit-breakers', methods=['GET'])
+def get_circuit_breakers():
+    """State of this worker's upstream circuit breakers."""
+    return jsonify({
+        'pid': os.getpid(),
+        'breakers': resilience.snapshot()
+    })
+
+@app.route('/api/write-behind/stats', methods=['GET'])
+def get_write_behind_stats():
+    """Queue depth and flush latency of this worker's write-behind queue."""
+    stats = _write_behind.stats() if _write_behind is not None else {'enabled': False}
+    return jsonify({'pid': os.getpid(), **stats})
+
+# Shared geocoding cache and the single rate-limited queue for Nominatim misses
+_geocoder = geocoding.from_env()
+_GEOCODE_BATCH_MAX = int(os.getenv('GEOCODE_BATCH_MAX', '500'))
+_GEOCODE_WAIT_SECONDS = float(os.getenv('GEOCODE_WAIT_SECONDS', '10'))
+
+@app.route('/api/geocode', methods=['GET', 'POST'])
+def geocode_places():
+    """Coordinates for place names, served from the shared cache when possible.
+
+    GET ?q=<place> returns one result; POST {"queries": [...]} returns one
+    result per query, in order. Places still queued for the provider when the
+    wait runs out come back with status "pending"; ask again later.
+    """
+    try:
+        if request.method == 'GET':
+            query = request.args.get('q', '')
+            if not geocoding.normalize_query(query):
+                return jsonify({'error': 'q is required'}), 400
+            return jsonify(_geocoder.geocode(query, timeout=_GEOCODE_WAIT_SECONDS))
+
+        data = request.get_json(silent=True) or {}
+        queries = data.get('queries')
+        if not isinstance(queries, list):
+            return jsonify({'error': 'queries must be a list'}), 400
+        if len(queries) > _GEOCODE_BATCH_MAX:
+            return jsonify({'error': f'At most {_GEOCODE_BATCH_MAX} places per batch'}), 413
+        results = _geocoder.geocode_many([str(q or '') for q in queries], timeout=_GEOCODE_WAIT_SECONDS)
+        return jsonify({
+            'results': results,
+            'pending': sum(1 for r in results if r['status'] == 'pending')
+        })
+    except Exception as e:
+        logger.error(f"Error geocoding: {e}")
+        return jsonify({'error': 'Failed to geocode'}), 500
+
+@app.route('/api/geocode/reverse', methods=['GET'])
+def reverse_geocode():
+    """Place name for ?lat=&lon=, cached per ~11 m cell."""
+    try:
+        try:
+            lat, lon = float(request.args['lat']), float(request.args['lon'])
+        except (KeyError, ValueError):
+            return jsonify({'error': 'lat and lon must be numbers'}), 400
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return jsonify({'error': 'lat/lon out of range'}), 400
+        return jsonify(_geocoder.reverse(lat, lon, timeout=_GEOCODE_WAIT_SECONDS))
+    except Exception as e:
+        logger.error(f"Error reverse geocoding: {e}")
+        return jsonify({'error': 'Failed to reverse geocode'}), 500
+
 @app.route('/api/location', methods=['GET'])
 def get_user_location():
     try:
@@ -589,71 +1762,260 @@ def generate_ai_insight():
     """Generate AI insights - alias for ai-insights"""
     return generate_ai_insights()
 
+_HEATMAP_MAX_CELLS = int(os.getenv('HEATMAP_MAX_CELLS', '2000'))
+_HEATMAP_DEFAULT_DETAIL = 3
+
 @app.route('/api/heatmap-data', methods=['GET'])
 def get_heatmap_data():
-    """Generate heatmap data for VIT Vellore area"""
+    """Spending aggregated into map cells.
+
+    Query params: zoom (the map's zoom level, 0-20), bbox (south,west,north,east
+    of the visible area), detail (how many levels finer than the map the cells
+    are, default 3) and currency. Each cell carries its centroid, count, amount
+    and top category; cells are coarsened until at most HEATMAP_MAX_CELLS remain.
+    """
     try:
-        user_id = request.headers.get('X-User-ID', 'demo-user')
-        
-        # VIT Vellore coordinates
-        vit_lat = 12.9698
-        vit_lng = 79.1565
-        
-        # Generate synthetic expense data around VIT Vellore campus
-        campus_locations = [
-            {'name': 'VIT Canteen', 'lat': 12.9708, 'lng': 79.1575, 'category': 'Food'},
-            {'name': 'VIT Main Gate', 'lat': 12.9690, 'lng': 79.1550, 'category': 'Transportation'},
-            {'name': 'VIT Library', 'lat': 12.9705, 'lng': 79.1560, 'category': 'Other'},
-            {'name': 'VIT Student Center', 'lat': 12.9695, 'lng': 79.1570, 'category': 'Entertainment'},
-            {'name': 'VIT Hostel Block A', 'lat': 12.9715, 'lng': 79.1580, 'category': 'Bills'},
-            {'name': 'VIT Hostel Block B', 'lat': 12.9720, 'lng': 79.1585, 'category': 'Bills'},
-            {'name': 'Dominos Near VIT', 'lat': 12.9685, 'lng': 79.1545, 'category': 'Food'},
-            {'name': 'Juice Shop VIT', 'lat': 12.9700, 'lng': 79.1565, 'category': 'Food'},
-            {'name': 'VIT Medical Center', 'lat': 12.9710, 'lng': 79.1555, 'category': 'Healthcare'},
-            {'name': 'VIT Sports Complex', 'lat': 12.9725, 'lng': 79.1575, 'category': 'Entertainment'},
-            {'name': 'Coffee Day VIT', 'lat': 12.9692, 'lng': 79.1558, 'category': 'Food'},
-            {'name': 'VIT Technology Park', 'lat': 12.9680, 'lng': 79.1590, 'category': 'Shopping'},
-            {'name': 'VIT ATM Point', 'lat': 12.9688, 'lng': 79.1568, 'category': 'Bills'},
-            {'name': 'Shawarma Point VIT', 'lat': 12.9703, 'lng': 79.1552, 'category': 'Food'},
-            {'name': 'VIT Bookstore', 'lat': 12.9697, 'lng': 79.1572, 'category': 'Shopping'},
-        ]
-        
-        # Generate expenses with varied amounts and dates
-        heatmap_expenses = []
-        today = datetime.now()
-        
-        for i in range(50):  # Generate 50 sample expenses
-            location = random.choice(campus_locations)
-            
-            # Add slight random offset to coordinates for variety
-            lat_offset = (random.random() - 0.5) * 0.002
-            lng_offset = (random.random() - 0.5) * 0.002
-            
-            expense = {
-                'id': f'demo-expense-{i}',
-                'title': f'Expense at {location["name"]}',
-                'amount': round(random.uniform(10, 500), 2),
-                'category': location['category'],
-                'location': location['name'],
-                'latitude': location['lat'] + lat_offset,
-                'longitude': location['lng'] + lng_offset,
-                'date': (today - timedelta(days=random.randint(0, 30))).strftime('%Y-%m-%d'),
-                'user_id': user_id
+        user_id = request.headers.get('X-User-ID')
+        if not user_id:
+            return jsonify({'error': 'User ID required'}), 401
+        try:
+            zoom = int(request.args.get('zoom', 15))
+            detail = int(request.args.get('detail', _HEATMAP_DEFAULT_DETAIL))
+        except ValueError:
+            return jsonify({'error': 'zoom and detail must be integers'}), 400
+        if not 0 <= zoom <= geo_tiles.MAX_ZOOM or detail < 0:
+            return jsonify({'error': f'zoom must be 0-{geo_tiles.MAX_ZOOM} and detail non-negative'}), 400
+        try:
+            bbox = geo_tiles.parse_bbox(request.args['bbox']) if request.args.get('bbox') else None
+            currency, factor = _display_factor(request.args.get('currency'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        cell_zoom = min(zoom + detail, geo_tiles.MAX_ZOOM)
+        found = None
+        if cell_zoom <= geo_tiles.COARSE_MAX_ZOOM:
+            found = geo_tiles.read_rollup_cells(supabase_request, user_id, cell_zoom, bbox, _HEATMAP_MAX_CELLS)
+        source = 'rollups'
+        if found is None:
+            snapshot = _snapshot(user_id)
+            columns = _geo_columns.get(user_id, snapshot['version'], snapshot['expenses'])
+            found = columns.cells(cell_zoom, bbox, _HEATMAP_MAX_CELLS)
+            source = 'expenses'
+        cell_zoom, cells = found
+        for cell in cells:
+            cell['amount'] = round(cell['amount'] * factor, 2)
+
+        count = sum(c['count'] for c in cells)
+        if count:
+            center = {
+                'lat': round(sum(c['lat'] * c['count'] for c in cells) / count, 6),
+                'lng': round(sum(c['lng'] * c['count'] for c in cells) / count, 6),
             }
-            heatmap_expenses.append(expense)
-        
+        else:
+            # VIT Vellore, where the map opens when there is nothing to show
+            center = {'lat': 12.9698, 'lng': 79.1565}
         return jsonify({
             'success': True,
-            'center': {'lat': vit_lat, 'lng': vit_lng},
-            'expenses': heatmap_expenses,
-            'count': len(heatmap_expenses),
-            'total_amount': sum(e['amount'] for e in heatmap_expenses)
+            'zoom': zoom,
+            'cell_zoom': cell_zoom,
+            'currency': currency,
+            'source': source,
+            'center': center,
+            'cells': cells,
+            'count': count,
+            'total_amount': round(sum(c['amount'] for c in cells), 2)
         })
-        
+
     except Exception as e:
         logger.error(f"Error generating heatmap data: {e}")
         return jsonify({'error': 'Failed to generate heatmap data'}), 500
 
+# Sub-requests one /api/batch call may carry
+_BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', '20'))
+_BATCH_METHODS = {'GET', 'POST', 'DELETE'}
+# Nested batches, and streams that would hold the batch open
+_BATCH_EXCLUDED = {'/api/batch', '/api/stream'}
+# Headers a sub-request may set itself; the rest (X-User-ID included) come from the batch request
+_BATCH_ITEM_HEADERS = {'If-None-Match', 'Accept'}
+
+def _batch_item(spec, position):
+    """(id, method, path, query, json body, headers) for one sub-request, or raise ValueError."""
+    if not isinstance(spec, dict):
+        raise ValueError(f'requests[{position}] must be an object')
+    ident = str(spec.get('id', position))
+    method = str(spec.get('method', 'GET')).upper()
+    if method not in _BATCH_METHODS:
+        raise ValueError(f'requests[{position}]: method must be one of {", ".join(sorted(_BATCH_METHODS))}')
+    parts = urlsplit(str(spec.get('route', '')))
+    if not parts.path.startswith('/api/') or parts.path.rstrip('/') in _BATCH_EXCLUDED:
+        raise ValueError(f'requests[{position}]: route must be an /api/ path other than /api/batch or /api/stream')
+    params = spec.get('params') or {}
+    if not isinstance(params, dict):
+        raise ValueError(f'requests[{position}]: params must be an object')
+    headers = spec.get('headers') or {}
+    if not isinstance(headers, dict) or not {h.title() for h in headers} <= _BATCH_ITEM_HEADERS:
+        raise ValueError(f'requests[{position}]: only {", ".join(sorted(_BATCH_ITEM_HEADERS))} headers may be set')
+    # GET and DELETE take params in the query string; POST takes them as its JSON body
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    body = spec.get('body')
+    if method == 'POST':
+        if body is None:
+            body = params
+    else:
+        query += [(k, str(v)) for k, v in params.items()]
+    return ident, method, parts.path, urlencode(query), body, headers
+
+def _run_sub_request(item, inherited, remote_addr):
+    ident, method, path, query, body, headers = item
+    builder = EnvironBuilder(
+        path=path, method=method, query_string=query, json=body,
+        headers={**inherited, **headers}, environ_base={'REMOTE_ADDR': remote_addr},
+    )
+    try:
+        environ = builder.get_environ()
+    finally:
+        builder.close()
+    try:
+        # A fresh app context gives the sub-request its own g, so its request
+        # hooks time and count it without touching the batch request's state
+        with app.app_context():
+            app_iter, status, response_headers = run_wsgi_app(app.wsgi_app, environ, buffered=True)
+            data = b''.join(app_iter)
+    except Exception as e:
+        logger.error(f"Batch sub-request {method} {path} failed: {e}")
+        return {'id': ident, 'status': 500, 'body': {'error': 'Internal server error'}}
+    response_headers = Headers(response_headers)
+    result = {'id': ident, 'status': int(status.split(' ', 1)[0])}
+    if response_headers.get('Content-Type', '').startswith('application/json'):
+        result['body'] = json.loads(data) if data else None
+    else:
+        result['body'] = data.decode('utf-8', errors='replace')
+    if response_headers.get('ETag'):
+        result['etag'] = response_headers['ETag']
+    return result
+
+@app.route('/api/batch', methods=['POST'])
+def batch_requests():
+    """Run several API calls in one round trip.
+
+    Body: {"requests": [{"id", "route", "method", "params", "body", "headers"}]}.
+    Consecutive GETs run concurrently; a POST or DELETE waits for everything
+    before it and finishes before anything after it starts, so a batch reads
+    its own writes. Every sub-request carries this request's X-User-ID, and
+    concurrent ones share a single load of the user's expenses. The response
+    is 200 with each sub-request's own status and body, in request order.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        specs = data.get('requests') if isinstance(data, dict) else None
+        if not isinstance(specs, list) or not specs:
+            return jsonify({'error': 'requests must be a non-empty list'}), 400
+        if len(specs) > _BATCH_MAX_REQUESTS:
+            return jsonify({'error': f'At most {_BATCH_MAX_REQUESTS} requests per batch'}), 400
+        try:
+            items = [_batch_item(spec, i) for i, spec in enumerate(specs)]
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        inherited = {k: v for k, v in request.headers.items() if k not in ('Content-Type', 'Content-Length')}
+        remote_addr = request.remote_addr or ''
+        stages = []
+        for item in items:
+            if item[1] == 'GET' and stages and stages[-1][0][1] == 'GET':
+                stages[-1].append(item)
+            else:
+                stages.append([item])
+
+        results = []
+        for stage in stages:
+            results += fanout.gather(*[
+                (lambda item=item: _run_sub_request(item, inherited, remote_addr)) for item in stage
+            ])
+        return jsonify({'results': results})
+    except Exception as e:
+        logger.error(f"Error running batch: {e}")
+        return jsonify({'error': 'Failed to run batch'}), 500
+
+_STREAM_HEARTBEAT_SECONDS = float(os.getenv('STREAM_HEARTBEAT_SECONDS', '15'))
+# Streams end after this long and the browser reconnects with Last-Event-ID
+_STREAM_MAX_SECONDS = float(os.getenv('STREAM_MAX_SECONDS', '600'))
+_STREAM_RETRY_MS = int(os.getenv('STREAM_RETRY_MS', '3000'))
+
+def _sse(event, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines.append(f'event: {event}')
+    lines.append(f'data: {data}')
+    return '\n'.join(lines) + '\n\n'
+
+@app.route('/api/stream', methods=['GET'])
+def stream_events():
+    """Server-sent events for one user's open dashboards.
+
+    EventSource cannot send headers, so the user comes from ``user_id`` as
+    well as X-User-ID. Events: ``expenses`` (stored rows plus the dashboard
+    totals they add, in the base currency), ``rates`` (the base currency's
+    rates after a refresh) and ``reload`` (the client should fetch everything
+    again: after an import, or when a resumed stream missed pruned events).
+    A comment line goes out every STREAM_HEARTBEAT_SECONDS. Reconnects resume
+    after Last-Event-ID. A stream holds a greenlet, so plain sync workers
+    refuse with 503.
+    """
+    user_id = request.headers.get('X-User-ID') or request.args.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'User ID required'}), 401
+    if not (fanout.gevent_active() or request.environ.get('wsgi.multithread')):
+        return jsonify({'error': 'Streaming needs the gevent workers'}), 503
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID must be an integer'}), 400
+    try:
+        subscription, missed, complete = _events.subscribe(user_id, last_id)
+    except Exception as e:
+        logger.error(f"Error opening event stream for {user_id}: {e}")
+        return jsonify({'error': 'Failed to open event stream'}), 500
+
+    def generate():
+        sent = last_id or 0
+        try:
+            yield f'retry: {_STREAM_RETRY_MS}\n\n'
+            if not complete:
+                sent = _events.newest_id()
+                yield _sse('reload', '{"reason":"resume"}', sent)
+            elif last_id is None:
+                # Gives the browser an id to resume from even if nothing happens before a reconnect
+                sent = _events.newest_id()
+                yield _sse('ready', '{}', sent)
+            for event_id, event, data in missed:
+                if event_id > sent:
+                    sent = event_id
+                    yield _sse(event, data, event_id)
+            deadline = time.monotonic() + _STREAM_MAX_SECONDS
+            while time.monotonic() < deadline:
+                if subscription.overflowed:
+                    yield _sse('reload', '{"reason":"overflow"}', _events.newest_id())
+                    return
+                item = subscription.get(timeout=min(_STREAM_HEARTBEAT_SECONDS, max(0.0, deadline - time.monotonic())))
+                if item is None:
+                    yield ': heartbeat\n\n'
+                elif item[0] > sent:
+                    sent = item[0]
+                    yield _sse(item[1], item[2], item[0])
+        finally:
+            _events.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # Keep reverse proxies from buffering the stream
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/stream/stats', methods=['GET'])
+def stream_stats():
+    """This worker's open streams and event counts."""
+    return jsonify(_events.stats())
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(error):
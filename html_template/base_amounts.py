@@ -0,0 +1,169 @@
+"""
+Write-time normalization of expense amounts into one base currency.
+
+Every expense keeps the amount and currency it was entered in, and also gets
+``amount_base`` (the amount in the base currency), ``base_currency``,
+``fx_rate`` (base units per unit of the expense currency) and ``fx_rate_at``
+(when that rate was quoted). The values come from the cached rate matrix at
+insert time, so rollups, the dashboard and analytics add up ``amount_base``
+with no per-row conversion. Showing a total in another currency is then a
+single multiplication.
+
+Rows without ``amount_base`` (older rows, a currency the rate table does not
+know, or rows written while only the built-in approximate rates were
+available) fall back to their raw ``amount`` wherever sums are taken. The backfill
+command fills them in at each expense's own date from the local rate history
+(rate_history.py), and from the latest shared rate snapshot where the history
+has no quote:
+
+    python base_amounts.py backfill [--user USER_ID]   # run from html_template/
+"""
+import os
+import sys
+import argparse
+import logging
+from datetime import datetime, timezone
+
+import numpy as np
+
+import rate_history
+
+logger = logging.getLogger(__name__)
+
+EXPENSES_TABLE = 'app_7433469c6a_expenses'
+SET_RPC = 'rpc/app_7433469c6a_set_expense_base_amounts'
+FIELDS = ('amount_base', 'base_currency', 'fx_rate', 'fx_rate_at')
+# Source of the hard-coded fallback rates; never recorded as an expense's rate
+APPROX_SOURCE = 'approx'
+
+
+def aggregate_amount(expense):
+    """The value sums are taken over: the base amount when recorded, else the raw amount."""
+    value = expense.get('amount_base')
+    if value is None:
+        value = expense.get('amount')
+    return float(value or 0)
+
+
+def _as_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def normalize(rows, matrix, base, history=None, max_gap_days=7):
+    """Set the base-amount fields on each row dict in place, one matrix lookup for all of them.
+
+    With a ``history``, rows are converted at the rate as of their ``date``
+    where one is stored. Cells resting on an approximate rate are not used,
+    so those rows stay unconverted for the backfill to fill in from real
+    quotes. Returns how many rows could not be converted (their fields are set
+    to None).
+    """
+    if not rows:
+        return 0
+    amounts = np.array([_as_float(r.get('amount')) for r in rows], dtype=np.float64)
+    codes = [str(r.get('currency') or base).upper() for r in rows]
+    converted, rates = matrix.convert(amounts, codes, base)
+    # A cell is as old as the older of its two anchor quotes
+    i = matrix.indices(codes)
+    j = matrix.indices([base])[0]
+    stamps = np.full(len(rows), np.nan)
+    if j >= 0:
+        known = i >= 0
+        stamps[known] = np.minimum(matrix.fetched_at[i[known]], matrix.fetched_at[j])
+    approx = np.array([k >= 0 and matrix.sources[k] == APPROX_SOURCE for k in i], dtype=bool)
+    if j >= 0 and matrix.sources[j] == APPROX_SOURCE:
+        approx[:] = True
+    # Amounts already in the base currency need no rate at all
+    approx &= np.array([c != base for c in codes], dtype=bool)
+    converted[approx] = np.nan
+    if history is not None:
+        dated, dated_rates, quote_days = history.convert(
+            amounts, rate_history.day_numbers([r.get('date') for r in rows]), codes, base, max_gap_days
+        )
+        found = ~np.isnan(dated)
+        converted[found] = dated[found]
+        rates[found] = dated_rates[found]
+        stamps[found] = quote_days[found] * 86400.0
+    missing = 0
+    for row, value, rate, stamp in zip(rows, converted, rates, stamps):
+        if np.isnan(value) or np.isnan(rate):
+            missing += 1
+            row.update(dict.fromkeys(FIELDS))
+            continue
+        row['amount_base'] = round(float(value), 2)
+        row['base_currency'] = base
+        row['fx_rate'] = float(rate)
+        row['fx_rate_at'] = (
+            None if np.isnan(stamp) else datetime.fromtimestamp(float(stamp), timezone.utc).isoformat()
+        )
+    return missing
+
+
+def backfill(request_fn, matrix, base, user_id=None, batch_size=1000, history=None):
+    """Fill the base-amount fields of rows that lack them; returns (updated, skipped, users)."""
+    updated = skipped = 0
+    users = set()
+    last_id = None
+    user_filter = f'&user_id=eq.{user_id}' if user_id else ''
+    while True:
+        # Keyset on id: rows we cannot convert stay null and must not be fetched again
+        after = f'&id=gt.{last_id}' if last_id is not None else ''
+        rows = request_fn(
+            'GET',
+            f'{EXPENSES_TABLE}?amount_base=is.null{user_filter}{after}'
+            f'&select=id,user_id,amount,currency,date&order=id.asc&limit={batch_size}'
+        ) or []
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        skipped += normalize(rows, matrix, base, history)
+        changed = [{'id': r['id'], **{f: r[f] for f in FIELDS}} for r in rows if r['amount_base'] is not None]
+        if changed:
+            request_fn('POST', SET_RPC, {'p_rows': changed})
+            updated += len(changed)
+            users.update(str(r['user_id']) for r in rows if r['amount_base'] is not None)
+        if len(rows) < batch_size:
+            break
+    return updated, skipped, users
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    from supabase_client import get_client
+    from rate_matrix import RateMatrix
+    import rate_store
+
+    parser = argparse.ArgumentParser(description='Record base-currency amounts on existing expenses')
+    parser.add_argument('command', choices=['backfill'])
+    parser.add_argument('--user', help='limit to one user id (default: all users)')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    base = os.getenv('BASE_CURRENCY', 'INR').upper()
+    anchor = os.getenv('RATE_ANCHOR', 'USD').upper()
+    stored = (rate_store.from_env().load_if_changed() or {}).get(anchor)
+    if not stored:
+        logger.error("No rate snapshot on this host yet; start the app (or hit /api/rates) first")
+        return 1
+    matrix = RateMatrix.from_dict(stored['matrix'])
+    client = get_client(
+        os.getenv('SUPABASE_URL', 'https://pqatgaqjvyzfohdrbrtb.supabase.co'),
+        os.getenv('SUPABASE_SERVICE_KEY'),
+    )
+
+    history = rate_history.from_env().current()
+    if history is None:
+        logger.warning("No rate history stored; converting at the latest rates (see rate_history.py sync)")
+    updated, skipped, _ = backfill(client.request, matrix, base, args.user, args.batch_size, history)
+    logger.info(f"Recorded {base} amounts on {updated} expense(s); {skipped} without a quoted rate left as is")
+    # The update triggers move rollups and map tiles from the raw amounts to the base ones
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Benchmarks and local upstream stand-ins for the Aureus API."""
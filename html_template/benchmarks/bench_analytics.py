@@ -0,0 +1,89 @@
+"""
+Expense statistics: per-request dict loops vs the columnar analytics engine.
+
+For each size the legacy path runs the dashboard full scan plus the insights
+loop over the row dicts. The columnar path is timed twice: building the
+columns once (what a cache miss costs) and answering the same questions plus
+a monthly series from already-built columns (every later request).
+
+Usage (from html_template/):
+    python -m benchmarks.bench_analytics --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import time
+from datetime import date, timedelta
+
+import analytics
+import rollups
+from benchmarks.synthetic import make_expenses
+
+
+def legacy(rows, today):
+    stats = rollups.dashboard_from_expenses(rows, today)
+    categories, locations = {}, {}
+    for expense in rows:
+        amount = float(expense.get('amount', 0))
+        cat = expense.get('category', 'Other')
+        categories[cat] = categories.get(cat, 0) + amount
+        loc = expense.get('location', '')
+        if loc:
+            locations[loc] = locations.get(loc, 0) + amount
+    return stats, categories, locations
+
+
+def columnar(columns, today):
+    stats = analytics.dashboard_stats(columns, today)
+    categories = columns.by_category()
+    locations = columns.by_location()
+    series = columns.buckets('month', today - timedelta(days=365), today)
+    return stats, categories, locations, series
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    today = date.today()
+    results = []
+    for size in args.sizes:
+        rows = make_expenses('bench-user', size, seed=7, today=today)
+        rows.sort(key=lambda r: r['date'], reverse=True)
+        # Decode like a PostgREST response so rows sit in memory in snapshot order
+        rows = json.loads(json.dumps(rows))
+        legacy_s, (expected, _, _) = best_of(lambda: legacy(rows, today), args.repeat)
+        build_s, columns = best_of(lambda: analytics.ExpenseColumns.from_rows(rows), args.repeat)
+        query_s, (stats, _, _, _) = best_of(lambda: columnar(columns, today), args.repeat)
+        assert abs(stats['total_expenses'] - expected['total_expenses']) < 1e-6 * max(1.0, expected['total_expenses'])
+        assert stats['weekly_trend'].keys() == expected['weekly_trend'].keys()
+        results.append({
+            'rows': size,
+            'legacy_ms': round(legacy_s * 1000, 2),
+            'column_build_ms': round(build_s * 1000, 2),
+            'columnar_query_ms': round(query_s * 1000, 2),
+            'speedup_warm': round(legacy_s / query_s, 1),
+        })
+
+    print(f"{'rows':>9s} {'legacy ms':>11s} {'build ms':>10s} {'query ms':>10s} {'warm x':>8s}")
+    for r in results:
+        print(f"{r['rows']:9d} {r['legacy_ms']:11.2f} {r['column_build_ms']:10.2f} "
+              f"{r['columnar_query_ms']:10.2f} {r['speedup_warm']:8.1f}")
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+10k conversions: one POST /api/currency-convert each vs one batch request.
+
+Provider calls are replaced with a fixed rate table so the numbers measure
+only the app's own per-request and per-item work, not the network.
+
+Usage (from html_template/):
+    python -m benchmarks.bench_convert_batch --items 10000
+"""
+import argparse
+import json
+import random
+import time
+
+import app as aureus
+
+CODES = ('USD', 'EUR', 'GBP', 'JPY', 'CAD', 'AUD', 'INR')
+
+
+def fixed_rates(base):
+    usd = {'USD': 1.0, 'EUR': 0.92, 'GBP': 0.79, 'JPY': 149.5, 'CAD': 1.36, 'AUD': 1.52, 'INR': 83.1}
+    return {c: v / usd[base] for c, v in usd.items()}
+
+
+def make_items(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        {'amount': round(rng.uniform(1, 5000), 2), 'from': rng.choice(CODES), 'to': rng.choice(CODES)}
+        for _ in range(count)
+    ]
+
+
+def run_scalar(client, items):
+    started = time.perf_counter()
+    results = []
+    for item in items:
+        response = client.post('/api/currency-convert', json={
+            'amount': item['amount'], 'from_currency': item['from'], 'to_currency': item['to'],
+        })
+        results.append(response.get_json()['converted_amount'])
+    return time.perf_counter() - started, results
+
+
+def run_batch(client, items):
+    started = time.perf_counter()
+    response = client.post('/api/currency-convert/batch', json={'items': items})
+    return time.perf_counter() - started, response.get_json()['converted']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    aureus._fetch_rates_primary = fixed_rates
+    client = aureus.app.test_client()
+    items = make_items(args.items)
+    # Warm the rate matrix so neither path pays for the first fill
+    client.post('/api/currency-convert/batch', json={'items': items[:1]})
+
+    scalar_seconds, scalar_results = run_scalar(client, items)
+    batch_seconds, batch_results = run_batch(client, items)
+    mismatches = sum(1 for a, b in zip(scalar_results, batch_results) if abs(a - b) > 0.011)
+
+    results = {
+        'items': args.items,
+        'per_request_seconds': round(scalar_seconds, 3),
+        'per_request_items_per_s': round(args.items / scalar_seconds, 1),
+        'batch_seconds': round(batch_seconds, 4),
+        'batch_items_per_s': round(args.items / batch_seconds, 1),
+        'speedup': round(scalar_seconds / batch_seconds, 1),
+        'mismatches': mismatches,
+    }
+    print(f"per-request  {results['per_request_seconds']:9.3f} s  {results['per_request_items_per_s']:10.1f} items/s")
+    print(f"batch        {results['batch_seconds']:9.4f} s  {results['batch_items_per_s']:10.1f} items/s")
+    print(f"speedup x{results['speedup']}, {mismatches} mismatched results")
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Memory and throughput of the CSV export: legacy in-memory build vs streaming.
+
+The PostgREST stand-in runs in a child process so tracemalloc only sees the
+exporter's own allocations.
+
+Usage (from html_template/):
+    python -m benchmarks.bench_export --rows 100000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import requests
+
+
+def wait_for(url, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(f'{url}/rest/v1/none', timeout=1)
+            return
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError(f'stand-in at {url} did not start')
+
+
+def legacy_export(supabase_request, user_id):
+    """The pre-streaming implementation: one fetch, string concatenation, JSON body."""
+    expenses = supabase_request('GET', f'app_7433469c6a_expenses?user_id=eq.{user_id}&order=date.desc')
+    csv_content = ','.join(['Date', 'Title', 'Amount', 'Category', 'Location', 'Notes']) + '\n'
+    for expense in expenses:
+        row = [expense.get(k, '') for k in ('date', 'title', 'amount', 'category', 'location', 'notes')]
+        csv_content += ','.join([f'"{str(field)}"' for field in row]) + '\n'
+    return json.dumps({'csv_content': csv_content, 'record_count': len(expenses)}).encode('utf-8')
+
+
+def measure(label, produce):
+    tracemalloc.start()
+    started = time.perf_counter()
+    first_byte = None
+    total_bytes = 0
+    for chunk in produce():
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        total_bytes += len(chunk)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return label, {
+        'seconds': round(elapsed, 3),
+        'time_to_first_byte_s': round(first_byte or elapsed, 3),
+        'bytes': total_bytes,
+        'peak_python_memory_mb': round(peak / 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--port', type=int, default=54329)
+    parser.add_argument('--page-size', type=int, default=5000)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    url = f'http://127.0.0.1:{args.port}'
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.fake_postgrest', '--port', str(args.port), '--rows', str(args.rows)],
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_for(url)
+        os.environ['SUPABASE_URL'] = url
+        os.environ['EXPORT_PAGE_SIZE'] = str(args.page_size)
+        import app as aureus
+
+        client = aureus.app.test_client()
+        headers = {'X-User-ID': 'bench-user'}
+
+        def streaming():
+            response = client.get('/api/csv-export?format=csv', headers=headers, buffered=False)
+            for chunk in response.response:
+                yield chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+
+        results = dict([
+            measure('legacy_json', lambda: [legacy_export(aureus.supabase_request, 'bench-user')]),
+            measure('streaming_csv', streaming),
+        ])
+    finally:
+        server.terminate()
+        server.wait()
+
+    for name, stats in results.items():
+        rate = args.rows / stats['seconds'] if stats['seconds'] else 0
+        print(f"{name:14s} {stats['seconds']:7.2f} s  ttfb={stats['time_to_first_byte_s']:6.2f} s  "
+              f"peak={stats['peak_python_memory_mb']:8.2f} MB  {rate:9.0f} rows/s")
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump({'rows': args.rows, 'results': results}, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Geocoding an import's locations: browser-style per-row lookups vs /api/geocode.
+
+The browser path (what expenses.html did) sleeps 1 s and calls the provider
+once per row, with no cache; its cost is computed from the row count. The
+service path sends the rows' locations as one batch twice: cold, where only
+distinct normalized places reach the provider (one call per --interval-ms),
+and warm, where everything is served from the cache. The provider is the
+local static stand-in with injected latency.
+
+Usage (from html_template/):
+    python -m benchmarks.bench_geocode --rows 2000 --interval-ms 1000 --latency 0.3
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.synthetic import LOCATIONS
+
+
+def spellings(name, rng):
+    """The same place as people type it."""
+    variants = [name, name.lower(), name.upper(), f'  {name} ', name.replace(' ', '  '), f'{name},']
+    return rng.choice(variants)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--interval-ms', type=float, default=1000.0, help='minimum gap between provider calls')
+    parser.add_argument('--latency', type=float, default=0.3, help='provider latency in seconds')
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ.update(
+        GEOCODE_CACHE_PATH=os.path.join(directory, 'geocode.sqlite3'),
+        GEOCODE_SLOT_PATH=os.path.join(directory, 'geocode.slot'),
+        GEOCODE_MIN_INTERVAL_MS=str(args.interval_ms),
+        GEOCODE_WAIT_SECONDS='600',
+        GEOCODE_BATCH_MAX=str(max(500, args.rows)),
+    )
+    import app as aureus
+    import geocoding
+
+    provider = geocoding.StaticProvider({name: (lat, lng) for name, lat, lng in LOCATIONS}, latency=args.latency)
+    aureus._geocoder.provider = provider
+    client = aureus.app.test_client()
+
+    rng = random.Random(11)
+    queries = [spellings(rng.choice(LOCATIONS)[0], rng) for _ in range(args.rows)]
+
+    started = time.perf_counter()
+    cold = client.post('/api/geocode', json={'queries': queries}).get_json()
+    cold_seconds = time.perf_counter() - started
+    cold_calls = provider.calls
+
+    started = time.perf_counter()
+    warm = client.post('/api/geocode', json={'queries': queries}).get_json()
+    warm_seconds = time.perf_counter() - started
+
+    stats = client.get('/api/cache/stats').get_json()['geocode_cache']
+    results = {
+        'rows': args.rows,
+        'distinct_spellings': len(set(queries)),
+        'browser_estimated_seconds': round(args.rows * (1.0 + args.latency), 1),
+        'cold_seconds': round(cold_seconds, 2),
+        'cold_provider_calls': cold_calls,
+        'warm_seconds': round(warm_seconds, 4),
+        'warm_provider_calls': provider.calls - cold_calls,
+        'resolved': sum(1 for r in warm['results'] if r['status'] == 'ok'),
+        'hit_rate': stats['hit_rate'],
+    }
+    print(f"browser per-row (estimated)  {results['browser_estimated_seconds']:10.1f} s  {args.rows} provider calls")
+    print(f"service, cold cache          {results['cold_seconds']:10.2f} s  {cold_calls} provider calls "
+          f"({results['distinct_spellings']} spellings)")
+    print(f"service, warm cache          {results['warm_seconds']:10.4f} s  {results['warm_provider_calls']} provider calls")
+    print(f"resolved {results['resolved']}/{args.rows}, cache hit rate {results['hit_rate']}, pending {cold['pending']}")
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Map heatmap payloads: every located expense vs tile cells.
+
+The legacy map downloads every expense with coordinates and bins nothing, so
+its payload grows with the row count. /api/heatmap-data returns one entry per
+tile at the map zoom plus a few levels of detail, capped at HEATMAP_MAX_CELLS.
+For each size this reports both payloads and the time to answer from built
+columns (fine zooms) and from stored rollup rows (coarse zooms). The rollup
+rows are aggregated the way the expenses-table triggers store them, and both
+paths must agree.
+
+Usage (from html_template/):
+    python -m benchmarks.bench_heatmap --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+
+import geo_tiles
+from benchmarks.bench_analytics import best_of
+from benchmarks.synthetic import make_expenses
+
+MAX_CELLS = 2000
+# Roughly the viewport map.html opens with: zoom 15 around the VIT campus
+VIEW_BBOX = (12.955, 79.135, 12.985, 79.175)
+
+
+def stored_rollups(rows):
+    """{zoom: [row, ...]} as the expenses-table triggers leave the geo cells table."""
+    located = [r for r in rows if r.get('latitude') is not None and r.get('longitude') is not None]
+    lat = [float(r['latitude']) for r in located]
+    lng = [float(r['longitude']) for r in located]
+    xs, ys = geo_tiles.tile_xy(lat, lng, geo_tiles.COARSE_MAX_ZOOM)
+    table = {}
+    for row, x, y, la, ln in zip(located, xs.tolist(), ys.tolist(), lat, lng):
+        value = row.get('amount_base')
+        amount = float((row.get('amount') if value is None else value) or 0)
+        for z in range(geo_tiles.COARSE_MAX_ZOOM + 1):
+            shift = geo_tiles.COARSE_MAX_ZOOM - z
+            key = (z, x >> shift, y >> shift, row.get('category') or 'Other')
+            cell = table.setdefault(key, [0.0, 0, 0.0, 0.0])
+            cell[0] += amount
+            cell[1] += 1
+            cell[2] += la
+            cell[3] += ln
+    by_zoom = {}
+    for (z, x, y, category), (amount, count, lat_sum, lng_sum) in table.items():
+        by_zoom.setdefault(z, []).append({
+            'tile_x': x, 'tile_y': y, 'category': category, 'amount': amount,
+            'tx_count': count, 'lat_sum': lat_sum, 'lng_sum': lng_sum,
+        })
+    return by_zoom
+
+
+def size_of(payload):
+    return len(json.dumps(payload, separators=(',', ':')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        rows = json.loads(json.dumps(make_expenses('bench-user', size, seed=7)))
+        legacy_bytes = size_of([r for r in rows if r.get('latitude') is not None])
+        build_s, columns = best_of(lambda: geo_tiles.GeoColumns.from_rows(rows), args.repeat)
+        rollup_rows = stored_rollups(rows)
+
+        for zoom, bbox in ((9, None), (15, VIEW_BBOX), (18, VIEW_BBOX)):
+            cell_zoom = min(zoom + 3, geo_tiles.MAX_ZOOM)
+            query_s, (used_zoom, cells) = best_of(lambda: columns.cells(cell_zoom, bbox, MAX_CELLS), args.repeat)
+            assert len(cells) <= MAX_CELLS
+            if bbox is None:
+                assert sum(c['count'] for c in cells) == len(columns)
+            rollup_ms = None
+            if cell_zoom <= geo_tiles.COARSE_MAX_ZOOM:
+                stored = rollup_rows[cell_zoom]
+                rollup_s, (_, from_rollups) = best_of(
+                    lambda: geo_tiles.cells_from_rollups(stored, cell_zoom, MAX_CELLS), args.repeat
+                )
+                assert {(c['quadkey'], c['count']) for c in from_rollups} == {(c['quadkey'], c['count']) for c in cells}
+                rollup_ms = round(rollup_s * 1000, 2)
+            results.append({
+                'rows': size,
+                'zoom': zoom,
+                'cell_zoom': used_zoom,
+                'cells': len(cells),
+                'legacy_kb': round(legacy_bytes / 1024, 1),
+                'cells_kb': round(size_of(cells) / 1024, 1),
+                'column_build_ms': round(build_s * 1000, 2),
+                'cells_ms': round(query_s * 1000, 2),
+                'rollup_cells_ms': rollup_ms,
+            })
+
+    print(f"{'rows':>9s} {'zoom':>5s} {'cell z':>7s} {'cells':>6s} {'legacy KB':>11s} {'cells KB':>9s} "
+          f"{'build ms':>9s} {'cells ms':>9s} {'rollup ms':>10s}")
+    for r in results:
+        rollup = f"{r['rollup_cells_ms']:10.2f}" if r['rollup_cells_ms'] is not None else f"{'-':>10s}"
+        print(f"{r['rows']:9d} {r['zoom']:5d} {r['cell_zoom']:7d} {r['cells']:6d} {r['legacy_kb']:11.1f} "
+              f"{r['cells_kb']:9.1f} {r['column_build_ms']:9.2f} {r['cells_ms']:9.2f} {rollup}")
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Import throughput and memory: one POST per row vs the streaming CSV import.
+
+The PostgREST stand-in runs in a child process with injected latency. The
+per-row path is timed on a sample and extrapolated, since running it for
+50k rows at realistic latency would take far too long.
+
+Usage (from html_template/):
+    python -m benchmarks.bench_import --rows 50000 --latency 0.02
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from benchmarks.bench_export import wait_for
+from benchmarks.synthetic import make_expenses
+
+COLUMNS = ('Date', 'Description', 'Amount', 'Category', 'Location', 'Notes', 'Currency')
+
+
+def statement_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for row in rows:
+        writer.writerow([row['date'], row['title'], row['amount'], row['category'],
+                         row['location'], row['notes'] or '', row['currency']])
+    return buffer.getvalue().encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--sample', type=int, default=200, help='rows timed on the per-row path')
+    parser.add_argument('--latency', type=float, default=0.02, help='injected upstream latency in seconds')
+    parser.add_argument('--port', type=int, default=54335)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    url = f'http://127.0.0.1:{args.port}'
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.fake_postgrest', '--port', str(args.port), '--latency', str(args.latency)],
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_for(url)
+        os.environ['SUPABASE_URL'] = url
+        import app as aureus
+
+        client = aureus.app.test_client()
+        rows = make_expenses('bench-user', args.rows, seed=3)
+        body = statement_csv(rows)
+
+        started = time.perf_counter()
+        for row in rows[:args.sample]:
+            client.post('/api/expenses', json=row, headers={'X-User-ID': 'per-row-user'})
+        per_row = (time.perf_counter() - started) / args.sample
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        response = client.post(
+            '/api/expenses/import',
+            data={'file': (io.BytesIO(body), 'statement.csv')},
+            headers={'X-User-ID': 'bench-user'},
+            content_type='multipart/form-data',
+        )
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        summary = response.get_json()
+
+        started = time.perf_counter()
+        again = client.post('/api/expenses/import', data=body, headers={'X-User-ID': 'bench-user'},
+                            content_type='text/csv').get_json()
+        reimport = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+    results = {
+        'rows': args.rows,
+        'latency_s': args.latency,
+        'per_row_estimated_seconds': round(per_row * args.rows, 1),
+        'import_seconds': round(elapsed, 2),
+        'import_rows_per_s': round(args.rows / elapsed, 1),
+        'import_peak_python_memory_mb': round(peak / 1e6, 2),
+        'csv_mb': round(len(body) / 1e6, 2),
+        'inserted': summary['inserted'],
+        'duplicates': summary['duplicates'],
+        'reimport_seconds': round(reimport, 2),
+        'reimport_inserted': again['inserted'],
+    }
+    print(f"per-row inserts (estimated)  {results['per_row_estimated_seconds']:10.1f} s")
+    print(f"streaming import             {results['import_seconds']:10.2f} s  "
+          f"{results['import_rows_per_s']:9.0f} rows/s  peak={results['import_peak_python_memory_mb']} MB "
+          f"(csv {results['csv_mb']} MB)")
+    print(f"inserted={results['inserted']} duplicates={results['duplicates']}  "
+          f"re-import inserted={results['reimport_inserted']} in {results['reimport_seconds']} s")
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
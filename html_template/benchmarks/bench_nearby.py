@@ -0,0 +1,148 @@
+"""
+Nearby-expense queries: linear scans vs the per-user grid index.
+
+Points are spread over a city-sized area (about 50 km across) so results
+stay small, as they are for a real "what did I spend around here" query.
+Each query shape -- 500 m radius, a ~1 km box and the 10 nearest -- is timed
+as a Python loop over the row dicts (what filtering in the browser amounts
+to), as a vectorized NumPy scan over every point, and through the index.
+Index answers are checked against the scan.
+
+Usage (from html_template/):
+    python -m benchmarks.bench_nearby --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import math
+import random
+import time
+
+import numpy as np
+
+import spatial_index
+from benchmarks.synthetic import make_expenses
+
+CENTER = (12.9698, 79.1565)
+SPREAD_DEG = 0.45
+
+
+def spread(rows, seed):
+    rng = random.Random(seed)
+    for row in rows:
+        row['latitude'] = CENTER[0] + (rng.random() - 0.5) * SPREAD_DEG
+        row['longitude'] = CENTER[1] + (rng.random() - 0.5) * SPREAD_DEG
+    return rows
+
+
+def loop_radius(rows, lat, lng, radius):
+    found = []
+    for row in rows:
+        p1, p2 = math.radians(lat), math.radians(row['latitude'])
+        dl = math.radians(row['longitude'] - lng)
+        a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+        d = 2 * spatial_index.EARTH_RADIUS_M * math.asin(math.sqrt(min(a, 1.0)))
+        if d <= radius:
+            found.append((d, row))
+    return sorted(found, key=lambda item: item[0])
+
+
+def loop_bbox(rows, bbox):
+    south, west, north, east = bbox
+    return [r for r in rows if south <= r['latitude'] <= north and west <= r['longitude'] <= east]
+
+
+def ids_of(shape, result):
+    if shape == 'bbox_1km':
+        return [row['id'] for row in result[1]]
+    found = result[1] if shape == 'radius_500m' else result
+    return [row['id'] for _, row in found]
+
+
+def timed(fn, queries, repeat):
+    """Best-of-``repeat`` mean milliseconds per query, plus the results of the last pass."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        results = [fn(q) for q in queries]
+        elapsed = (time.perf_counter() - started) / len(queries)
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 4), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    points = [
+        (CENTER[0] + (rng.random() - 0.5) * SPREAD_DEG, CENTER[1] + (rng.random() - 0.5) * SPREAD_DEG)
+        for _ in range(args.queries)
+    ]
+    boxes = [(lat - 0.0045, lng - 0.0045, lat + 0.0045, lng + 0.0045) for lat, lng in points]
+
+    results = []
+    for size in args.sizes:
+        rows = spread(json.loads(json.dumps(make_expenses('bench-user', size, seed=7))), seed=3)
+        for i, row in enumerate(rows):
+            row['id'] = i
+        lats = np.array([r['latitude'] for r in rows])
+        lngs = np.array([r['longitude'] for r in rows])
+
+        started = time.perf_counter()
+        index = spatial_index.GridIndex(rows)
+        build_ms = round((time.perf_counter() - started) * 1000, 2)
+
+        def numpy_radius(q):
+            d = spatial_index.haversine_m(q[0], q[1], lats, lngs)
+            hits = np.flatnonzero(d <= 500)
+            return hits[np.argsort(d[hits])]
+
+        def numpy_bbox(b):
+            return np.flatnonzero((lats >= b[0]) & (lats <= b[2]) & (lngs >= b[1]) & (lngs <= b[3]))
+
+        def numpy_nearest(q):
+            return np.argsort(spatial_index.haversine_m(q[0], q[1], lats, lngs))[:10]
+
+        shapes = {
+            'radius_500m': (
+                lambda q: loop_radius(rows, q[0], q[1], 500), numpy_radius,
+                lambda q: index.within_radius(q[0], q[1], 500), points,
+            ),
+            'bbox_1km': (lambda b: loop_bbox(rows, b), numpy_bbox, lambda b: index.within_bbox(b), boxes),
+            'nearest_10': (None, numpy_nearest, lambda q: index.nearest(q[0], q[1], 10), points),
+        }
+        for shape, (loop_fn, numpy_fn, index_fn, queries) in shapes.items():
+            # The per-dict loop is far too slow to repeat at the larger sizes
+            loop_ms = timed(loop_fn, queries[:20], 1)[0] if loop_fn is not None else None
+            numpy_ms, expected = timed(numpy_fn, queries, args.repeat)
+            index_ms, got = timed(index_fn, queries, args.repeat)
+            for want, have in zip(expected, got):
+                assert sorted(ids_of(shape, have)) == sorted(want.tolist()), shape
+            results.append({
+                'rows': size,
+                'query': shape,
+                'index_build_ms': build_ms,
+                'avg_hits': round(sum(len(w) for w in expected) / len(expected), 1),
+                'loop_ms': loop_ms,
+                'numpy_scan_ms': numpy_ms,
+                'index_ms': index_ms,
+                'speedup_vs_scan': round(numpy_ms / index_ms, 1),
+            })
+
+    print(f"{'rows':>9s} {'query':>12s} {'build ms':>9s} {'hits':>6s} {'loop ms':>9s} "
+          f"{'scan ms':>9s} {'index ms':>9s} {'vs scan':>8s}")
+    for r in results:
+        loop = f"{r['loop_ms']:9.3f}" if r['loop_ms'] is not None else f"{'-':>9s}"
+        print(f"{r['rows']:9d} {r['query']:>12s} {r['index_build_ms']:9.2f} {r['avg_hits']:6.1f} {loop} "
+              f"{r['numpy_scan_ms']:9.4f} {r['index_ms']:9.4f} {r['speedup_vs_scan']:8.1f}")
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Cost of the sampling profiler on CPU-heavy requests.
+
+Each route is timed with sampling off, with only the measured requests
+sampled (X-Profile: 1 plus the admin token) and with the whole worker
+sampled. The wall-clock difference is compared with the overhead the
+profiler measures itself (time in its signal handler over sampled CPU time),
+and a few of the slowest requests are shown with their phase timings.
+The PostgREST stand-in runs in a child process so its CPU is not sampled.
+
+Usage (from html_template/):
+    python -m benchmarks.bench_profiler --rows 20000 --interval-ms 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_export import wait_for
+
+ROUTES = [
+    '/api/analytics?granularity=day&from=2020-01-01&to=2026-12-31',
+    '/api/dashboard',
+    '/api/csv-export',
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--port', type=int, default=54331)
+    parser.add_argument('--requests', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--interval-ms', type=int, default=10)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    url = f'http://127.0.0.1:{args.port}'
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.fake_postgrest', '--port', str(args.port), '--rows', str(args.rows)],
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_for(url)
+        os.environ['SUPABASE_URL'] = url
+        os.environ['ADMIN_TOKEN'] = 'bench-admin'
+        os.environ['PROFILER_INTERVAL_MS'] = str(args.interval_ms)
+        import app as aureus
+
+        client = aureus.app.test_client()
+        user = {'X-User-ID': 'bench-user'}
+        admin = {'X-Admin-Token': 'bench-admin'}
+        profiled = {**user, **admin, 'X-Profile': '1'}
+
+        def run(route, headers):
+            best = None
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                for _ in range(args.requests):
+                    assert client.get(route, headers=headers).status_code == 200, route
+                elapsed = (time.perf_counter() - started) / args.requests
+                best = elapsed if best is None else min(best, elapsed)
+            return best * 1000.0
+
+        results = []
+        for route in ROUTES:
+            client.get(route, headers=user)  # fill the snapshot cache
+            baseline = run(route, user)
+
+            client.post('/api/admin/profile', headers=admin, json={'reset': True})
+            per_request = run(route, profiled)
+            per_request_stats = aureus._profiler.stats()
+
+            client.post('/api/admin/profile', headers=admin, json={'enabled': True, 'reset': True})
+            worker_wide = run(route, user)
+            stats = client.post('/api/admin/profile', headers=admin, json={'enabled': False}).get_json()['profiler']
+
+            results.append({
+                'route': route,
+                'off_ms': round(baseline, 3),
+                'per_request_ms': round(per_request, 3),
+                'worker_wide_ms': round(worker_wide, 3),
+                'wall_overhead_pct': round((worker_wide / baseline - 1) * 100.0, 2),
+                'measured_overhead_pct': stats['overhead_pct'],
+                'samples': stats['samples'] + per_request_stats['samples'],
+            })
+        slowest = client.get('/api/admin/slow-requests', headers=admin).get_json()['requests'][:5]
+        top_stacks = client.get('/api/admin/profile', headers=admin).get_data(as_text=True).splitlines()[:5]
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"{'route':>64s} {'off ms':>8s} {'req ms':>8s} {'wide ms':>8s} {'wall %':>7s} {'meas %':>7s} {'samples':>8s}")
+    for r in results:
+        measured = f"{r['measured_overhead_pct']:7.2f}" if r['measured_overhead_pct'] is not None else f"{'-':>7s}"
+        print(f"{r['route']:>64s} {r['off_ms']:8.2f} {r['per_request_ms']:8.2f} {r['worker_wide_ms']:8.2f} "
+              f"{r['wall_overhead_pct']:7.2f} {measured} {r['samples']:8d}")
+    print('\nslowest requests:')
+    for r in slowest:
+        print(f"  {r['duration_ms']:9.2f} ms  {r['method']} {r['path']}  {r['phases_ms']}")
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump({'rows': args.rows, 'interval_ms': args.interval_ms, 'results': results,
+                       'slowest': slowest, 'top_stacks': top_stacks}, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
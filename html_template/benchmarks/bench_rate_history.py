@@ -0,0 +1,121 @@
+"""
+Dated conversions: one upstream lookup per date vs the local as-of store.
+
+A synthetic daily series (weekdays only, like ECB reference rates) stands in
+for the provider. The per-date path asks a stub provider with injected
+latency once per distinct date, which is what converting old expenses cost
+without a local history. The history path is a single dated batch request.
+
+Usage (from html_template/):
+    python -m benchmarks.bench_rate_history --items 50000 --years 5 --latency 0.05
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+import rate_history
+
+CODES = ('USD', 'EUR', 'GBP', 'JPY', 'CAD', 'AUD', 'INR')
+USD_RATES = {'EUR': 0.92, 'GBP': 0.79, 'JPY': 149.5, 'CAD': 1.36, 'AUD': 1.52, 'INR': 83.1}
+
+
+def synthetic_quotes(start, end, seed=0):
+    """Weekday quotes drifting around the fixed table, per USD."""
+    rng = random.Random(seed)
+    quotes, drift = {}, 1.0
+    day = start
+    while day <= end:
+        drift *= 1 + rng.gauss(0, 0.002)
+        if day.weekday() < 5:
+            quotes[day.isoformat()] = {c: v * drift for c, v in USD_RATES.items()}
+        day += timedelta(days=1)
+    return quotes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=50000, help='at most CONVERT_BATCH_MAX')
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.05, help='per-lookup provider latency in seconds')
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    end = date.today()
+    start = end - timedelta(days=365 * args.years)
+    quotes = synthetic_quotes(start, end)
+    path = os.path.join(tempfile.mkdtemp(), 'rate-history.npz')
+    os.environ['RATE_HISTORY_PATH'] = path
+
+    history = rate_history.RateHistory('USD')
+    calls = []
+
+    def fetch(a, b):
+        calls.append((a, b))
+        return {d: q for d, q in quotes.items() if a.isoformat() <= d <= b.isoformat()}
+
+    started = time.perf_counter()
+    rate_history.sync(history, fetch, start, end)
+    history.save(path)
+    sync_seconds = time.perf_counter() - started
+    first_calls = len(calls)
+    rate_history.sync(history, fetch, start, end)
+    repeat_calls = len(calls) - first_calls
+
+    rng = random.Random(1)
+    span = (end - start).days
+    items = [
+        {'amount': round(rng.uniform(1, 5000), 2), 'from': rng.choice(CODES), 'to': rng.choice(CODES),
+         'date': (start + timedelta(days=rng.randrange(span))).isoformat()}
+        for _ in range(args.items)
+    ]
+    distinct_dates = len({item['date'] for item in items})
+
+    import app as aureus  # after RATE_HISTORY_PATH is set
+    client = aureus.app.test_client()
+    started = time.perf_counter()
+    response = client.post('/api/currency-convert/batch', json={'items': items})
+    batch_seconds = time.perf_counter() - started
+    body = response.get_json()
+
+    # Spot-check against a direct lookup of the latest quote on or before each date
+    keys = sorted(quotes)
+    mismatches = 0
+    for k in rng.sample(range(args.items), min(1000, args.items)):
+        item = items[k]
+        day = keys[max(0, np.searchsorted(keys, item['date'], side='right') - 1)]
+        rates = dict(quotes[day], USD=1.0)
+        expected = round(item['amount'] * rates[item['to']] / rates[item['from']], 2)
+        mismatches += abs(expected - (body['converted'][k] or 0)) > 0.011
+
+    results = {
+        'items': args.items,
+        'distinct_dates': distinct_dates,
+        'sync_seconds': round(sync_seconds, 3),
+        'sync_provider_calls': first_calls,
+        'resync_provider_calls': repeat_calls,
+        'per_date_estimated_seconds': round(distinct_dates * args.latency, 1),
+        'history_batch_seconds': round(batch_seconds, 3),
+        'history_items_per_s': round(args.items / batch_seconds, 1),
+        'errors': len(body['errors']),
+        'mismatches': mismatches,
+    }
+    print(f"sync: {results['sync_provider_calls']} provider calls in {results['sync_seconds']} s, "
+          f"re-sync {results['resync_provider_calls']} calls")
+    print(f"per-date lookups (estimated) {results['per_date_estimated_seconds']:9.1f} s  "
+          f"({distinct_dates} dates x {args.latency * 1000:.0f} ms)")
+    print(f"history batch                {results['history_batch_seconds']:9.3f} s  "
+          f"{results['history_items_per_s']:10.1f} items/s")
+    print(f"{results['errors']} errors, {mismatches} mismatches in a 1000-item sample")
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
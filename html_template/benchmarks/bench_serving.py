@@ -0,0 +1,143 @@
+"""
+Concurrent-request capacity of the sync and gevent gunicorn workers.
+
+Starts the PostgREST stand-in with injected latency, then runs gunicorn with
+the same worker count under each worker class and drives GET /api/expenses
+(two upstream round trips per request) at increasing client concurrency.
+Worker memory is the summed RSS of the gunicorn worker processes.
+
+Usage (from html_template/):
+    python -m benchmarks.bench_serving --latency 0.05 --concurrency 2,16,64,128
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.bench_export import wait_for
+from benchmarks.bench_supabase_client import percentile
+
+
+def wait_for_app(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(f'{url}/api/health', timeout=5)
+            return
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f'gunicorn at {url} did not start')
+
+
+def worker_rss_mb(master_pid):
+    """Summed resident memory of the master's child processes, in MB."""
+    total_kb = 0
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f'/proc/{pid}/status') as fh:
+                status = dict(line.split(':', 1) for line in fh if ':' in line)
+        except OSError:
+            continue
+        if status.get('PPid', '').strip() == str(master_pid):
+            total_kb += int(status.get('VmRSS', '0 kB').split()[0])
+    return round(total_kb / 1024, 1)
+
+
+def load(url, concurrency, seconds):
+    deadline = time.perf_counter() + seconds
+    session_headers = {'X-User-ID': 'bench-user'}
+
+    def client(_):
+        session = requests.Session()
+        samples, errors = [], 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = session.get(f'{url}/api/expenses?limit=20', headers=session_headers, timeout=30)
+                ok = response.status_code == 200
+            except requests.exceptions.RequestException:
+                ok = False
+            if ok:
+                samples.append((time.perf_counter() - started) * 1000.0)
+            else:
+                errors += 1
+        return samples, errors
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(client, range(concurrency)))
+    samples = [s for batch, _ in outcomes for s in batch]
+    return {
+        'concurrency': concurrency,
+        'throughput_rps': round(len(samples) / seconds, 1),
+        'p50_ms': round(percentile(samples, 50), 1) if samples else None,
+        'p99_ms': round(percentile(samples, 99), 1) if samples else None,
+        'errors': sum(errors for _, errors in outcomes),
+    }
+
+
+def serve(worker_class, port, env, args):
+    command = [
+        sys.executable, '-m', 'gunicorn', 'app:app', '--config', 'gunicorn.conf.py',
+        '--bind', f'127.0.0.1:{port}', '--workers', str(args.workers),
+        '--worker-class', worker_class, '--log-level', 'warning',
+    ]
+    env = dict(env, GUNICORN_WORKER_CLASS=worker_class)
+    master = subprocess.Popen(command, env=env)
+    url = f'http://127.0.0.1:{port}'
+    try:
+        wait_for_app(url)
+        requests.get(f'{url}/api/expenses?limit=20', headers={'X-User-ID': 'bench-user'}, timeout=30)
+        levels = []
+        for concurrency in args.concurrency:
+            stats = load(url, concurrency, args.seconds)
+            stats['worker_rss_mb'] = worker_rss_mb(master.pid)
+            levels.append(stats)
+            print(f"{worker_class:6s} c={concurrency:4d}  {stats['throughput_rps']:8.1f} req/s  "
+                  f"p50={stats['p50_ms']} ms  p99={stats['p99_ms']} ms  errors={stats['errors']}  "
+                  f"rss={stats['worker_rss_mb']} MB", flush=True)
+        return levels
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.05, help='injected upstream latency in seconds')
+    parser.add_argument('--concurrency', type=lambda v: [int(c) for c in v.split(',')], default=[2, 16, 64, 128])
+    parser.add_argument('--seconds', type=float, default=5.0, help='duration of each load level')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=54331)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    upstream_port = args.port + 1
+    upstream_url = f'http://127.0.0.1:{upstream_port}'
+    upstream = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.fake_postgrest', '--port', str(upstream_port),
+         '--rows', '2000', '--latency', str(args.latency)],
+        stdout=subprocess.DEVNULL,
+    )
+    env = dict(os.environ, SUPABASE_URL=upstream_url, SUPABASE_SERVICE_KEY='bench-key')
+    try:
+        wait_for(upstream_url)
+        results = {worker_class: serve(worker_class, args.port, env, args) for worker_class in ('sync', 'gevent')}
+    finally:
+        upstream.terminate()
+        upstream.wait()
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump({'latency': args.latency, 'workers': args.workers, 'results': results}, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Compare the legacy per-call ``requests.get`` path with the pooled SupabaseClient.
+
+Runs against a local PostgREST stand-in, so the numbers only capture TCP
+connection setup and header handling; over TLS to a real project the gap is
+larger because every legacy call also pays a full handshake.
+
+Usage (from html_template/):
+    python -m benchmarks.bench_supabase_client --requests 2000 --threads 4
+"""
+import argparse
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.fake_postgrest import FakePostgrest
+from benchmarks.synthetic import make_expenses
+from supabase_client import SupabaseClient
+
+ENDPOINT = 'app_7433469c6a_expenses?user_id=eq.bench-user&order=date.desc&limit=20'
+
+
+def legacy_request(base_url, key):
+    """The pre-pool implementation: new headers and a new connection per call."""
+    headers = {
+        'apikey': key,
+        'Authorization': f'Bearer {key}',
+        'Content-Type': 'application/json'
+    }
+    response = requests.get(f'{base_url}/rest/v1/{ENDPOINT}', headers=headers)
+    response.raise_for_status()
+    return response.json()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run(call, total, threads):
+    def timed(_):
+        start = time.perf_counter()
+        call()
+        return (time.perf_counter() - start) * 1000.0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        samples = list(pool.map(timed, range(total)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': total,
+        'throughput_rps': round(total / elapsed, 1),
+        'p50_ms': round(statistics.median(samples), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.0, help='injected upstream latency in seconds')
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    with FakePostgrest(latency=args.latency) as fake:
+        fake.insert('app_7433469c6a_expenses', make_expenses('bench-user', 200))
+        key = 'bench-key'
+        client = SupabaseClient(fake.url, key, pool_size=args.threads)
+
+        # Warm both paths once so imports and the first connection are excluded
+        legacy_request(fake.url, key)
+        client.request('GET', ENDPOINT)
+
+        results = {
+            'legacy_requests_get': run(lambda: legacy_request(fake.url, key), args.requests, args.threads),
+            'pooled_client': run(lambda: client.request('GET', ENDPOINT), args.requests, args.threads),
+        }
+        client.close()
+
+    for name, stats in results.items():
+        print(f"{name:22s} p50={stats['p50_ms']:8.3f} ms  p99={stats['p99_ms']:8.3f} ms  "
+              f"{stats['throughput_rps']:8.1f} req/s")
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Throughput of POST /api/expenses: synchronous inserts vs write-behind.
+
+The PostgREST stand-in runs in a child process with injected latency. Each
+mode runs in its own app process (write-behind is chosen at import time) and
+is driven by concurrent clients through the Flask test client, so the numbers
+reflect per-request upstream waits rather than HTTP parsing.
+
+Usage (from html_template/):
+    python -m benchmarks.bench_write_behind --requests 2000 --threads 8 --latency 0.02
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.bench_export import wait_for
+
+DRIVER = r'''
+import json, sys, time
+from concurrent.futures import ThreadPoolExecutor
+import app as aureus
+from benchmarks.bench_supabase_client import percentile
+from benchmarks.synthetic import make_expenses
+
+total, threads = int(sys.argv[1]), int(sys.argv[2])
+rows = make_expenses('bench-user', total, seed=5)
+
+def post(row):
+    client = aureus.app.test_client()
+    started = time.perf_counter()
+    response = client.post('/api/expenses', json=row, headers={'X-User-ID': 'bench-user'})
+    assert response.status_code in (201, 202), response.status_code
+    return (time.perf_counter() - started) * 1000.0
+
+started = time.perf_counter()
+with ThreadPoolExecutor(max_workers=threads) as pool:
+    samples = list(pool.map(post, rows))
+acknowledged = time.perf_counter() - started
+queue = aureus._write_behind
+if queue is not None:
+    queue.drain(120)
+durable = time.perf_counter() - started
+print(json.dumps({
+    'requests': total,
+    'ack_throughput_rps': round(total / acknowledged, 1),
+    'stored_throughput_rps': round(total / durable, 1),
+    'p50_ms': round(percentile(samples, 50), 2),
+    'p99_ms': round(percentile(samples, 99), 2),
+    'queue': queue.stats() if queue is not None else None,
+}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.02, help='injected upstream latency in seconds')
+    parser.add_argument('--port', type=int, default=54337)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    url = f'http://127.0.0.1:{args.port}'
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.fake_postgrest', '--port', str(args.port), '--latency', str(args.latency)],
+        stdout=subprocess.DEVNULL,
+    )
+    results = {}
+    try:
+        wait_for(url)
+        with tempfile.TemporaryDirectory() as journal:
+            for mode in ('sync', 'write_behind'):
+                env = dict(os.environ, SUPABASE_URL=url, WRITE_BEHIND='1' if mode == 'write_behind' else '0',
+                           WRITE_BEHIND_DIR=journal, SUPABASE_POOL_SIZE=str(args.threads))
+                out = subprocess.run(
+                    [sys.executable, '-c', DRIVER, str(args.requests), str(args.threads)],
+                    env=env, capture_output=True, text=True, check=True,
+                ).stdout
+                results[mode] = json.loads(out.strip().splitlines()[-1])
+    finally:
+        server.terminate()
+        server.wait()
+
+    for mode, stats in results.items():
+        print(f"{mode:13s} ack={stats['ack_throughput_rps']:8.1f} req/s  stored={stats['stored_throughput_rps']:8.1f} rows/s  "
+              f"p50={stats['p50_ms']:7.2f} ms  p99={stats['p99_ms']:7.2f} ms")
+    queue = results['write_behind']['queue']
+    print(f"write-behind flushes={queue['flushes']} flush p50={queue['flush_latency_p50_ms']} ms "
+          f"p99={queue['flush_latency_p99_ms']} ms")
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,402 @@
+"""
+Local stand-in for the Supabase PostgREST API used by the benchmarks.
+
+Implements the subset of PostgREST the app relies on: column projection,
+``col=op.value`` filters (eq, neq, gt, gte, lt, lte, in, is), ``or=(...)``
+groups, multi-column ``order``, ``limit``/``offset`` and inserts with the
+``Prefer`` return/resolution options, and filtered deletes. Latency and 5xx
+errors can be injected.
+"""
+import json
+import operator
+import random
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, unquote
+
+_RESERVED_PARAMS = {'select', 'order', 'limit', 'offset', 'or', 'and', 'on_conflict', 'columns'}
+
+
+def _split_top_level(text, sep=','):
+    """Split on ``sep`` while ignoring separators nested in parentheses."""
+    parts, depth, current = [], 0, []
+    for ch in text:
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        if ch == sep and depth == 0:
+            parts.append(''.join(current))
+            current = []
+        else:
+            current.append(ch)
+    if current:
+        parts.append(''.join(current))
+    return parts
+
+
+def _coerce(raw, sample):
+    if isinstance(sample, bool):
+        return raw == 'true'
+    if isinstance(sample, (int, float)):
+        try:
+            return float(raw)
+        except ValueError:
+            return raw
+    return raw
+
+
+_COMPARATORS = {
+    'eq': operator.eq,
+    'neq': operator.ne,
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+}
+
+
+def _match(row, column, op, value):
+    current = row.get(column)
+    if op == 'is':
+        return current is None if value == 'null' else str(current).lower() == value
+    if current is None:
+        return False
+    if op == 'in':
+        options = [v.strip('"') for v in value.strip('()').split(',')]
+        return str(current) in options or any(_coerce(o, current) == current for o in options)
+    compare = _COMPARATORS.get(op)
+    if compare is None:
+        return False
+    if isinstance(current, str):
+        return compare(current, value)
+    other = _coerce(value, current)
+    if not isinstance(other, (int, float)):
+        current = str(current)
+    try:
+        return compare(current, other)
+    except TypeError:
+        return False
+
+
+def _compile_condition(expr):
+    """Compile ``col.op.value`` or ``and(...)``/``or(...)`` into a predicate."""
+    expr = expr.strip()
+    for group in ('and', 'or'):
+        if expr.startswith(group + '('):
+            inner = [_compile_condition(p) for p in _split_top_level(expr[len(group) + 1:-1])]
+            if group == 'and':
+                return lambda row: all(p(row) for p in inner)
+            return lambda row: any(p(row) for p in inner)
+    column, op, value = expr.split('.', 2)
+    return lambda row: _match(row, column, op, value)
+
+
+def _latest_insight(fake, p_user_id, p_insight_type='precomputed'):
+    """The latest_insight RPC (see supabase/migrations): newest stored row plus the current data version."""
+    with fake._lock:
+        stored = [
+            r for r in fake.tables.get('app_7433469c6a_ai_insights', [])
+            if str(r.get('user_id')) == p_user_id and r.get('insight_type') == p_insight_type
+        ]
+        total = next((
+            r for r in fake.tables.get('app_7433469c6a_expense_rollups', [])
+            if r.get('user_id') == p_user_id and r.get('bucket') == 'total'
+        ), None)
+    latest = stored[-1] if stored else {}
+    return [{
+        'id': latest.get('id'),
+        'insight_text': latest.get('insight_text'),
+        'data_version': latest.get('data_version'),
+        'created_at': latest.get('created_at'),
+        'current_version': f"{total['updated_at']}|{total['tx_count']}" if total else '',
+    }]
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """Request handler plumbing shared by the stand-ins; ``server_fake`` is the service."""
+
+    protocol_version = 'HTTP/1.1'
+    server_fake = None
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out as separate writes; avoid Nagle/delayed-ACK stalls on keep-alive
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, payload, extra_headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (extra_headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'null') if length else None
+
+    def _preflight(self):
+        fake = self.server_fake
+        with fake._lock:
+            fake.request_count += 1
+            failed = fake.error_rate and fake._random.random() < fake.error_rate
+        if fake.latency:
+            time.sleep(fake.latency)
+        if failed:
+            self._send_json(503, {'message': 'injected failure'})
+            return False
+        return True
+
+
+class _Handler(ServiceHandler):
+    def _route(self):
+        parts = urlsplit(self.path)
+        path = unquote(parts.path)
+        params = parse_qsl(parts.query, keep_blank_values=True)
+        prefix = '/rest/v1/'
+        if not path.startswith(prefix):
+            return None, None, params
+        resource = path[len(prefix):]
+        if resource.startswith('rpc/'):
+            return 'rpc', resource[4:], params
+        return 'table', resource, params
+
+    def do_GET(self):
+        if not self._preflight():
+            return
+        kind, name, params = self._route()
+        if kind != 'table':
+            self._send_json(404, {'message': 'not found'})
+            return
+        rows = self.server_fake.query(name, params)
+        self._send_json(200, rows, {'Content-Range': f'0-{max(len(rows) - 1, 0)}/*'})
+
+    def do_DELETE(self):
+        if not self._preflight():
+            return
+        kind, name, params = self._route()
+        if kind != 'table':
+            self._send_json(404, {'message': 'not found'})
+            return
+        self.server_fake.delete(name, params)
+        self.send_response(204)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        body = self._read_body()
+        if not self._preflight():
+            return
+        kind, name, params = self._route()
+        fake = self.server_fake
+        if kind == 'rpc':
+            handler = fake.rpc.get(name)
+            if handler is None:
+                self._send_json(404, {'message': f'function {name} not found'})
+                return
+            self._send_json(200, handler(fake, **(body or {})))
+            return
+        if kind != 'table':
+            self._send_json(404, {'message': 'not found'})
+            return
+        prefer = self.headers.get('Prefer', '')
+        resolution = None
+        for option in ('merge-duplicates', 'ignore-duplicates'):
+            if f'resolution={option}' in prefer:
+                resolution = option
+        rows = body if isinstance(body, list) else [body or {}]
+        inserted = fake.insert(name, rows, on_conflict=dict(params).get('on_conflict'), resolution=resolution)
+        if 'return=representation' in prefer:
+            self._send_json(201, inserted)
+        else:
+            self.send_response(201)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # A client that gave up on a slow response is expected under load
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class FakeService:
+    """An HTTP stand-in served from a background thread, with latency and error injection."""
+
+    handler = None  # a ServiceHandler subclass
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._server = None
+        self._thread = None
+
+    # -- server lifecycle -----------------------------------------------
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self, host='127.0.0.1', port=0):
+        fake = self
+
+        class Handler(self.handler):
+            server_fake = fake
+
+        self._server = _Server((host, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakePostgrest(FakeService):
+    """In-memory PostgREST stand-in served from a background thread."""
+
+    handler = _Handler
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        super().__init__(latency, error_rate, seed)
+        self.tables = {}
+        self._by_user = {}  # table -> user_id -> rows, so per-user queries skip other users
+        self.rpc = {'app_7433469c6a_latest_insight': _latest_insight}
+        self._ids = {}
+
+    # -- data helpers -------------------------------------------------
+    def insert(self, table, rows, on_conflict=None, resolution=None):
+        inserted = []
+        with self._lock:
+            store = self.tables.setdefault(table, [])
+            index = None
+            if on_conflict:
+                keys = on_conflict.split(',')
+                index = {tuple(r.get(k) for k in keys): r for r in store}
+            for row in rows:
+                row = dict(row)
+                if index is not None:
+                    key = tuple(row.get(k) for k in keys)
+                    existing = index.get(key)
+                    if existing is not None:
+                        if resolution == 'merge-duplicates':
+                            existing.update(row)
+                            inserted.append(existing)
+                        continue
+                if 'id' not in row or row['id'] is None:
+                    self._ids[table] = self._ids.get(table, 0) + 1
+                    row['id'] = self._ids[table]
+                store.append(row)
+                self._by_user.setdefault(table, {}).setdefault(str(row.get('user_id')), []).append(row)
+                if index is not None:
+                    index[key] = row
+                inserted.append(row)
+        return inserted
+
+    def _scope(self, table, params):
+        """Rows a query can match: one user's when it filters on user_id=eq, else the whole table."""
+        for key, value in params:
+            if key == 'user_id' and value.startswith('eq.'):
+                return self._by_user.get(table, {}).get(value[3:], [])
+        return self.tables.get(table, [])
+
+    @staticmethod
+    def _predicates(params):
+        predicates = []
+        for key, value in params:
+            if key in ('or', 'and'):
+                predicates.append(_compile_condition(f'{key}{value}'))
+            elif key not in _RESERVED_PARAMS:
+                op, _, operand = value.partition('.')
+                predicates.append(_compile_condition(f'{key}.{op}.{operand}'))
+        return predicates
+
+    def query(self, table, params):
+        predicates = self._predicates(params)
+        with self._lock:
+            result = [r for r in self._scope(table, params) if all(p(r) for p in predicates)]
+
+        options = dict(params)
+        if 'order' in options:
+            for term in reversed(options['order'].split(',')):
+                column, _, direction = term.partition('.')
+                descending = direction.startswith('desc')
+                # Postgres puts NULLs first when descending unless told otherwise
+                nulls_first = 'nullsfirst' in direction or (descending and 'nullslast' not in direction)
+                result.sort(
+                    key=lambda r: (
+                        (r.get(column) is None) != (nulls_first != descending),
+                        r.get(column) if r.get(column) is not None else '',
+                    ),
+                    reverse=descending,
+                )
+        offset = int(options.get('offset', 0))
+        limit = options.get('limit')
+        result = result[offset:offset + int(limit)] if limit is not None else result[offset:]
+
+        select = options.get('select', '*')
+        columns = [c.strip() for c in select.split(',') if c.strip()]
+        if '*' not in columns:
+            result = [{c: r.get(c) for c in columns} for r in result]
+        return result
+
+    def delete(self, table, params):
+        predicates = self._predicates(params)
+        with self._lock:
+            doomed = {id(r) for r in self._scope(table, params) if all(p(r) for p in predicates)}
+            if doomed:
+                self.tables[table] = [r for r in self.tables.get(table, []) if id(r) not in doomed]
+                for user, rows in self._by_user.get(table, {}).items():
+                    self._by_user[table][user] = [r for r in rows if id(r) not in doomed]
+        return len(doomed)
+
+
+def main():
+    import argparse
+    from benchmarks.synthetic import make_expenses
+
+    parser = argparse.ArgumentParser(description='Run the PostgREST stand-in in the foreground')
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed-user', default='bench-user')
+    parser.add_argument('--rows', type=int, default=0, help='synthetic expenses to seed for --seed-user')
+    args = parser.parse_args()
+
+    fake = FakePostgrest(latency=args.latency, error_rate=args.error_rate)
+    if args.rows:
+        fake.insert('app_7433469c6a_expenses', make_expenses(args.seed_user, args.rows))
+    fake.start(port=args.port)
+    print(f'PostgREST stand-in listening on {fake.url}', flush=True)
+    try:
+        fake._thread.join()
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Local stand-ins for the exchange-rate providers and the geocoder.
+
+``FakeRates`` answers like exchangerate-api.com (``/<key>/latest/<base>``),
+exchangerate.host (``/latest?base=``) and Frankfurter (``/<start>..<end>``)
+at once, so one instance can back any of them. Rates are a fixed table with a
+small day-to-day wobble so a history looks like one. ``FakeNominatim`` answers
+``/search`` and ``/reverse`` from the synthetic locations, and any other place
+with a deterministic point near them. Both inject latency and errors like the
+PostgREST stand-in.
+
+``python -m benchmarks.fake_upstreams`` serves PostgREST (seeded with one
+synthetic user per ``--sizes`` entry), both rate providers and the geocoder
+from one process and prints their URLs as one JSON line once listening.
+"""
+import argparse
+import json
+import math
+import sys
+import zlib
+from datetime import date, timedelta
+from urllib.parse import urlsplit, parse_qsl, unquote
+
+from benchmarks.fake_postgrest import FakePostgrest, FakeService, ServiceHandler
+from benchmarks.synthetic import LOCATIONS, make_expenses
+
+# Units per US dollar
+USD_RATES = {'USD': 1.0, 'EUR': 0.92, 'GBP': 0.79, 'JPY': 149.5, 'CAD': 1.36, 'AUD': 1.52, 'INR': 83.2}
+UPSTREAMS = ('postgrest', 'rates_primary', 'rates_fallback', 'geocoder')
+
+
+def rates_for(base, day=None):
+    """Rates from ``base`` to every known currency, optionally as of ``day``."""
+    usd = USD_RATES.get(base)
+    if usd is None:
+        return None
+    wobble = 1.0
+    if day is not None:
+        wobble = 1.0 + 0.01 * math.sin(day.toordinal() / 7.0)
+    return {code: round(rate / usd * (wobble if code != base else 1.0), 6) for code, rate in USD_RATES.items()}
+
+
+def user_id_for(size):
+    return f'load-{size}'
+
+
+class _RatesHandler(ServiceHandler):
+    def do_GET(self):
+        if not self._preflight():
+            return
+        parts = urlsplit(self.path)
+        path = unquote(parts.path).strip('/').split('/')
+        params = dict(parse_qsl(parts.query))
+        if len(path) >= 3 and path[-2] == 'latest':
+            # exchangerate-api.com: /<key>/latest/<base>
+            rates = rates_for(path[-1].upper())
+            if rates is None:
+                self._send_json(200, {'result': 'error', 'error-type': 'unsupported-code'})
+            else:
+                self._send_json(200, {'result': 'success', 'base_code': path[-1].upper(), 'conversion_rates': rates})
+        elif path[-1] == 'latest':
+            # exchangerate.host: /latest?base=<base>
+            rates = rates_for(params.get('base', 'USD').upper())
+            self._send_json(200, {'success': rates is not None, 'rates': rates or {}})
+        elif '..' in path[-1]:
+            # Frankfurter: /<start>..<end>?from=<base>&to=<symbols>, weekdays only
+            start, end = (date.fromisoformat(d) for d in path[-1].split('..'))
+            base = params.get('from', 'EUR').upper()
+            wanted = set(params['to'].split(',')) if params.get('to') else None
+            quotes = {}
+            day = start
+            while day <= min(end, date.today()):
+                rates = rates_for(base, day)
+                if day.weekday() < 5 and rates is not None:
+                    quotes[day.isoformat()] = {
+                        c: r for c, r in rates.items() if c != base and (wanted is None or c in wanted)
+                    }
+                day += timedelta(days=1)
+            self._send_json(200, {'base': base, 'start_date': start.isoformat(), 'rates': quotes})
+        else:
+            self._send_json(404, {'message': 'not found'})
+
+
+class FakeRates(FakeService):
+    """Exchange-rate provider stand-in (any of the three APIs the app uses)."""
+
+    handler = _RatesHandler
+
+
+class _NominatimHandler(ServiceHandler):
+    def do_GET(self):
+        if not self._preflight():
+            return
+        parts = urlsplit(self.path)
+        params = dict(parse_qsl(parts.query))
+        if parts.path.rstrip('/').endswith('/search'):
+            query = params.get('q', '').strip()
+            for name, lat, lng in LOCATIONS:
+                if name.casefold() == query.casefold():
+                    break
+            else:
+                # Unknown places land somewhere near the synthetic locations, always the same spot
+                h = zlib.crc32(query.casefold().encode('utf-8'))
+                name, lat, lng = query, 12.9 + (h % 1000) / 10000.0, 79.1 + (h // 1000 % 1000) / 10000.0
+            self._send_json(200, [{'lat': str(lat), 'lon': str(lng), 'display_name': name}] if query else [])
+        elif parts.path.rstrip('/').endswith('/reverse'):
+            lat, lng = float(params.get('lat', 0)), float(params.get('lon', 0))
+            name = min(LOCATIONS, key=lambda loc: (loc[1] - lat) ** 2 + (loc[2] - lng) ** 2)[0]
+            self._send_json(200, {'lat': str(lat), 'lon': str(lng), 'display_name': name})
+        else:
+            self._send_json(404, {'message': 'not found'})
+
+
+class FakeNominatim(FakeService):
+    """Nominatim search/reverse stand-in."""
+
+    handler = _NominatimHandler
+
+
+def parse_overrides(values, latency, error_rate):
+    """{upstream: (latency, error_rate)} from NAME:LATENCY:ERROR_RATE overrides."""
+    settings = {name: (latency, error_rate) for name in UPSTREAMS}
+    for value in values or ():
+        name, lat, err = value.split(':')
+        if name not in settings:
+            raise ValueError(f"unknown upstream {name!r}; expected one of {', '.join(UPSTREAMS)}")
+        settings[name] = (float(lat), float(err))
+    return settings
+
+
+def serve(sizes, settings, seed=0):
+    """Start every stand-in; returns (services, {upstream: url})."""
+    postgrest = FakePostgrest(*settings['postgrest'], seed=seed)
+    for size in sizes:
+        postgrest.insert('app_7433469c6a_expenses', make_expenses(user_id_for(size), size, seed=seed + size))
+    services = {
+        'postgrest': postgrest,
+        'rates_primary': FakeRates(*settings['rates_primary'], seed=seed),
+        'rates_fallback': FakeRates(*settings['rates_fallback'], seed=seed),
+        'geocoder': FakeNominatim(*settings['geocoder'], seed=seed),
+    }
+    for service in services.values():
+        service.start()
+    return services, {name: service.url for name, service in services.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run every upstream stand-in in the foreground')
+    parser.add_argument('--sizes', type=int, nargs='*', default=[100], help='seed one user with each many expenses')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every upstream response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of responses that fail with 503')
+    parser.add_argument('--override', action='append', metavar='NAME:LATENCY:ERROR_RATE',
+                        help=f"per-upstream injection ({', '.join(UPSTREAMS)})")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    _, urls = serve(args.sizes, parse_overrides(args.override, args.latency, args.error_rate), args.seed)
+    print(json.dumps(urls), flush=True)
+    try:
+        sys.stdin.read()  # serve until the parent closes our stdin or we are interrupted
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+"""
+Load test of every /api/* route against local upstream stand-ins.
+
+Starts benchmarks.fake_upstreams in a child process: PostgREST seeded with one
+synthetic user per --sizes entry, both rate providers and the geocoder, all
+with the requested latency and error injection. A daily rate history is
+backfilled from the stand-in, then the app runs under gunicorn pointed at
+them, with its caches and shared files in a fresh temporary directory. The
+stand-in has no rollup or map-tile RPCs, so routes that prefer them measure
+their full-scan fallbacks, as for a user whose rollups were never built.
+
+For each user size every route gets a few warm-up calls and is then driven by
+--concurrency closed-loop clients for --seconds. Routes that write run after
+all the reads of that size so their invalidations do not colour the read
+numbers. Throughput, mean/p50/p95/p99 latency and status counts per route and
+size go to --output as JSON, together with the commit and settings.
+--compare BASELINE prints each route's change against an earlier file and
+exits with status 1 when any p95 regressed by more than --threshold.
+
+Usage (from html_template/):
+    python -m benchmarks.loadtest --sizes 100 10000 --concurrency 16 --output load.json
+    python -m benchmarks.loadtest --sizes 1000000 --latency 0.02 --override rates_primary:0.2:0.5
+    python -m benchmarks.loadtest --compare load.json --output load-new.json
+"""
+import argparse
+import json
+import os
+import platform
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+import requests
+
+from benchmarks.bench_serving import wait_for_app
+from benchmarks.bench_supabase_client import percentile
+from benchmarks.fake_upstreams import UPSTREAMS, user_id_for
+
+ADMIN_TOKEN = 'loadtest-admin'
+IMPORT_CSV = (
+    'Date,Description,Amount,Category\n'
+    + ''.join(f'2024-03-{d:02d},Load test import {d},{100 + d}.50,Food\n' for d in range(1, 21))
+)
+
+
+def _expense(i):
+    return {
+        'title': f'Load test #{i}', 'amount': 120.5, 'category': 'Food', 'date': date.today().isoformat(),
+        'location': 'VIT Canteen', 'latitude': 12.9708, 'longitude': 79.1575, 'currency': 'INR',
+    }
+
+
+def routes():
+    """(method, path, request kwargs, writes) for every /api/* route."""
+    today = date.today()
+    convert_items = [
+        {'amount': 10 + i, 'from': 'INR', 'to': 'EUR', 'date': (today - timedelta(days=i * 5)).isoformat()}
+        for i in range(50)
+    ]
+    admin = {'headers': {'X-Admin-Token': ADMIN_TOKEN}}
+    return [
+        ('GET', '/api', {}, False),
+        ('GET', '/api/health', {}, False),
+        ('GET', '/api/metrics', {}, False),
+        ('GET', '/api/expenses?limit=20', {}, False),
+        ('GET', '/api/expenses/nearby?lat=12.9698&lng=79.1565&radius=500&limit=50', {}, False),
+        ('GET', '/api/dashboard', {}, False),
+        ('GET', '/api/dashboard?currency=EUR', {}, False),
+        ('GET', '/api/analytics?granularity=week', {}, False),
+        ('GET', '/api/ai-insights', {}, False),
+        ('GET', '/api/ai-insight', {}, False),
+        ('GET', '/api/rates?base=USD', {}, False),
+        ('POST', '/api/currency-convert', {'json': {'amount': 125.5, 'from_currency': 'INR', 'to_currency': 'EUR'}}, False),
+        ('POST', '/api/currency-convert/batch', {'json': {'items': convert_items}}, False),
+        ('GET', '/api/rates/history?base=USD&symbols=EUR,INR', {}, False),
+        ('GET', '/api/csv-export', {}, False),
+        ('GET', '/api/export?format=csv', {}, False),
+        ('GET', '/api/heatmap-data?zoom=12', {}, False),
+        ('GET', '/api/geocode?q=VIT Canteen', {}, False),
+        ('POST', '/api/geocode', {'json': {'queries': ['VIT Canteen', 'Katpadi Station', 'Vellore Fort']}}, False),
+        ('GET', '/api/geocode/reverse?lat=12.9708&lon=79.1575', {}, False),
+        ('GET', '/api/location', {}, False),
+        ('GET', '/api/categories', {}, False),
+        ('GET', '/api/currencies', {}, False),
+        ('POST', '/api/batch', {'json': {'requests': [
+            {'id': 'expenses', 'route': '/api/expenses', 'params': {'limit': 1000}},
+            {'id': 'rates', 'route': '/api/rates', 'params': {'base': 'INR'}},
+            {'id': 'insights', 'route': '/api/ai-insights'},
+        ]}}, False),
+        ('POST', '/api/login', {'json': {'email': 'load@example.com', 'password': 'x'}}, False),
+        ('POST', '/api/signup', {'json': {'email': 'load@example.com', 'password': 'x'}}, False),
+        ('GET', '/api/cache/stats', {}, False),
+        ('GET', '/api/circuit-breakers', {}, False),
+        ('GET', '/api/write-behind/stats', {}, False),
+        ('GET', '/api/stream/stats', {}, False),
+        ('GET', '/api/admin/slow-requests', admin, False),
+        ('GET', '/api/admin/profile', admin, False),
+        ('POST', '/api/ai-insights', {}, True),
+        ('POST', '/api/expenses', {'json': _expense(0)}, True),
+        ('POST', '/api/expenses/bulk', {'json': {'expenses': [_expense(i) for i in range(10)]}}, True),
+        ('POST', '/api/expenses/import', {'files': {'file': ('load.csv', IMPORT_CSV, 'text/csv')}}, True),
+    ]
+
+
+def drive(url, method, path, kwargs, user, concurrency, seconds, warmup):
+    headers = {'X-User-ID': user, **kwargs.get('headers', {})}
+    kwargs = {k: v for k, v in kwargs.items() if k != 'headers'}
+    with requests.Session() as session:
+        for _ in range(warmup):
+            session.request(method, f'{url}{path}', headers=headers, timeout=120, **kwargs)
+
+    deadline = time.perf_counter() + seconds
+
+    def client(_):
+        session = requests.Session()
+        samples, statuses = [], {}
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = session.request(method, f'{url}{path}', headers=headers, timeout=120, **kwargs)
+                response.content  # time the whole body, not just the headers
+                status = str(response.status_code)
+            except requests.exceptions.RequestException:
+                status = 'connection_error'
+            samples.append((time.perf_counter() - started) * 1000.0)
+            statuses[status] = statuses.get(status, 0) + 1
+        return samples, statuses
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - started
+    samples = [s for batch, _ in outcomes for s in batch]
+    statuses = {}
+    for _, counts in outcomes:
+        for status, n in counts.items():
+            statuses[status] = statuses.get(status, 0) + n
+    errors = sum(n for status, n in statuses.items() if not status.startswith(('2', '3')))
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'statuses': statuses,
+        'throughput_rps': round(len(samples) / elapsed, 1),
+        'mean_ms': round(sum(samples) / len(samples), 2) if samples else None,
+        'p50_ms': round(percentile(samples, 50), 2) if samples else None,
+        'p95_ms': round(percentile(samples, 95), 2) if samples else None,
+        'p99_ms': round(percentile(samples, 99), 2) if samples else None,
+    }
+
+
+def commit():
+    try:
+        head = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               capture_output=True, text=True).stdout.strip()
+        return head + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, results, threshold, min_ms):
+    """Print per-route changes; returns the (size, route) keys whose p95 regressed."""
+    before = {(r['size'], r['route']): r for r in baseline['results']}
+    regressed = []
+    print(f"\n{'size':>8s} {'route':<60s} {'p95 before':>10s} {'p95 now':>9s} {'change':>8s} {'rps change':>10s}")
+    for r in results:
+        old = before.get((r['size'], r['route']))
+        if old is None or not old['p95_ms'] or not r['p95_ms']:
+            continue
+        change = r['p95_ms'] / old['p95_ms'] - 1
+        rps_change = r['throughput_rps'] / old['throughput_rps'] - 1 if old['throughput_rps'] else 0.0
+        flag = ''
+        if change > threshold and r['p95_ms'] >= min_ms:
+            regressed.append((r['size'], r['route']))
+            flag = '  REGRESSED'
+        print(f"{r['size']:8d} {r['route']:<60s} {old['p95_ms']:10.2f} {r['p95_ms']:9.2f} "
+              f"{change * 100:7.1f}% {rps_change * 100:9.1f}%{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10000],
+                        help='expenses per synthetic user; one user per size')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5.0, help='measured time per route and size')
+    parser.add_argument('--warmup', type=int, default=2, help='untimed calls per route before measuring')
+    parser.add_argument('--routes', help='only routes whose path contains one of these comma-separated strings')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every upstream response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of upstream responses that fail')
+    parser.add_argument('--override', action='append', metavar='NAME:LATENCY:ERROR_RATE',
+                        help=f"per-upstream injection ({', '.join(UPSTREAMS)})")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--worker-class', default='gevent')
+    parser.add_argument('--port', type=int, default=54340)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    parser.add_argument('--compare', help='earlier --output file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.15, help='p95 slowdown counted as a regression')
+    parser.add_argument('--min-ms', type=float, default=2.0, help='ignore regressions of routes faster than this')
+    args = parser.parse_args()
+
+    selected = routes()
+    if args.routes:
+        wanted = [w.strip() for w in args.routes.split(',') if w.strip()]
+        selected = [r for r in selected if any(w in r[1] for w in wanted)]
+
+    workdir = tempfile.mkdtemp(prefix='aureus-load-')
+    fakes_command = [sys.executable, '-m', 'benchmarks.fake_upstreams', '--sizes', *map(str, args.sizes),
+                     '--latency', str(args.latency), '--error-rate', str(args.error_rate)]
+    for override in args.override or ():
+        fakes_command += ['--override', override]
+    fakes = subprocess.Popen(fakes_command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    master = None
+    results = []
+    try:
+        urls = json.loads(fakes.stdout.readline())
+        env = dict(
+            os.environ,
+            SUPABASE_URL=urls['postgrest'],
+            SUPABASE_SERVICE_KEY='loadtest',
+            EXCHANGE_API_KEY='loadtest',
+            RATES_PRIMARY_URL=urls['rates_primary'],
+            RATES_FALLBACK_URL=urls['rates_fallback'],
+            RATE_HISTORY_URL=urls['rates_primary'],
+            GEOCODER='nominatim',
+            NOMINATIM_URL=urls['geocoder'],
+            # The stand-in has no usage policy to respect
+            GEOCODE_MIN_INTERVAL_MS='0',
+            ADMIN_TOKEN=ADMIN_TOKEN,
+            RATE_STORE_PATH=os.path.join(workdir, 'rates.json'),
+            RATE_HISTORY_PATH=os.path.join(workdir, 'rate-history.npz'),
+            EXPENSE_CACHE_PATH=os.path.join(workdir, 'expenses.sqlite3'),
+            GEOCODE_CACHE_PATH=os.path.join(workdir, 'geocode.sqlite3'),
+            GEOCODE_SLOT_PATH=os.path.join(workdir, 'geocode.slot'),
+            WRITE_BEHIND_DIR=os.path.join(workdir, 'write-behind'),
+            METRICS_DIR=os.path.join(workdir, 'metrics'),
+            HEALTH_STATE_PATH=os.path.join(workdir, 'health.json'),
+            EVENT_LOG_PATH=os.path.join(workdir, 'events.sqlite3'),
+            GUNICORN_WORKER_CLASS=args.worker_class,
+        )
+        subprocess.run([sys.executable, 'rate_history.py', 'sync', '--since', (date.today() - timedelta(days=400)).isoformat()],
+                       env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        master = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'app:app', '--config', 'gunicorn.conf.py',
+             '--bind', f'127.0.0.1:{args.port}', '--workers', str(args.workers),
+             '--worker-class', args.worker_class, '--log-level', 'warning'],
+            env=env, stderr=subprocess.DEVNULL,
+        )
+        url = f'http://127.0.0.1:{args.port}'
+        wait_for_app(url)
+
+        for size in args.sizes:
+            for method, path, kwargs, writes in sorted(selected, key=lambda r: r[3]):
+                stats = drive(url, method, path, kwargs, user_id_for(size), args.concurrency, args.seconds, args.warmup)
+                results.append({'size': size, 'route': f'{method} {path}', 'writes': writes, **stats})
+                print(f"{size:8d} {method + ' ' + path:<60s} {stats['throughput_rps']:9.1f} req/s  "
+                      f"p50={stats['p50_ms']} p95={stats['p95_ms']} p99={stats['p99_ms']} ms  "
+                      f"errors={stats['errors']}", flush=True)
+    finally:
+        if master is not None:
+            master.send_signal(signal.SIGTERM)
+            master.wait()
+        fakes.stdin.close()
+        fakes.terminate()
+        fakes.wait()
+
+    regressed = []
+    if args.compare:
+        with open(args.compare) as fh:
+            regressed = compare(json.load(fh), results, args.threshold, args.min_ms)
+        print(f'\n{len(regressed)} route(s) regressed by more than {args.threshold * 100:.0f}% at p95')
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump({
+                'commit': commit(),
+                'run_at': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'settings': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+                'results': results,
+            }, fh, indent=2)
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+"""Synthetic expense data for seeding the local stand-ins."""
+import random
+from datetime import date, timedelta
+
+CATEGORIES = ['Food', 'Transportation', 'Shopping', 'Entertainment', 'Bills', 'Healthcare', 'Other']
+LOCATIONS = [
+    ('VIT Canteen', 12.9708, 79.1575),
+    ('VIT Main Gate', 12.9690, 79.1550),
+    ('Dominos Near VIT', 12.9685, 79.1545),
+    ('Coffee Day VIT', 12.9692, 79.1558),
+    ('VIT Bookstore', 12.9697, 79.1572),
+    ('Katpadi Station', 12.9716, 79.1376),
+    ('Vellore Fort', 12.9206, 79.1328),
+]
+CURRENCIES = ['INR', 'INR', 'INR', 'USD', 'EUR']
+
+
+def make_expenses(user_id, count, seed=0, days=730, today=None):
+    """Return ``count`` expense rows spread over the last ``days`` days."""
+    rng = random.Random(seed)
+    today = today or date.today()
+    rows = []
+    for i in range(count):
+        name, lat, lng = rng.choice(LOCATIONS)
+        rows.append({
+            'user_id': user_id,
+            'title': f'{name} #{i}',
+            'amount': round(rng.uniform(10, 500), 2),
+            'category': rng.choice(CATEGORIES),
+            'date': (today - timedelta(days=rng.randrange(days))).isoformat(),
+            'location': name,
+            'latitude': lat + (rng.random() - 0.5) * 0.01,
+            'longitude': lng + (rng.random() - 0.5) * 0.01,
+            'notes': 'Lunch, "special" combo' if i % 17 == 0 else None,
+            'currency': rng.choice(CURRENCIES),
+        })
+    return rows
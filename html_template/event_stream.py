@@ -0,0 +1,255 @@
+"""
+Per-user live events for /api/stream, shared by every worker on the host.
+
+Publishers append to one SQLite log (``path``); its AUTOINCREMENT ids are the
+SSE event ids, increasing across all workers. Each worker with open streams
+runs one small poller that reads what was appended since it last looked and
+hands every event to the streams of the user it is for (or to all of them for
+``BROADCAST`` events). A stream therefore costs a queue, not a query, and an
+event published by any worker reaches every open dashboard.
+
+The log keeps ``retention`` seconds (at most ``max_events`` events), which is
+the window in which a reconnecting client can resume from its Last-Event-ID.
+When events it would need are gone, ``subscribe`` says so and the client is
+told to reload instead.
+"""
+import os
+import json
+import time
+import queue
+import sqlite3
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# User id of events every stream receives (e.g. refreshed rates)
+BROADCAST = '*'
+# Rows read per poll; more pending events are read on the next round straight away
+_POLL_BATCH = 500
+_PRUNE_INTERVAL = 60.0
+
+
+class EventLog:
+    """Append-only event table in a SQLite file on local disk."""
+
+    def __init__(self, path, retention=3600.0, max_events=100000):
+        self.path = path
+        self.retention = retention
+        self.max_events = max_events
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS events ('
+                ' id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, event TEXT NOT NULL,'
+                ' data TEXT NOT NULL, created_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS events_user ON events (user_id, id)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def append(self, user_id, event, data):
+        cursor = self._connect().execute(
+            'INSERT INTO events (user_id, event, data, created_at) VALUES (?, ?, ?, ?)',
+            (user_id, event, json.dumps(data, separators=(',', ':'), default=str), time.time()),
+        )
+        return cursor.lastrowid
+
+    def since(self, after, user_id=None, limit=_POLL_BATCH):
+        """(id, user_id, event, data as JSON text) after ``after``, oldest first; one user's plus broadcasts."""
+        if user_id is None:
+            return self._connect().execute(
+                'SELECT id, user_id, event, data FROM events WHERE id > ? ORDER BY id LIMIT ?', (after, limit)
+            ).fetchall()
+        return self._connect().execute(
+            'SELECT id, user_id, event, data FROM events WHERE id > ? AND user_id IN (?, ?) ORDER BY id LIMIT ?',
+            (after, user_id, BROADCAST, limit),
+        ).fetchall()
+
+    def bounds(self):
+        """(oldest retained id or None, last id ever assigned)."""
+        conn = self._connect()
+        oldest = conn.execute('SELECT MIN(id) FROM events').fetchone()[0]
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'events'").fetchone()
+        return oldest, row[0] if row else 0
+
+    def prune(self):
+        conn = self._connect()
+        conn.execute('DELETE FROM events WHERE created_at < ?', (time.time() - self.retention,))
+        conn.execute(
+            'DELETE FROM events WHERE id <= (SELECT MAX(id) FROM events) - ?', (self.max_events,)
+        )
+
+
+class Subscription:
+    """One open stream: a bounded queue of (id, event, data) filled by the poller."""
+
+    __slots__ = ('user_id', 'overflowed', '_queue')
+
+    def __init__(self, user_id, size):
+        self.user_id = user_id
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize=size)
+
+    def put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # A client this far behind has to reload anyway; stop queueing for it
+            self.overflowed = True
+
+    def get(self, timeout):
+        """The next event, or None after ``timeout`` seconds without one."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventHub:
+    def __init__(self, log, poll_interval=0.25, queue_size=256):
+        self.log = log
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.published = 0
+        self.delivered = 0
+        self.publish_errors = 0
+        self._subscribers = {}  # user_id -> set of Subscription
+        self._lock = threading.Lock()
+        self._pid = None
+        self._cursor = 0
+
+    def publish(self, user_id, event, data):
+        """Append an event for ``user_id`` (or BROADCAST); returns its id, or None if it was lost.
+
+        Never raises: a write that succeeded must not fail because its
+        notification could not be recorded.
+        """
+        try:
+            event_id = self.log.append(user_id, event, data)
+        except Exception as e:
+            logger.warning(f"Could not publish {event} event for {user_id}: {e}")
+            with self._lock:
+                self.publish_errors += 1
+            return None
+        with self._lock:
+            self.published += 1
+        return event_id
+
+    def start(self):
+        # One poller per worker process, started with its first stream
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._subscribers = {}
+            self._cursor = self.log.bounds()[1]
+        threading.Thread(target=self._run, name='event-stream', daemon=True).start()
+
+    def subscribe(self, user_id, last_id=None):
+        """Register a stream; returns (subscription, missed events, complete).
+
+        With ``last_id`` the missed events are those after it still in the
+        log; ``complete`` is False when some of them were already pruned (or
+        the log was recreated since), and the client must reload. Events may
+        arrive both in the backlog and on the queue; callers skip ids they
+        have already sent.
+        """
+        self.start()
+        subscription = Subscription(user_id, self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        if last_id is None:
+            return subscription, [], True
+        oldest, newest = self.log.bounds()
+        if last_id > newest:
+            return subscription, [], False
+        if oldest is None:
+            return subscription, [], last_id == newest
+        if oldest > last_id + 1:
+            return subscription, [], False
+        missed = []
+        while True:
+            rows = self.log.since(last_id, user_id)
+            missed += [(row[0], row[2], row[3]) for row in rows]
+            if len(rows) < _POLL_BATCH:
+                return subscription, missed, True
+            last_id = rows[-1][0]
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            streams = self._subscribers.get(subscription.user_id)
+            if streams is not None:
+                streams.discard(subscription)
+                if not streams:
+                    del self._subscribers[subscription.user_id]
+
+    def newest_id(self):
+        return self.log.bounds()[1]
+
+    def _run(self):
+        pruned_at = 0.0
+        while True:
+            try:
+                if self._poll() < _POLL_BATCH:
+                    time.sleep(self.poll_interval)
+                if time.monotonic() - pruned_at > _PRUNE_INTERVAL:
+                    pruned_at = time.monotonic()
+                    self.log.prune()
+            except Exception as e:
+                logger.warning(f"Event stream poll failed: {e}")
+                time.sleep(max(1.0, self.poll_interval))
+
+    def _poll(self):
+        rows = self.log.since(self._cursor)
+        if not rows:
+            return 0
+        delivered = 0
+        with self._lock:
+            for event_id, user_id, event, data in rows:
+                targets = (
+                    [s for streams in self._subscribers.values() for s in streams] if user_id == BROADCAST
+                    else self._subscribers.get(user_id, ())
+                )
+                for subscription in targets:
+                    subscription.put((event_id, event, data))
+                    delivered += 1
+            self._cursor = rows[-1][0]
+            self.delivered += delivered
+        return len(rows)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'streams': sum(len(streams) for streams in self._subscribers.values()),
+                'users': len(self._subscribers),
+                'published': self.published,
+                'delivered': self.delivered,
+                'publish_errors': self.publish_errors,
+                'cursor': self._cursor,
+            }
+
+
+def from_env():
+    log = EventLog(
+        os.getenv('EVENT_LOG_PATH', os.path.join(tempfile.gettempdir(), 'aureus-events.sqlite3')),
+        retention=float(os.getenv('EVENT_RETENTION_SECONDS', '3600')),
+        max_events=int(os.getenv('EVENT_LOG_MAX_EVENTS', '100000')),
+    )
+    return EventHub(
+        log,
+        poll_interval=int(os.getenv('EVENT_POLL_MS', '250')) / 1000.0,
+        queue_size=int(os.getenv('STREAM_QUEUE_SIZE', '256')),
+    )
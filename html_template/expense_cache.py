@@ -0,0 +1,364 @@
+"""
+Per-user expense snapshot cache shared by the read endpoints.
+
+A snapshot is the user's full expense list (newest first) plus a version
+stamp. Entries are bounded by total size in bytes, evicted least recently
+used, expire after a TTL and are invalidated explicitly on every write.
+
+Writes that bypass the app (supabase-js in expenses.html) invalidate nothing,
+so callers may also pass the user's current data version, the rollup
+watermark that the expenses-table triggers move on every write. A snapshot
+loaded at another version is dropped, which also bumps its generation.
+
+Two backends are available (EXPENSE_CACHE_BACKEND):
+    memory  in-process LRU, for single-worker runs (default)
+    sqlite  one SQLite file on local disk that every gunicorn worker reads
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def _encode(value):
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+class MemoryBackend:
+    """Size-bounded LRU kept in this process."""
+
+    name = 'memory'
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._generations = {}  # key -> number of invalidations seen
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] <= time.time():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def generation(self, key):
+        with self._lock:
+            return self._generations.get(key, 0)
+
+    def set(self, key, value, ttl, max_size, generation):
+        size = len(_encode(value))
+        if size > max_size:
+            return size
+        with self._lock:
+            if self._generations.get(key, 0) != generation:
+                # Invalidated while the snapshot was being loaded; it may predate the write
+                return None
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, size, time.time() + ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+        return size
+
+    def delete(self, key):
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            if key in self._entries:
+                self._drop(key)
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def usage(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes}
+
+
+class SQLiteBackend:
+    """Size-bounded LRU in a local SQLite file shared by all worker processes."""
+
+    name = 'sqlite'
+    # Recording every read would turn readers into writers; refresh recency at most this often
+    _TOUCH_INTERVAL = 5.0
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                ' key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,'
+                ' expires_at REAL NOT NULL, last_access REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access)')
+            conn.execute('CREATE TABLE IF NOT EXISTS generations (key TEXT PRIMARY KEY, gen INTEGER NOT NULL)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            'SELECT value, last_access FROM entries WHERE key = ? AND expires_at > ?', (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        if now - row[1] > self._TOUCH_INTERVAL:
+            conn.execute('UPDATE entries SET last_access = ? WHERE key = ?', (now, key))
+        return json.loads(row[0])
+
+    def generation(self, key, conn=None):
+        row = (conn or self._connect()).execute('SELECT gen FROM generations WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else 0
+
+    def set(self, key, value, ttl, max_size, generation):
+        blob = _encode(value)
+        if len(blob) > max_size:
+            return len(blob)
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if self.generation(key, conn) != generation:
+                # Invalidated (possibly by another worker) while the snapshot was being loaded
+                conn.execute('ROLLBACK')
+                return None
+            conn.execute('DELETE FROM entries WHERE expires_at <= ?', (now,))
+            conn.execute(
+                'INSERT OR REPLACE INTO entries (key, value, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?)',
+                (key, blob, len(blob), now + ttl, now),
+            )
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            while total > self.max_bytes:
+                victim = conn.execute(
+                    'SELECT key, size FROM entries WHERE key != ? ORDER BY last_access LIMIT 1', (key,)
+                ).fetchone()
+                if victim is None:
+                    break
+                conn.execute('DELETE FROM entries WHERE key = ?', (victim[0],))
+                total -= victim[1]
+                self.evictions += 1
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return len(blob)
+
+    def delete(self, key):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            conn.execute(
+                'INSERT INTO generations (key, gen) VALUES (?, 1) '
+                'ON CONFLICT(key) DO UPDATE SET gen = gen + 1', (key,)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def usage(self):
+        count, size = self._connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE expires_at > ?', (time.time(),)
+        ).fetchone()
+        return {'entries': count, 'bytes': size}
+
+
+class _Load:
+    __slots__ = ('done', 'snapshot')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.snapshot = None
+
+
+class ExpenseCache:
+    """Snapshots of each user's expenses with hit/miss accounting.
+
+    Snapshots returned by the memory backend are shared objects; callers must
+    treat them as read-only.
+    """
+
+    def __init__(self, backend, ttl_seconds=300, max_entry_bytes=8 * 1024 * 1024):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_entry_bytes = max_entry_bytes
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.oversized = 0
+        self.shared_loads = 0
+        self.outdated = 0
+        self._lock = threading.Lock()
+        self._loading = {}  # user_id -> _Load in progress in this process
+
+    @staticmethod
+    def _key(user_id):
+        return f'expenses:{user_id}'
+
+    def _count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def peek(self, user_id, data_version=None):
+        """Return the cached snapshot ({'expenses', 'version', 'data_version'}) or None.
+
+        With a ``data_version``, a snapshot loaded at a different one is
+        invalidated and reported as a miss.
+        """
+        try:
+            snapshot = self.backend.get(self._key(user_id))
+        except Exception as e:
+            logger.warning(f"Expense cache read failed for {user_id}: {e}")
+            snapshot = None
+        if snapshot is not None and data_version is not None and snapshot.get('data_version') != data_version:
+            self._count('outdated')
+            self.invalidate(user_id)
+            snapshot = None
+        self._count('hits' if snapshot is not None else 'misses')
+        return snapshot
+
+    def get(self, user_id, loader, data_version=None):
+        """Return the snapshot, calling ``loader()`` for the expense list on a miss.
+
+        Concurrent misses for one user in this process wait for a single load
+        instead of each fetching the whole history. ``data_version`` is
+        checked as in ``peek`` and recorded on a freshly loaded snapshot.
+        """
+        snapshot = self.peek(user_id, data_version)
+        if snapshot is not None:
+            return snapshot
+        with self._lock:
+            load = self._loading.get(user_id)
+            leader = load is None
+            if leader:
+                load = self._loading[user_id] = _Load()
+        if not leader:
+            load.done.wait()
+            if load.snapshot is None:
+                # The shared load failed; fail (or succeed) on our own
+                return self.fill(user_id, loader, data_version)
+            self._count('shared_loads')
+            return load.snapshot
+        try:
+            load.snapshot = self.fill(user_id, loader, data_version)
+            return load.snapshot
+        finally:
+            with self._lock:
+                self._loading.pop(user_id, None)
+            load.done.set()
+
+    def fill(self, user_id, loader, data_version=None):
+        """Load a fresh snapshot and store it, without a cache lookup first.
+
+        ``data_version`` must have been read before calling: a write landing
+        during the load then makes the snapshot look outdated, never current.
+        """
+        generation = self._generation(user_id)
+        snapshot = {'expenses': loader(), 'version': f'{time.time_ns():x}', 'data_version': data_version}
+        self.put(user_id, snapshot, generation)
+        return snapshot
+
+    def generation(self, user_id):
+        """How many times the user's snapshot has been invalidated (None if unknown).
+
+        Derived state built from a snapshot is current while this is unchanged.
+        """
+        return self._generation(user_id)
+
+    def _generation(self, user_id):
+        try:
+            return self.backend.generation(self._key(user_id))
+        except Exception as e:
+            logger.warning(f"Expense cache generation lookup failed for {user_id}: {e}")
+            return None
+
+    def put(self, user_id, snapshot, generation):
+        """Store a snapshot loaded after ``generation`` was read; skipped if invalidated since."""
+        if generation is None:
+            return
+        try:
+            size = self.backend.set(
+                self._key(user_id), snapshot, self.ttl_seconds, self.max_entry_bytes, generation
+            )
+            if size is not None and size > self.max_entry_bytes:
+                # Histories this large are paged from Supabase instead of pinned in the cache
+                self._count('oversized')
+        except Exception as e:
+            logger.warning(f"Expense cache write failed for {user_id}: {e}")
+
+    def invalidate(self, user_id):
+        try:
+            self.backend.delete(self._key(user_id))
+        except Exception as e:
+            logger.warning(f"Expense cache invalidation failed for {user_id}: {e}")
+        self._count('invalidations')
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            'backend': self.backend.name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'invalidations': self.invalidations,
+            'evictions': self.backend.evictions,
+            'oversized': self.oversized,
+            'shared_loads': self.shared_loads,
+            'outdated': self.outdated,
+            'ttl_seconds': self.ttl_seconds,
+        }
+        try:
+            stats.update(self.backend.usage())
+        except Exception as e:
+            logger.warning(f"Expense cache usage query failed: {e}")
+        return stats
+
+
+def from_env():
+    """Build the cache configured by EXPENSE_CACHE_* environment variables.
+
+    The backend defaults to sqlite when several workers run (WEB_CONCURRENCY
+    above 1): with per-process memory caches a write would only invalidate the
+    snapshot of the worker that handled it.
+    """
+    max_bytes = int(os.getenv('EXPENSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+    default_backend = 'sqlite' if int(os.getenv('WEB_CONCURRENCY', '1')) > 1 else 'memory'
+    if os.getenv('EXPENSE_CACHE_BACKEND', default_backend).lower() == 'sqlite':
+        path = os.getenv('EXPENSE_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'aureus-expense-cache.sqlite3'))
+        backend = SQLiteBackend(path, max_bytes)
+    else:
+        backend = MemoryBackend(max_bytes)
+    return ExpenseCache(
+        backend,
+        ttl_seconds=int(os.getenv('EXPENSE_CACHE_TTL_SECONDS', '300')),
+        max_entry_bytes=int(os.getenv('EXPENSE_CACHE_MAX_ENTRY_BYTES', str(8 * 1024 * 1024))),
+    )
@@ -0,0 +1,356 @@
+"""
+Bulk expense ingestion for JSON batches and uploaded CSV / bank statements.
+
+Rows are consumed from an iterator, validated one at a time, de-duplicated on
+a content hash of (date, amount, title) and written to PostgREST in bounded
+multi-row inserts. Only the current batch and the set of hashes seen so far
+are held in memory, so a 50k-row statement costs about as much memory as a
+500-row one.
+
+The hash is stored in ``content_hash`` (see supabase/migrations); inserts use
+``on_conflict=user_id,content_hash`` with ``resolution=ignore-duplicates``, so
+importing the same statement twice adds nothing the second time.
+
+Only money going out becomes an expense. A separate debit (withdrawal) column
+holds nothing else, and a credit column is never imported. When a statement has
+one signed Amount column, ``amount_sign`` says which sign the expenses carry.
+With ``auto`` the sign most of the first batch's amounts have wins. Rows of the
+other sign are counted as ``skipped`` and reported, not stored.
+"""
+import io
+import re
+import csv
+import hashlib
+from datetime import date, datetime
+
+EXPENSES_TABLE = 'app_7433469c6a_expenses'
+INSERT_ENDPOINT = f'{EXPENSES_TABLE}?on_conflict=user_id,content_hash&select=content_hash'
+INSERT_HEADERS = {'Prefer': 'resolution=ignore-duplicates,return=representation'}
+MAX_REPORTED_ERRORS = 1000
+
+# Statement exports name their columns in many ways; map them onto ours
+COLUMN_ALIASES = {
+    'date': ('date', 'transaction date', 'txn date', 'posted date', 'posting date', 'value date'),
+    'title': ('title', 'description', 'narration', 'details', 'merchant', 'payee', 'particulars'),
+    'amount': ('amount',),
+    'debit': ('debit', 'debit amount', 'withdrawal', 'withdrawal amount', 'withdrawals'),
+    'credit': ('credit', 'credit amount', 'deposit', 'deposit amount', 'deposits'),
+    'category': ('category',),
+    'location': ('location',),
+    'notes': ('notes', 'memo', 'remarks'),
+    'currency': ('currency',),
+}
+_DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d', '%d %b %Y', '%d-%b-%Y', '%d/%m/%y')
+_NON_NUMERIC = re.compile(r'[^\d.\-]')
+# amount is DECIMAL(10,2); latitude/longitude are bounded by the map's coordinate ranges
+AMOUNT_LIMIT = 1e8
+AMOUNT_SIGNS = ('auto', 'positive', 'negative')
+
+
+class NotAnExpense(ValueError):
+    """A well-formed row that records money coming in (a credit or refund)."""
+
+
+def _parse_date(value):
+    text = str(value or '').strip()
+    if not text:
+        raise ValueError('date is required')
+    if len(text) >= 10 and text[4] == '-':
+        try:
+            return date.fromisoformat(text[:10]).isoformat()
+        except ValueError:
+            pass
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f'unrecognised date {text!r}')
+
+
+def _parse_amount(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        amount = float(value)
+    else:
+        text = str(value or '').strip()
+        negative = text.startswith('(') and text.endswith(')')
+        if not text:
+            raise ValueError('amount is required')
+        cleaned = _NON_NUMERIC.sub('', text)
+        try:
+            amount = float(cleaned)
+        except ValueError:
+            raise ValueError(f'amount {text!r} is not a number') from None
+        if negative:
+            amount = -amount
+    if amount != amount or amount in (float('inf'), float('-inf')):
+        raise ValueError('amount is not a finite number')
+    return round(amount, 2)
+
+
+def _parse_coordinate(value):
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'coordinate {value!r} is not a number') from None
+
+
+def _number(value):
+    """``value`` as a finite float (numbers or numeric strings), else None."""
+    if isinstance(value, bool) or value in (None, ''):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number == number and abs(number) != float('inf') else None
+
+
+def expense_problem(expense):
+    """Why PostgREST would refuse this expense, or None.
+
+    Checked before a single write is acknowledged and on every imported row,
+    since one refused row fails the whole multi-row insert it is part of.
+    """
+    for field in ('title', 'category'):
+        if not isinstance(expense.get(field), str) or not expense[field].strip():
+            return f'{field} is required'
+    amount = _number(expense.get('amount'))
+    if amount is None:
+        return 'amount must be a number'
+    if abs(amount) >= AMOUNT_LIMIT:
+        return 'amount is too large'
+    try:
+        datetime.strptime(str(expense.get('date') or ''), '%Y-%m-%d')
+    except ValueError:
+        return 'date must be a YYYY-MM-DD date'
+    for field, bound in (('latitude', 90), ('longitude', 180)):
+        value = expense.get(field)
+        if value not in (None, '') and (_number(value) is None or abs(_number(value)) > bound):
+            return f'{field} must be a number between -{bound} and {bound}'
+    currency = expense.get('currency')
+    if not isinstance(currency, str) or len(currency) != 3 or not (currency.isascii() and currency.isalpha()):
+        return 'currency must be a 3-letter code'
+    return None
+
+
+def content_hash(day, amount, title):
+    """Stable hash of the fields that identify an imported expense."""
+    key = f"{day}|{amount:.2f}|{' '.join(str(title).lower().split())}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+
+def _expense_amount(raw, amount_sign):
+    if raw.get('debit') not in (None, ''):
+        # A debit column only holds money going out, whatever sign the bank prints
+        return abs(_parse_amount(raw['debit']))
+    amount_value = raw.get('amount')
+    if amount_value in (None, '') and raw.get('credit') not in (None, ''):
+        raise NotAnExpense('credit entries are not expenses')
+    amount = _parse_amount(amount_value)
+    if amount_sign == 'negative':
+        if amount > 0:
+            raise NotAnExpense('positive amounts are credits in this import')
+        return -amount if amount else 0.0
+    if amount < 0:
+        raise NotAnExpense('negative amounts are credits in this import')
+    return amount
+
+
+def normalize_row(raw, user_id, default_currency='USD', amount_sign='positive'):
+    """Validate one input row and return the expense to insert.
+
+    Raises NotAnExpense for credits and ValueError for anything malformed or
+    out of range for the expenses table (see ``expense_problem``).
+    ``amount_sign`` is the sign expenses carry in a signed ``amount`` value.
+    """
+    if not isinstance(raw, dict):
+        raise ValueError('row must be an object')
+    day = _parse_date(raw.get('date'))
+    amount = _expense_amount(raw, amount_sign)
+    title = str(raw.get('title') or '').strip()
+    if not title:
+        raise ValueError('title is required')
+    title = title[:255]
+    expense = {
+        'user_id': user_id,
+        'title': title,
+        'amount': amount,
+        'category': (str(raw.get('category') or '').strip() or 'Other')[:100],
+        'date': day,
+        'location': str(raw.get('location')).strip()[:255] if raw.get('location') else None,
+        'latitude': _parse_coordinate(raw.get('latitude')),
+        'longitude': _parse_coordinate(raw.get('longitude')),
+        'notes': raw.get('notes') or None,
+        'currency': (str(raw.get('currency') or '').strip() or default_currency).upper(),
+        'content_hash': content_hash(day, amount, title),
+    }
+    problem = expense_problem(expense)
+    if problem:
+        raise ValueError(problem)
+    return expense
+
+
+def iter_csv_rows(binary_stream, encoding='utf-8-sig'):
+    """Read the header of a CSV byte stream and return an iterator over its rows.
+
+    Rows are dicts keyed by our column names and are read lazily. A header
+    without a date column and an amount (or debit) column raises ValueError
+    straight away. An Amount column next to a Credit column is read as the
+    debit column.
+    """
+    text = io.TextIOWrapper(binary_stream, encoding=encoding, errors='replace', newline='')
+    reader = csv.reader(text)
+    header = next(reader, None)
+    if header is None:
+        raise ValueError('the file is empty')
+    lookup = {alias: field for field, aliases in COLUMN_ALIASES.items() for alias in aliases}
+    columns = [lookup.get(h.strip().lower()) for h in header]
+    if 'date' not in columns or not {'amount', 'debit'} & set(columns):
+        raise ValueError('CSV needs a date column and an amount (or debit) column')
+    if 'credit' in columns and 'debit' not in columns:
+        columns = ['debit' if c == 'amount' else c for c in columns]
+
+    def rows():
+        for values in reader:
+            if not any(v.strip() for v in values):
+                continue
+            row = {}
+            for field, value in zip(columns, values):
+                # First matching column wins (e.g. "Debit" before a later "Withdrawal")
+                if field and field not in row:
+                    row[field] = value
+            yield row
+    return rows()
+
+
+class ImportResult:
+    """Running counters and the first MAX_REPORTED_ERRORS per-row errors."""
+
+    def __init__(self):
+        self.received = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.skipped = 0
+        self.failed = 0
+        self.errors = []
+        self.errors_truncated = False
+        self.aborted = None
+
+    def error(self, index, message):
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': index, 'error': message})
+        else:
+            self.errors_truncated = True
+
+    def as_dict(self):
+        return {
+            'received': self.received,
+            'inserted': self.inserted,
+            'duplicates': self.duplicates,
+            'invalid': self.invalid,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.errors_truncated,
+            'aborted': self.aborted,
+        }
+
+
+def _flush(request_fn, batch, result, normalize=None):
+    rows = [row for _, row in batch]
+    if normalize is not None:
+        normalize(rows)
+    try:
+        inserted = request_fn('POST', INSERT_ENDPOINT, rows, headers=INSERT_HEADERS) or []
+    except Exception as e:
+        result.failed += len(batch)
+        for index, _ in batch:
+            result.error(index, f'insert failed: {e}')
+        return
+    result.inserted += len(inserted)
+    # Rows already stored by an earlier import are skipped by the database
+    result.duplicates += len(rows) - len(inserted)
+
+
+def _detect_sign(rows, sample_size):
+    """Read ahead up to ``sample_size`` rows; returns (all rows again, sign most amounts have)."""
+    head, error = [], None
+    try:
+        for raw in rows:
+            head.append(raw)
+            if len(head) >= sample_size:
+                break
+    except csv.Error as e:
+        error = e
+    negative = positive = 0
+    for raw in head:
+        if not isinstance(raw, dict) or raw.get('amount') in (None, ''):
+            continue
+        try:
+            value = _parse_amount(raw['amount'])
+        except ValueError:
+            continue
+        negative += value < 0
+        positive += value > 0
+
+    def replay():
+        yield from head
+        if error is not None:
+            raise error
+        yield from rows
+    return replay(), 'negative' if negative > positive else 'positive'
+
+
+def ingest(request_fn, user_id, rows, batch_size=1000, default_currency='USD', normalize=None,
+           amount_sign='positive'):
+    """Validate, de-duplicate and insert ``rows``; returns an ImportResult.
+
+    Row numbers in errors are 1-based positions in the input. If the input
+    itself breaks part-way (a malformed CSV line), rows read so far are still
+    inserted and ``aborted`` says why the rest were not. ``normalize``, if
+    given, is called with each batch of row dicts just before it is inserted.
+    ``amount_sign`` is one of AMOUNT_SIGNS; ``auto`` looks at the first batch.
+    """
+    result = ImportResult()
+    seen = set()
+    batch = []
+    rows = iter(rows)
+    if amount_sign == 'auto':
+        rows, amount_sign = _detect_sign(rows, batch_size)
+    index = 0
+    while True:
+        try:
+            raw = next(rows)
+        except StopIteration:
+            break
+        except csv.Error as e:
+            result.aborted = f'stopped after row {index}: {e}'
+            break
+        index += 1
+        result.received += 1
+        try:
+            row = normalize_row(raw, user_id, default_currency, amount_sign)
+        except NotAnExpense as e:
+            result.skipped += 1
+            result.error(index, str(e))
+            continue
+        except ValueError as e:
+            result.invalid += 1
+            result.error(index, str(e))
+            continue
+        digest = row['content_hash']
+        if digest in seen:
+            result.duplicates += 1
+            continue
+        seen.add(digest)
+        batch.append((index, row))
+        if len(batch) >= batch_size:
+            _flush(request_fn, batch, result, normalize)
+            batch = []
+    if batch:
+        _flush(request_fn, batch, result, normalize)
+    return result
@@ -0,0 +1,157 @@
+"""
+PostgREST query helpers for reading a user's expenses in keyset-ordered pages.
+
+Expenses are always walked newest first on (date desc, id desc), with undated
+rows last. Each page asks for rows strictly after the last (date, id) seen, so
+the cost of a page does not depend on how deep into the history it is (unlike
+offset paging).
+"""
+import json
+import base64
+import binascii
+from urllib.parse import quote
+
+EXPENSES_TABLE = 'app_7433469c6a_expenses'
+KEYSET_ORDER = 'date.desc.nullslast,id.desc'
+# Columns a client may project with ?fields=
+EXPENSE_FIELDS = (
+    'id', 'user_id', 'title', 'amount', 'category', 'date', 'location',
+    'latitude', 'longitude', 'notes', 'currency', 'created_at',
+    'amount_base', 'base_currency', 'fx_rate', 'fx_rate_at',
+)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(after):
+    """Opaque, URL-safe cursor for the (date, id) keyset position."""
+    raw = json.dumps([after[0], after[1]], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        last_date, last_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (binascii.Error, UnicodeError, ValueError, TypeError) as e:
+        raise InvalidCursor(f'Malformed cursor: {cursor!r}') from e
+    return last_date, last_id
+
+
+def select_for_fields(fields):
+    """Map a comma-separated ``fields`` value onto a PostgREST select list.
+
+    ``id`` and ``date`` are always included because the keyset cursor needs them.
+    """
+    if not fields:
+        return '*'
+    wanted = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = [f for f in wanted if f not in EXPENSE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    columns = ['id', 'date'] + [f for f in wanted if f not in ('id', 'date')]
+    return ','.join(dict.fromkeys(columns))
+
+
+def _value(text):
+    # PostgREST filter values live in the query string; keep its delimiters intact
+    return quote(str(text), safe='')
+
+
+def range_filters(date_from=None, date_to=None, categories=None):
+    """Translate optional date-range and category filters into query params."""
+    params = []
+    if date_from:
+        params.append(f'date=gte.{_value(date_from)}')
+    if date_to:
+        params.append(f'date=lte.{_value(date_to)}')
+    if categories:
+        quoted = ','.join(f'"{_value(c)}"' for c in categories)
+        params.append(f'category=in.({quoted})')
+    return params
+
+
+def keyset_filter(after):
+    """Filter selecting rows that come strictly after ``(date, id)`` in keyset order.
+
+    Undated rows sort after every dated one, so they follow any dated
+    position; past an undated position only undated rows with a lower id do.
+    """
+    if not after:
+        return None
+    last_date, last_id = after
+    if last_date is None:
+        return f'and=(date.is.null,id.lt.{_value(last_id)})'
+    return (
+        f'or=(date.lt.{_value(last_date)},and(date.eq.{_value(last_date)},id.lt.{_value(last_id)}),'
+        'date.is.null)'
+    )
+
+
+def page_endpoint(user_id, limit, after=None, filters=None, select='*'):
+    params = [f'user_id=eq.{_value(user_id)}', f'select={select}']
+    params.extend(filters or [])
+    keyset = keyset_filter(after)
+    if keyset:
+        params.append(keyset)
+    params.append(f'order={KEYSET_ORDER}')
+    params.append(f'limit={int(limit)}')
+    return f"{EXPENSES_TABLE}?{'&'.join(params)}"
+
+
+def fetch_page(request_fn, user_id, limit, after=None, filters=None, select='*'):
+    """Fetch one page; returns (rows, cursor for the next page or None)."""
+    rows = request_fn('GET', page_endpoint(user_id, limit, after, filters, select))
+    next_after = (rows[-1]['date'], rows[-1]['id']) if len(rows) == limit else None
+    return rows, next_after
+
+
+def filter_rows(rows, date_from=None, date_to=None, categories=None):
+    """In-memory equivalent of ``range_filters`` for cached snapshots."""
+    wanted = set(categories) if categories else None
+    for row in rows:
+        day = str(row.get('date') or '')[:10]
+        if date_from and day < date_from:
+            continue
+        if date_to and day > date_to:
+            continue
+        if wanted is not None and row.get('category') not in wanted:
+            continue
+        yield row
+
+
+def _follows(row, last_date, last_id):
+    """In-memory ``keyset_filter``: whether ``row`` comes after ``(last_date, last_id)``."""
+    date = row['date']
+    if date == last_date:
+        return row['id'] < last_id
+    if date is None:
+        return True
+    return last_date is not None and date < last_date
+
+
+def page_from_rows(rows, limit, after=None, select='*'):
+    """Slice a keyset page out of rows already sorted in ``KEYSET_ORDER``."""
+    start = 0
+    if after:
+        last_date, last_id = after
+        start = next((i for i, r in enumerate(rows) if _follows(r, last_date, last_id)), len(rows))
+    page = rows[start:start + limit]
+    if select != '*':
+        columns = select.split(',')
+        page = [{c: r.get(c) for c in columns} for r in page]
+    next_after = (page[-1]['date'], page[-1]['id']) if len(page) == limit and start + limit < len(rows) else None
+    return page, next_after
+
+
+def iter_pages(request_fn, user_id, page_size=1000, filters=None, select='*'):
+    """Yield successive pages of a user's expenses until the history is exhausted."""
+    after = None
+    while True:
+        rows, after = fetch_page(request_fn, user_id, page_size, after, filters, select)
+        if rows:
+            yield rows
+        if after is None:
+            return
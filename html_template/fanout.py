@@ -0,0 +1,41 @@
+"""
+Run independent upstream calls of one request concurrently.
+
+Under the gevent workers (see gunicorn.conf.py) the calls become greenlets on
+the patched sockets; under sync workers or the dev server they run on a small
+shared thread pool. Either way ``gather`` returns once every call finished.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+_executor = {'pid': None, 'pool': None}
+
+
+def gevent_active():
+    """True when running on gevent's patched sockets (the default gunicorn workers)."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('socket')
+
+
+def _pool():
+    # Threads do not survive a fork, so each worker process builds its own pool
+    if _executor['pid'] != os.getpid():
+        _executor['pool'] = ThreadPoolExecutor(max_workers=int(os.getenv('FANOUT_THREADS', '8')))
+        _executor['pid'] = os.getpid()
+    return _executor['pool']
+
+
+def gather(*calls):
+    """Run zero-argument callables concurrently; results in order, first error re-raised."""
+    if len(calls) < 2:
+        return [call() for call in calls]
+    if gevent_active():
+        import gevent
+        greenlets = [gevent.spawn(call) for call in calls]
+        gevent.joinall(greenlets)
+        return [g.get() for g in greenlets]
+    futures = [_pool().submit(call) for call in calls]
+    return [f.result() for f in futures]
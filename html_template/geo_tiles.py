@@ -0,0 +1,245 @@
+"""
+Spatial aggregation of expenses into map tiles for /api/heatmap-data.
+
+Cells are Web Mercator tiles (the z/x/y scheme Leaflet uses), identified by
+their quadkey. A point's tile at zoom z is its tile at MAX_ZOOM shifted right
+by (MAX_ZOOM - z) bits, so one pass over the coordinates serves every zoom.
+
+Zoom levels up to COARSE_MAX_ZOOM are also kept as per-user rollups in
+``app_7433469c6a_expense_geo_cells`` (see supabase/migrations): one row per
+(zoom, tile, category) with amount, count and coordinate sums, kept current
+by triggers on the expenses table for every insert, edit and delete (the
+SQL hardcodes COARSE_MAX_ZOOM; change both together). Coarse views read those rows and never touch individual
+expenses; finer views aggregate the user's cached expense snapshot in memory.
+Either way the response holds at most one entry per cell.
+
+Maintenance commands (run from html_template/):
+    python geo_tiles.py rebuild [--user USER_ID]   # backfill / repair
+"""
+import os
+import sys
+import math
+import argparse
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CELLS_TABLE = 'app_7433469c6a_expense_geo_cells'
+REBUILD_RPC = 'rpc/app_7433469c6a_rebuild_expense_geo'
+MAX_ZOOM = 20
+COARSE_MAX_ZOOM = 12
+# Web Mercator is undefined at the poles; clamp like the tile servers do
+MAX_LATITUDE = 85.05112878
+
+
+def tile_xy(lat, lng, zoom):
+    """Tile column and row of each point at ``zoom`` (vectorized)."""
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE)
+    lng = np.asarray(lng, dtype=np.float64)
+    n = float(1 << zoom)
+    x = np.floor((lng + 180.0) / 360.0 * n)
+    rad = np.radians(lat)
+    y = np.floor((1.0 - np.log(np.tan(rad) + 1.0 / np.cos(rad)) / math.pi) / 2.0 * n)
+    top = (1 << zoom) - 1
+    return np.clip(x, 0, top).astype(np.int64), np.clip(y, 0, top).astype(np.int64)
+
+
+def quadkey(x, y, zoom):
+    digits = []
+    for i in range(zoom, 0, -1):
+        mask = 1 << (i - 1)
+        digits.append(str((1 if x & mask else 0) + (2 if y & mask else 0)))
+    return ''.join(digits)
+
+
+def tile_bounds(x, y, zoom):
+    """(south, west, north, east) of a tile."""
+    n = 1 << zoom
+
+    def lat_of(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return lat_of(y + 1), x / n * 360.0 - 180.0, lat_of(y), (x + 1) / n * 360.0 - 180.0
+
+
+def bbox_tiles(bbox, zoom):
+    """Inclusive (x_min, x_max, y_min, y_max) tile range covering ``bbox`` (south, west, north, east)."""
+    south, west, north, east = bbox
+    (x_min, x_max), (y_max, y_min) = tile_xy([south, north], [west, east], zoom)
+    return int(x_min), int(x_max), int(y_min), int(y_max)
+
+
+def parse_bbox(text):
+    """'south,west,north,east' -> tuple of floats; raises ValueError."""
+    try:
+        south, west, north, east = (float(v) for v in text.split(','))
+    except ValueError:
+        raise ValueError('bbox must be south,west,north,east') from None
+    if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        raise ValueError('bbox must be south,west,north,east with south <= north and west <= east')
+    return south, west, north, east
+
+
+def fit_zoom(x, y, zoom, max_cells=None):
+    """The finest zoom at or below ``zoom`` where tiles (x, y) fall into at most ``max_cells`` cells."""
+    if max_cells is None:
+        return zoom
+    while zoom > 0:
+        shift = MAX_ZOOM - zoom
+        if len(np.unique((x >> shift) << 32 | (y >> shift))) <= max_cells:
+            break
+        zoom -= 1
+    return zoom
+
+
+def _cells(keys, zoom, counts, sums, lat_sums, lng_sums, by_category, categories):
+    top = by_category.argmax(axis=1)
+    return [
+        {
+            'quadkey': quadkey(int(k >> 32), int(k & 0xFFFFFFFF), zoom),
+            'lat': round(float(lat_sums[i] / counts[i]), 6),
+            'lng': round(float(lng_sums[i] / counts[i]), 6),
+            'count': int(counts[i]),
+            'amount': round(float(sums[i]), 2),
+            'top_category': categories[top[i]],
+        }
+        for i, k in enumerate(keys.tolist())
+    ]
+
+
+def _group(x, y, zoom, counts, amounts, lat_sums, lng_sums, category_codes, categories):
+    """Sum per-entry values into one cell per tile at ``zoom`` (x, y are MAX_ZOOM tiles)."""
+    if not len(x):
+        return []
+    shift = MAX_ZOOM - zoom
+    keys, inverse = np.unique((x >> shift) << 32 | (y >> shift), return_inverse=True)
+    n = len(keys)
+    # Top category per cell: spend per (cell, category), then the largest in each row
+    n_categories = max(1, len(categories))
+    by_category = np.bincount(
+        inverse * n_categories + category_codes, weights=amounts, minlength=n * n_categories,
+    ).reshape(n, n_categories)
+    return _cells(
+        keys, zoom,
+        np.bincount(inverse, weights=counts, minlength=n),
+        np.bincount(inverse, weights=amounts, minlength=n),
+        np.bincount(inverse, weights=lat_sums, minlength=n),
+        np.bincount(inverse, weights=lng_sums, minlength=n),
+        by_category, categories,
+    )
+
+
+class GeoColumns:
+    """Coordinates, amounts and categories of one user's located expenses."""
+
+    def __init__(self, lat, lng, amounts, category_codes, categories):
+        self.lat = lat
+        self.lng = lng
+        self.amounts = amounts
+        self.category_codes = category_codes
+        self.categories = categories
+        # Tiles at the finest zoom; every coarser tile is a shift away
+        self.x, self.y = tile_xy(lat, lng, MAX_ZOOM)
+
+    @classmethod
+    def from_rows(cls, rows):
+        lat, lng, amounts, codes, lookup = [], [], [], [], {}
+        for row in rows:
+            try:
+                a, b = float(row.get('latitude')), float(row.get('longitude'))
+            except (TypeError, ValueError):
+                continue
+            if not (-90 <= a <= 90 and -180 <= b <= 180):
+                continue
+            value = row.get('amount_base')
+            lat.append(a)
+            lng.append(b)
+            amounts.append(float((row.get('amount') if value is None else value) or 0))
+            codes.append(lookup.setdefault(row.get('category') or 'Other', len(lookup)))
+        return cls(
+            np.array(lat, dtype=np.float64), np.array(lng, dtype=np.float64),
+            np.array(amounts, dtype=np.float64), np.array(codes, dtype=np.int64), list(lookup),
+        )
+
+    def __len__(self):
+        return len(self.lat)
+
+    def in_bbox(self, bbox):
+        south, west, north, east = bbox
+        return (self.lat >= south) & (self.lat <= north) & (self.lng >= west) & (self.lng <= east)
+
+    def cells(self, zoom, bbox=None, max_cells=None):
+        """(zoom, cells): one entry per non-empty tile, coarsened until at most ``max_cells`` remain."""
+        selected = self.in_bbox(bbox) if bbox is not None else np.ones(len(self), dtype=bool)
+        x, y = self.x[selected], self.y[selected]
+        zoom = fit_zoom(x, y, zoom, max_cells)
+        return zoom, _group(
+            x, y, zoom, np.ones(len(x)), self.amounts[selected], self.lat[selected], self.lng[selected],
+            self.category_codes[selected], self.categories,
+        )
+
+
+def cells_from_rollups(rows, zoom, max_cells=None):
+    """(zoom, cells) from per-category rollup rows stored at ``zoom``."""
+    if not rows:
+        return zoom, []
+    lookup = {}
+    codes = np.array([lookup.setdefault(r['category'], len(lookup)) for r in rows], dtype=np.int64)
+    # Lift stored tiles to MAX_ZOOM so the same shifting applies
+    shift = MAX_ZOOM - zoom
+    x = np.array([int(r['tile_x']) for r in rows], dtype=np.int64) << shift
+    y = np.array([int(r['tile_y']) for r in rows], dtype=np.int64) << shift
+    zoom = fit_zoom(x, y, zoom, max_cells)
+    return zoom, _group(
+        x, y, zoom,
+        np.array([float(r['tx_count']) for r in rows]),
+        np.array([float(r['amount']) for r in rows]),
+        np.array([float(r['lat_sum']) for r in rows]),
+        np.array([float(r['lng_sum']) for r in rows]),
+        codes, list(lookup),
+    )
+
+
+def read_rollup_cells(request_fn, user_id, zoom, bbox=None, max_cells=None):
+    """(zoom, cells) at a precomputed zoom, or None if the user has no geo rollups yet."""
+    query = f'{CELLS_TABLE}?user_id=eq.{user_id}&zoom=eq.{zoom}&select=tile_x,tile_y,category,amount,tx_count,lat_sum,lng_sum'
+    if bbox is not None:
+        x_min, x_max, y_min, y_max = bbox_tiles(bbox, zoom)
+        query += f'&tile_x=gte.{x_min}&tile_x=lte.{x_max}&tile_y=gte.{y_min}&tile_y=lte.{y_max}'
+    rows = request_fn('GET', query)
+    if not rows:
+        # Distinguish "nothing here" from "never built": the zoom-0 cell holds everything
+        if bbox is None or not request_fn('GET', f'{CELLS_TABLE}?user_id=eq.{user_id}&zoom=eq.0&select=tx_count&limit=1'):
+            return None
+    return cells_from_rollups(rows, zoom, max_cells)
+
+
+def rebuild(request_fn, user_id=None):
+    """Recompute geo rollups server-side for one user (or everyone when None)."""
+    return request_fn('POST', REBUILD_RPC, {'p_user_id': user_id, 'p_max_zoom': COARSE_MAX_ZOOM})
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    from supabase_client import get_client
+
+    parser = argparse.ArgumentParser(description='Maintain per-user expense map tiles')
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--user', help='limit to one user id (default: all users)')
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    client = get_client(
+        os.getenv('SUPABASE_URL', 'https://pqatgaqjvyzfohdrbrtb.supabase.co'),
+        os.getenv('SUPABASE_SERVICE_KEY'),
+    )
+    affected = rebuild(client.request, args.user)
+    logger.info(f"Rebuilt map tiles for {args.user or 'all users'} ({affected} rows)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
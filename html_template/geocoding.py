@@ -0,0 +1,408 @@
+"""
+Server-side geocoding with a persistent cache and one rate-limited upstream queue.
+
+Place strings are normalized (case, spacing, punctuation) before lookup, so
+"VIT Canteen" and " vit  canteen," share one cache entry. Answers, including
+"not found", are kept in a local SQLite file that every worker reads, with a
+TTL per kind of answer. A lookup that misses the cache:
+
+- joins an identical lookup already in flight instead of starting another;
+- otherwise goes onto this process's queue, drained by one thread that takes
+  a cross-process slot before each provider call, so all workers together
+  stay within the provider's rate limit (Nominatim allows one request per
+  second).
+
+Providers are pluggable (GEOCODER): ``nominatim`` (default) or ``static``, a
+local table of known places for tests, benchmarks and offline development.
+"""
+import os
+import re
+import json
+import time
+import queue
+import sqlite3
+import logging
+import tempfile
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import requests
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+NOMINATIM_URL = 'https://nominatim.openstreetmap.org'
+USER_AGENT = 'Aureus-Finance-App/1.0'
+# Reverse lookups are keyed on coordinates rounded to about 11 m
+REVERSE_PRECISION = 4
+_PUNCTUATION = re.compile(r'[^\w\s,/&-]+')
+
+
+def normalize_query(text):
+    """Canonical cache key for a place string, or '' when nothing is left."""
+    text = _PUNCTUATION.sub(' ', str(text or '').casefold())
+    parts = (' '.join(part.split()) for part in text.split(','))
+    return ', '.join(part for part in parts if part)
+
+
+def reverse_key(lat, lon):
+    return f'@{round(float(lat), REVERSE_PRECISION)},{round(float(lon), REVERSE_PRECISION)}'
+
+
+# -- providers -----------------------------------------------------------
+class NominatimProvider:
+    """OpenStreetMap Nominatim search and reverse lookups."""
+
+    name = 'nominatim'
+
+    def __init__(self, base_url=NOMINATIM_URL, user_agent=USER_AGENT, timeout=10):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._session.headers['User-Agent'] = user_agent
+
+    def search(self, query):
+        resp = self._session.get(
+            f'{self.base_url}/search', params={'format': 'json', 'q': query, 'limit': 1}, timeout=self.timeout
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        if not data:
+            return None
+        return {
+            'latitude': float(data[0]['lat']),
+            'longitude': float(data[0]['lon']),
+            'display_name': data[0].get('display_name'),
+        }
+
+    def reverse(self, lat, lon):
+        resp = self._session.get(
+            f'{self.base_url}/reverse', params={'format': 'jsonv2', 'lat': lat, 'lon': lon}, timeout=self.timeout
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        if not data or data.get('error'):
+            return None
+        return {'latitude': float(lat), 'longitude': float(lon), 'display_name': data.get('display_name')}
+
+
+class StaticProvider:
+    """Known places from a dict ({name: (lat, lon)}) with optional injected latency."""
+
+    name = 'static'
+
+    def __init__(self, places, latency=0.0):
+        self.places = {normalize_query(k): (float(v[0]), float(v[1])) for k, v in places.items()}
+        self.latency = latency
+        self.calls = 0
+
+    def search(self, query):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        coords = self.places.get(normalize_query(query))
+        if coords is None:
+            return None
+        return {'latitude': coords[0], 'longitude': coords[1], 'display_name': query}
+
+    def reverse(self, lat, lon):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        best = min(
+            self.places.items(),
+            key=lambda item: (item[1][0] - lat) ** 2 + (item[1][1] - lon) ** 2,
+            default=None,
+        )
+        if best is None:
+            return None
+        return {'latitude': float(lat), 'longitude': float(lon), 'display_name': best[0]}
+
+
+# -- cache ---------------------------------------------------------------
+class GeoCache:
+    """Geocoding answers in a SQLite file shared by all worker processes."""
+
+    def __init__(self, path, ttl_seconds, negative_ttl_seconds):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS places ('
+            ' key TEXT PRIMARY KEY, value TEXT, expires_at REAL NOT NULL)'
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get_many(self, keys):
+        """{key: answer} for unexpired entries; a cached "not found" is present with value None."""
+        found = {}
+        keys = list(keys)
+        now = time.time()
+        conn = self._connect()
+        # SQLite caps bound parameters; 500 keys per query stays well inside it
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = conn.execute(
+                f"SELECT key, value FROM places WHERE expires_at > ? AND key IN ({','.join('?' * len(chunk))})",
+                (now, *chunk),
+            ).fetchall()
+            for key, value in rows:
+                found[key] = None if value is None else json.loads(value)
+        return found
+
+    def put(self, key, answer):
+        ttl = self.ttl_seconds if answer is not None else self.negative_ttl_seconds
+        self._connect().execute(
+            'INSERT OR REPLACE INTO places (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, None if answer is None else json.dumps(answer, separators=(',', ':')), time.time() + ttl),
+        )
+
+    def usage(self):
+        conn = self._connect()
+        now = time.time()
+        total, negative = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(value IS NULL), 0) FROM places WHERE expires_at > ?', (now,)
+        ).fetchone()
+        return {'entries': total, 'negative_entries': negative}
+
+
+# -- rate limit ----------------------------------------------------------
+class RateSlot:
+    """At most one provider call per ``interval`` seconds across every process on the host.
+
+    The time of the last call is kept in a small file guarded by ``flock``.
+    Without ``fcntl`` the limit applies to this process only.
+    """
+
+    def __init__(self, path, interval):
+        self.path = path
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            if fcntl is None:
+                self._take(None)
+                return
+            fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+            try:
+                while True:
+                    try:
+                        # Non-blocking attempts keep gevent workers cooperative while waiting
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        time.sleep(0.01)
+                try:
+                    self._take(fd)
+                finally:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+
+    def _take(self, fd):
+        if fd is None:
+            last = getattr(self, '_last', 0.0)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            raw = os.read(fd, 64)
+            try:
+                last = float(raw or 0)
+            except ValueError:
+                last = 0.0
+        delay = last + self.interval - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        now = repr(time.time()).encode('ascii')
+        if fd is None:
+            self._last = float(now)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, now)
+
+
+# -- service -------------------------------------------------------------
+class Geocoder:
+    """Cache first, then one shared upstream queue per process with in-flight de-duplication."""
+
+    def __init__(self, provider, cache, slot):
+        self.provider = provider
+        self.cache = cache
+        self.slot = slot
+        self._queue = queue.Queue()
+        self._inflight = {}  # key -> Future
+        self._lock = threading.Lock()
+        self._worker_pid = None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.provider_calls = 0
+        self.provider_errors = 0
+
+    def _count(self, **deltas):
+        with self._lock:
+            for field, delta in deltas.items():
+                setattr(self, field, getattr(self, field) + delta)
+
+    def _ensure_worker(self):
+        # One queue consumer per worker process, started on first use
+        if self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._inflight = {}
+            self._worker_pid = os.getpid()
+        threading.Thread(target=self._drain, name='geocode-queue', daemon=True).start()
+
+    def _drain(self):
+        while True:
+            key, call, future = self._queue.get()
+            try:
+                # Another worker may have answered it while this one waited in the queue
+                cached = self.cache.get_many([key])
+                if key in cached:
+                    answer = cached[key]
+                else:
+                    self.slot.wait()
+                    self._count(provider_calls=1)
+                    answer = call()
+                    self.cache.put(key, answer)
+                future.set_result(answer)
+            except Exception as e:
+                # Errors are not cached; the next lookup tries the provider again
+                self._count(provider_errors=1)
+                logger.warning(f"Geocoding {key!r} failed: {e}")
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+    def _submit(self, key, call):
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            future = self._inflight[key] = Future()
+        self._queue.put((key, call, future))
+        return future
+
+    def _resolve(self, requests_by_key, timeout):
+        """{key: answer | 'pending' | 'error'} for {key: provider call}."""
+        self._ensure_worker()
+        cached = self.cache.get_many(requests_by_key)
+        self._count(hits=len(cached), misses=len(requests_by_key) - len(cached))
+        futures = {
+            key: self._submit(key, call) for key, call in requests_by_key.items() if key not in cached
+        }
+        deadline = time.monotonic() + timeout
+        results = dict(cached)
+        for key, future in futures.items():
+            try:
+                results[key] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeout:
+                # Still queued; it lands in the cache, so asking again later is cheap
+                results[key] = 'pending'
+            except Exception:
+                results[key] = 'error'
+        return results
+
+    def geocode_many(self, queries, timeout=10.0):
+        """One result per query, in order: {'query', 'status', ...coordinates}.
+
+        Status is ``ok``, ``not_found``, ``pending`` (still queued when the
+        timeout expired), ``error`` or ``invalid`` (nothing left after normalizing).
+        """
+        keys = [normalize_query(q) for q in queries]
+        unique = {k: (lambda k=k: self.provider.search(k)) for k in keys if k}
+        answers = self._resolve(unique, timeout) if unique else {}
+        return [_result(q, k, answers.get(k) if k else 'invalid') for q, k in zip(queries, keys)]
+
+    def geocode(self, query, timeout=10.0):
+        return self.geocode_many([query], timeout)[0]
+
+    def reverse(self, lat, lon, timeout=10.0):
+        key = reverse_key(lat, lon)
+        lat, lon = float(lat), float(lon)
+        answer = self._resolve({key: lambda: self.provider.reverse(lat, lon)}, timeout)[key]
+        return _result(None, key, answer)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            'provider': self.provider.name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'coalesced': self.coalesced,
+            'provider_calls': self.provider_calls,
+            'provider_errors': self.provider_errors,
+            'queue_depth': self._queue.qsize(),
+            'min_interval_seconds': self.slot.interval,
+            'ttl_seconds': self.cache.ttl_seconds,
+            'negative_ttl_seconds': self.cache.negative_ttl_seconds,
+        }
+        try:
+            stats.update(self.cache.usage())
+        except Exception as e:
+            logger.warning(f"Geocode cache usage query failed: {e}")
+        return stats
+
+
+def _result(query, key, answer):
+    result = {'query': query, 'key': key}
+    if isinstance(answer, dict):
+        result.update(status='ok', **answer)
+    elif answer is None:
+        result['status'] = 'not_found'
+    else:
+        result['status'] = answer
+    return result
+
+
+def provider_from_env():
+    kind = os.getenv('GEOCODER', 'nominatim').lower()
+    if kind == 'static':
+        path = os.getenv('GEOCODER_STATIC_FILE')
+        places = {}
+        if path:
+            with open(path, 'r', encoding='utf-8') as fh:
+                places = json.load(fh)
+        return StaticProvider(places)
+    return NominatimProvider(
+        os.getenv('NOMINATIM_URL', NOMINATIM_URL),
+        os.getenv('GEOCODER_USER_AGENT', USER_AGENT),
+    )
+
+
+def from_env(provider=None):
+    """The geocoder configured by GEOCODER* / GEOCODE_* environment variables."""
+    directory = tempfile.gettempdir()
+    cache = GeoCache(
+        os.getenv('GEOCODE_CACHE_PATH', os.path.join(directory, 'aureus-geocode.sqlite3')),
+        ttl_seconds=float(os.getenv('GEOCODE_CACHE_TTL_DAYS', '30')) * 86400,
+        negative_ttl_seconds=float(os.getenv('GEOCODE_NEGATIVE_TTL_HOURS', '24')) * 3600,
+    )
+    slot = RateSlot(
+        os.getenv('GEOCODE_SLOT_PATH', os.path.join(directory, 'aureus-geocode.slot')),
+        float(os.getenv('GEOCODE_MIN_INTERVAL_MS', '1000')) / 1000.0,
+    )
+    return Geocoder(provider or provider_from_env(), cache, slot)
@@ -0,0 +1,30 @@
+"""
+Gunicorn settings (picked up automatically from this directory).
+
+Every route spends nearly all of its time waiting on Supabase or the rate
+providers, so workers default to gevent: each process serves up to
+``GUNICORN_WORKER_CONNECTIONS`` requests at once on cooperative sockets
+instead of one. Set GUNICORN_WORKER_CLASS=sync to go back to blocking workers.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '200'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+
+if workers > 1:
+    # Workers must share snapshots, or a write only invalidates the one that served it
+    os.environ.setdefault('EXPENSE_CACHE_BACKEND', 'sqlite')
+
+if worker_class == 'gevent':
+    # Let concurrent requests share more keep-alive connections to Supabase
+    os.environ.setdefault('SUPABASE_POOL_SIZE', '50')
+
+
+def post_worker_init(worker):
+    # The app module is already loaded in the worker; answer its first request
+    # from the shared rate snapshot instead of a cold fetch
+    from app import warm_rate_cache
+    warm_rate_cache()
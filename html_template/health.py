@@ -0,0 +1,144 @@
+"""
+Dependency status for /api/health, probed in the background and shared by all workers.
+
+Probes are plain callables returning a dict with at least ``status``; an
+exception counts as ``'down'``. Every worker runs a small loop that re-probes
+once the shared result in ``path`` is older than ``interval`` seconds, but
+only the worker that wins a non-blocking ``flock`` does so. The others, and
+every health request, just read the file. However many workers there are and
+however often the health check is hit, dependencies see at most one round of
+probes per interval.
+"""
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+OK = 'ok'
+DOWN = 'down'
+# Statuses that make the service degraded; anything else (e.g. 'not_configured') is informational
+_DEGRADING = {DOWN, 'degraded', 'stale'}
+
+
+class HealthProbes:
+    def __init__(self, probes, path, interval=5.0, critical=()):
+        self.probes = probes
+        self.path = path
+        self.interval = interval
+        # Dependencies whose failure makes the whole service unhealthy, not just degraded
+        self.critical = set(critical)
+        self._pid = None
+        self._local = None  # last result, where there is no flock to share a file
+        self._seen = None
+        self._cached = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        # One probe loop per worker process, started on its first request
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name='health-probes', daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Health probe round failed: {e}")
+            time.sleep(max(0.5, self.interval / 2))
+
+    def _probe_all(self):
+        services = {}
+        for name, probe in self.probes.items():
+            started = time.monotonic()
+            try:
+                result = dict(probe())
+            except Exception as e:
+                result = {'status': DOWN, 'error': str(e)[:200]}
+            result['probe_ms'] = round((time.monotonic() - started) * 1000.0, 1)
+            services[name] = result
+        return {'checked_at': time.time(), 'services': services}
+
+    def refresh(self):
+        """Probe if the shared result is older than the interval and no other worker is probing."""
+        current = self.current()
+        if current is not None and time.time() - current['checked_at'] < self.interval:
+            return False
+        if fcntl is None:
+            self._local = self._probe_all()
+            return True
+        fd = os.open(self.path + '.lock', os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            current = self.current()
+            if current is not None and time.time() - current['checked_at'] < self.interval:
+                return False
+            result = self._probe_all()
+            fd_tmp, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), prefix='.health-')
+            with os.fdopen(fd_tmp, 'w', encoding='utf-8') as fh:
+                json.dump(result, fh)
+            os.replace(tmp_path, self.path)
+            return True
+        finally:
+            os.close(fd)
+
+    def current(self):
+        """The latest probe result, or None before the first round."""
+        if fcntl is None:
+            return self._local
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        stamp = (st.st_ino, st.st_mtime_ns)
+        if stamp != self._seen:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as fh:
+                    self._cached = json.load(fh)
+                self._seen = stamp
+            except (OSError, ValueError):
+                return self._cached
+        return self._cached
+
+    def report(self):
+        """(overall status, {'checked_at', 'age_seconds', 'services'}) for the health endpoint."""
+        current = self.current()
+        if current is None:
+            return 'starting', {'checked_at': None, 'age_seconds': None, 'services': {}}
+        age = time.time() - current['checked_at']
+        services = current['services']
+        if any(services.get(name, {}).get('status') == DOWN for name in self.critical):
+            overall = 'unhealthy'
+        elif any(s.get('status') in _DEGRADING for s in services.values()):
+            overall = 'degraded'
+        else:
+            overall = 'healthy'
+        if age > 4 * self.interval:
+            # The probes themselves have stopped; nothing above can be trusted
+            overall = 'unknown'
+        return overall, {'checked_at': current['checked_at'], 'age_seconds': round(age, 1), 'services': services}
+
+
+def from_env(probes, critical=()):
+    return HealthProbes(
+        probes,
+        os.getenv('HEALTH_STATE_PATH', os.path.join(tempfile.gettempdir(), 'aureus-health.json')),
+        interval=float(os.getenv('HEALTH_PROBE_INTERVAL_SECONDS', '5')),
+        critical=critical,
+    )
@@ -0,0 +1,283 @@
+"""
+Precomputed AI insights, produced off the request path.
+
+Writes call ``schedule(user_id)``. Triggers for one user are debounced: the
+job runs ``delay`` seconds after the latest write, but no later than
+``max_delay`` after the first one, so a burst of inserts or an import costs a
+single computation. A few worker threads per process run due jobs, never two
+for the same user at once.
+
+A job computes the user's insights and stores them in
+``app_7433469c6a_ai_insights`` (insight_type 'precomputed'), stamped with the
+data version (rollups.fetch_data_version) they were computed at as
+``data_version``; the user's previous precomputed row is then deleted.
+/api/ai-insights reads the stored row and the user's current data version in
+one query (the latest_insight RPC) and only computes inline when nothing is
+stored at all. A row whose stamp no longer matches is still served, and a
+refresh is scheduled. This worker's copy of its last result stands in when
+the stored row cannot be read.
+"""
+import os
+import json
+import time
+import zlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+INSIGHTS_TABLE = 'app_7433469c6a_ai_insights'
+LATEST_RPC = 'rpc/app_7433469c6a_latest_insight'
+INSIGHT_TYPE = 'precomputed'
+# Insights look at the user's most recent expenses only
+RECENT_EXPENSES = 100
+
+
+def summarize(columns):
+    """Totals the insight texts are built from, over analytics columns."""
+    total_spent = columns.total()
+    categories = columns.by_category()
+    locations = columns.by_location()
+    top_category = max(categories, key=lambda c: categories[c][0]) if categories else 'Food'
+    top_location = max(locations, key=lambda l: locations[l][0]) if locations else 'VIT Canteen'
+    return {
+        'total_spent': total_spent,
+        'transaction_count': columns.count(),
+        'top_category': top_category,
+        'top_category_amount': categories[top_category][0] if categories else 0,
+        'top_location': top_location,
+        'top_location_amount': locations[top_location][0] if locations else 0,
+    }
+
+
+def _templates(s):
+    total_spent, top_category, top_location = s['total_spent'], s['top_category'], s['top_location']
+    share = round(s['top_category_amount'] / total_spent * 100 if total_spent > 0 else 0, 1)
+    return [
+        {
+            'spendingPattern': f'Your {top_category.lower()} expenses account for {share}% of your total spending. Consider meal planning to reduce costs.',
+            'budgetRecommendation': f'Based on your spending of ₹{total_spent:.2f}, I recommend a monthly budget of ₹{total_spent * 1.15:.2f} with 15% buffer for unexpected expenses.',
+            'savingsTip': 'Try the 50/30/20 budgeting rule: 50% needs, 30% wants, 20% savings. This could help you save an extra ₹500-1000 monthly.',
+            'locationInsight': f'You spent the most around {top_location} area (₹{s["top_location_amount"]:.2f}). Consider exploring cost-effective alternatives nearby.'
+        },
+        {
+            'spendingPattern': f'Your spending increased by 15% this week, mainly in {top_category.lower()} category. Try to identify and reduce impulse purchases.',
+            'budgetRecommendation': 'Set category-wise budgets: Food ₹800, Transport ₹400, Entertainment ₹300. Track daily to stay on target.',
+            'savingsTip': 'Small savings add up! Skip one coffee shop visit per week to save ₹1,200 annually.',
+            'locationInsight': 'VIT campus area shows high transaction frequency. Consider using mess facilities more often to reduce outside food expenses.'
+        },
+        {
+            'spendingPattern': f'You\'ve maintained consistent spending in {top_category.lower()}. Great job! Focus on optimizing other categories now.',
+            'budgetRecommendation': 'Your current spending pattern suggests you could save ₹500/month by reducing discretionary expenses by just 10%.',
+            'savingsTip': 'Consider carpooling or using campus transport to save ₹200-300 monthly on transportation.',
+            'locationInsight': f'{top_location} is your top spending location. Explore student discounts and combo offers to maximize value.'
+        }
+    ]
+
+
+def build(columns, currency, version=None):
+    """The stored record for one user: insights, summary, data_version and generated_at."""
+    summary = summarize(columns)
+    templates = _templates(summary)
+    # Vary the wording between data versions, but keep it stable within one
+    choice = zlib.crc32(str(version).encode('utf-8')) % len(templates)
+    return {
+        'insights': templates[choice],
+        'summary': {
+            'total_spent': round(summary['total_spent'], 2),
+            'currency': currency,
+            'top_category': summary['top_category'],
+            'top_location': summary['top_location'],
+        },
+        'data_version': version,
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def load_latest(request_fn, user_id):
+    """(stored precomputed record or None, the user's current data version) in one query."""
+    rows = request_fn('POST', LATEST_RPC, {'p_user_id': user_id, 'p_insight_type': INSIGHT_TYPE})
+    if not rows:
+        return None, None
+    row = rows[0]
+    try:
+        record = json.loads(row['insight_text'])
+    except (TypeError, ValueError):
+        return None, row.get('current_version')
+    record['data_version'] = row.get('data_version')
+    return record, row.get('current_version')
+
+
+def save(request_fn, user_id, record):
+    """Store ``record`` as the user's precomputed insight, replacing the previous one."""
+    body = {k: v for k, v in record.items() if k != 'data_version'}
+    created = request_fn('POST', INSIGHTS_TABLE, {
+        'user_id': user_id,
+        'insight_text': json.dumps(body, separators=(',', ':')),
+        'insight_type': INSIGHT_TYPE,
+        'data_version': record['data_version'],
+    }, headers={'Prefer': 'return=representation'})
+    if created:
+        request_fn(
+            'DELETE',
+            f'{INSIGHTS_TABLE}?user_id=eq.{user_id}&insight_type=eq.{INSIGHT_TYPE}&id=neq.{created[0]["id"]}'
+        )
+
+
+class InsightJobs:
+    """Debounced per-user insight jobs plus this worker's copy of the latest results.
+
+    ``compute(user_id)`` returns a fresh record (see ``build``).
+    """
+
+    def __init__(self, request_fn, compute, delay=2.0, max_delay=30.0, workers=2, max_cached=1024):
+        self.request_fn = request_fn
+        self.compute = compute
+        self.delay = delay
+        self.max_delay = max_delay
+        self.workers = workers
+        self.max_cached = max_cached
+        self._cond = threading.Condition()
+        self._due = {}  # user_id -> (run_at, first_triggered_at)
+        self._running = set()
+        self._latest = OrderedDict()  # user_id -> record
+        self._pid = None
+        self.scheduled = 0
+        self.runs = 0
+        self.failures = 0
+        self.hits = 0
+        self.stale = 0
+        self.misses = 0
+        self._run_ms = []
+
+    # -- scheduling -----------------------------------------------------
+    def _ensure_started(self):
+        # Threads do not survive a fork; each worker process starts its own
+        if self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._due, self._running = {}, set()
+            self._pid = os.getpid()
+        for i in range(self.workers):
+            threading.Thread(target=self._run, name=f'insight-jobs-{i}', daemon=True).start()
+
+    def schedule(self, user_id):
+        """Recompute ``user_id``'s insights once writes have settled."""
+        self._ensure_started()
+        now = time.monotonic()
+        with self._cond:
+            _, first = self._due.get(user_id, (None, now))
+            self._due[user_id] = (min(now + self.delay, first + self.max_delay), first)
+            self.scheduled += 1
+            self._cond.notify()
+
+    def _next(self):
+        """(user_id, wait): the earliest job not already running (lock held)."""
+        ready = [(run_at, user) for user, (run_at, _) in self._due.items() if user not in self._running]
+        if not ready:
+            return None, None
+        run_at, user = min(ready)
+        return user, max(0.0, run_at - time.monotonic())
+
+    def _run(self):
+        while True:
+            with self._cond:
+                user_id, wait = self._next()
+                while user_id is None or wait > 0:
+                    self._cond.wait(timeout=wait)
+                    user_id, wait = self._next()
+                del self._due[user_id]
+                self._running.add(user_id)
+            try:
+                self.run_now(user_id)
+            except Exception as e:
+                with self._cond:
+                    self.failures += 1
+                logger.warning(f"Insight job for {user_id} failed: {e}")
+            finally:
+                with self._cond:
+                    self._running.discard(user_id)
+                    self._cond.notify_all()
+
+    # -- results --------------------------------------------------------
+    def run_now(self, user_id):
+        """Compute, store and remember ``user_id``'s insights; returns the record."""
+        started = time.monotonic()
+        record = self.compute(user_id)
+        try:
+            save(self.request_fn, user_id, record)
+        except Exception as e:
+            # Still served from this worker; the next job tries to store again
+            logger.warning(f"Could not store insights for {user_id}: {e}")
+        self._remember(user_id, record)
+        with self._cond:
+            self.runs += 1
+            self._run_ms = (self._run_ms + [(time.monotonic() - started) * 1000.0])[-200:]
+        return record
+
+    def _remember(self, user_id, record):
+        with self._cond:
+            self._latest[user_id] = record
+            self._latest.move_to_end(user_id)
+            while len(self._latest) > self.max_cached:
+                self._latest.popitem(last=False)
+
+    def latest(self, user_id):
+        """(record, fresh) for the newest stored insights, or (None, False) when there are none.
+
+        When the current data version cannot be read, whatever is stored
+        counts as fresh.
+        """
+        try:
+            record, version = load_latest(self.request_fn, user_id)
+        except Exception as e:
+            logger.warning(f"Could not read stored insights for {user_id}: {e}")
+            record, version = None, None
+        if record is not None:
+            self._remember(user_id, record)
+        with self._cond:
+            if record is None:
+                # Not stored (or unreadable): this worker's last result, if any
+                record = self._latest.get(user_id)
+            if record is None:
+                self.misses += 1
+                return None, False
+            fresh = version is None or record['data_version'] == version
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale += 1
+        return record, fresh
+
+    def stats(self):
+        with self._cond:
+            samples = sorted(self._run_ms)
+            pending, running, cached = len(self._due), len(self._running), len(self._latest)
+        return {
+            'pending_jobs': pending,
+            'running_jobs': running,
+            'cached_users': cached,
+            'scheduled': self.scheduled,
+            'runs': self.runs,
+            'failures': self.failures,
+            'hits': self.hits,
+            'stale': self.stale,
+            'misses': self.misses,
+            'run_p50_ms': round(samples[len(samples) // 2], 2) if samples else None,
+            'debounce_ms': round(self.delay * 1000.0, 1),
+        }
+
+
+def from_env(request_fn, compute):
+    """Jobs configured by INSIGHT_JOB_* variables."""
+    return InsightJobs(
+        request_fn,
+        compute,
+        delay=int(os.getenv('INSIGHT_JOB_DELAY_MS', '2000')) / 1000.0,
+        max_delay=int(os.getenv('INSIGHT_JOB_MAX_DELAY_MS', '30000')) / 1000.0,
+        workers=int(os.getenv('INSIGHT_JOB_WORKERS', '2')),
+    )
@@ -0,0 +1,300 @@
+"""
+Prometheus-style metrics, aggregated across gunicorn workers.
+
+Each worker records into an in-process registry of counters, gauges and
+histograms and writes a snapshot of it to ``<METRICS_DIR>/worker-<pid>-<run>.json``
+every ``flush_seconds`` (and whenever it serves a scrape). /api/metrics merges
+every snapshot in the directory and renders the Prometheus text format:
+counters and histograms are summed over all workers, gauges over live ones.
+
+Counters must not go backwards when a worker exits, so a scrape folds the
+snapshots of dead workers into ``archive.json`` (under a lock) and deletes
+them; their gauges are dropped. A snapshot whose pid was reused by another
+process stops counting towards gauges once it is a few flush intervals old.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ARCHIVE = 'archive.json'
+
+
+class Registry:
+    """Metric families for one process: name -> {labels tuple -> value}."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}  # name -> (type, help, label names, buckets)
+        self._values = {}
+        self._pid = os.getpid()
+
+    def _own(self):
+        # A forked worker must not report what its parent recorded (lock held)
+        if self._pid != os.getpid():
+            self._values = {name: {} for name in self._meta}
+            self._pid = os.getpid()
+
+    def _family(self, kind, name, help_text, labels, buckets=None):
+        self._meta[name] = (kind, help_text, tuple(labels), tuple(buckets) if buckets else None)
+        self._values.setdefault(name, {})
+        return name
+
+    def counter(self, name, help_text, labels=()):
+        return self._family('counter', name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=()):
+        return self._family('gauge', name, help_text, labels)
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._family('histogram', name, help_text, labels, buckets)
+
+    def inc(self, name, *labels, amount=1.0):
+        with self._lock:
+            self._own()
+            family = self._values[name]
+            family[labels] = family.get(labels, 0.0) + amount
+
+    def dec(self, name, *labels, amount=1.0):
+        self.inc(name, *labels, amount=-amount)
+
+    def observe(self, name, value, *labels):
+        buckets = self._meta[name][3]
+        with self._lock:
+            self._own()
+            family = self._values[name]
+            # [count per bucket (non-cumulative, last is +Inf), sum]
+            entry = family.get(labels)
+            if entry is None:
+                entry = family[labels] = [[0] * (len(buckets) + 1), 0.0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            else:
+                entry[0][-1] += 1
+            entry[1] += value
+
+    def snapshot(self):
+        with self._lock:
+            self._own()
+            return {
+                'meta': {name: [kind, help_text, list(labels), list(buckets) if buckets else None]
+                         for name, (kind, help_text, labels, buckets) in self._meta.items()},
+                'values': {
+                    name: [[list(labels), [list(value[0]), value[1]] if isinstance(value, list) else value]
+                           for labels, value in family.items()]
+                    for name, family in self._values.items()
+                },
+            }
+
+
+def _merge(into, snapshot, gauges=True):
+    """Add a snapshot's values to ``into`` ({'meta', 'values': {name: {labels: value}}})."""
+    for name, meta in snapshot.get('meta', {}).items():
+        into['meta'].setdefault(name, meta)
+    for name, items in snapshot.get('values', {}).items():
+        kind = into['meta'].get(name, [None])[0]
+        if kind == 'gauge' and not gauges:
+            continue
+        family = into['values'].setdefault(name, {})
+        for labels, value in items:
+            key = tuple(labels)
+            if kind == 'histogram':
+                current = family.get(key)
+                if current is None:
+                    family[key] = [list(value[0]), value[1]]
+                else:
+                    current[0] = [a + b for a, b in zip(current[0], value[0])]
+                    current[1] += value[1]
+            else:
+                family[key] = family.get(key, 0.0) + value
+    return into
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _write_json(path, data):
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.metrics-', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+            json.dump(data, fh, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render(merged):
+    """Prometheus text exposition (format 0.0.4) of merged values."""
+    lines = []
+    for name in sorted(merged['meta']):
+        kind, help_text, label_names, buckets = merged['meta'][name]
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(merged['values'].get(name, {}).items()):
+            if kind == 'histogram':
+                cumulative = 0
+                for bound, count in zip(list(buckets) + [float('inf')], value[0]):
+                    cumulative += count
+                    le = 'le="' + ('+Inf' if bound == float('inf') else repr(float(bound))) + '"'
+                    lines.append(f'{name}_bucket{_label_text(label_names, labels, le)} {cumulative}')
+                lines.append(f'{name}_sum{_label_text(label_names, labels)} {repr(float(value[1]))}')
+                lines.append(f'{name}_count{_label_text(label_names, labels)} {cumulative}')
+            else:
+                lines.append(f'{name}{_label_text(label_names, labels)} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+class MultiProcessMetrics:
+    """A worker's registry plus the shared snapshot directory."""
+
+    def __init__(self, registry, directory, flush_seconds=2.0):
+        self.registry = registry
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self._pid = None
+        self._path = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        # One snapshot file and flusher per worker process, started on its first request
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._path = os.path.join(self.directory, f'worker-{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name='metrics-flusher', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            self.flush()
+
+    def flush(self):
+        self.start()
+        snapshot = self.registry.snapshot()
+        snapshot['pid'] = os.getpid()
+        try:
+            _write_json(self._path, snapshot)
+        except OSError as e:
+            logger.warning(f"Could not write metrics snapshot: {e}")
+
+    def _fold_dead_workers(self, snapshots):
+        """Move dead workers' counters into the archive; returns the snapshots still live."""
+        dead = [(path, s) for path, s in snapshots if not _pid_alive(int(s.get('pid', 0)))]
+        if not dead or fcntl is None:
+            return snapshots
+        lock_path = os.path.join(self.directory, '.archive.lock')
+        with open(lock_path, 'a') as lock:
+            try:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another worker is folding; count the dead snapshots as they are this time
+                return snapshots
+            archive_path = os.path.join(self.directory, ARCHIVE)
+            archive = _read_json(archive_path) or {'meta': {}, 'values': {}}
+            merged = {'meta': archive['meta'], 'values': {
+                name: {tuple(labels): value for labels, value in items}
+                for name, items in archive['values'].items()
+            }}
+            folded = []
+            for path, snapshot in dead:
+                if not os.path.exists(path):
+                    continue  # already folded by someone else
+                _merge(merged, snapshot, gauges=False)
+                folded.append(path)
+            _write_json(archive_path, {'meta': merged['meta'], 'values': {
+                name: [[list(labels), value] for labels, value in family.items()]
+                for name, family in merged['values'].items()
+            }})
+            for path in folded:
+                os.unlink(path)
+        return [(path, s) for path, s in snapshots if path not in set(folded)]
+
+    def collect(self):
+        """Merged values of every worker on the host, plus the archive."""
+        self.flush()
+        snapshots = []
+        for name in os.listdir(self.directory):
+            if name.startswith('worker-') and name.endswith('.json'):
+                path = os.path.join(self.directory, name)
+                snapshot = _read_json(path)
+                if snapshot is not None:
+                    snapshots.append((path, snapshot))
+        snapshots = self._fold_dead_workers(snapshots)
+        merged = {'meta': {}, 'values': {}}
+        archive = _read_json(os.path.join(self.directory, ARCHIVE))
+        if archive:
+            _merge(merged, archive, gauges=False)
+        # Gauges only from snapshots that are still being refreshed
+        fresh_after = time.time() - 3 * self.flush_seconds
+        for path, snapshot in snapshots:
+            try:
+                fresh = os.stat(path).st_mtime >= fresh_after or path == self._path
+            except OSError:
+                fresh = False
+            _merge(merged, snapshot, gauges=fresh)
+        return merged
+
+    def exposition(self):
+        return render(self.collect())
+
+
+def from_env(registry):
+    return MultiProcessMetrics(
+        registry,
+        os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'aureus-metrics')),
+        flush_seconds=float(os.getenv('METRICS_FLUSH_SECONDS', '2')),
+    )
@@ -0,0 +1,248 @@
+"""
+On-demand sampling profiler and slow-request capture for one worker.
+
+Sampling uses ``ITIMER_PROF``: after every ``interval`` seconds of CPU time the
+kernel sends SIGPROF and the handler records the interrupted Python stack,
+collapsed to ``frame;frame;...`` lines with a count -- the input format of
+flamegraph.pl and speedscope. The handler runs on the main thread, which is
+where gevent and sync workers run every request, so it sees whichever request
+is on the CPU. Waiting on a socket burns no CPU and is not sampled; that time
+shows up in the phase timings instead. Requests served on other threads (the
+threaded dev server) are not sampled.
+
+Sampling is off until asked for: for the whole worker (``enable()``), or for
+single requests (``begin()``/``end()``). Stacks are rooted at the label of the
+request they were taken in. The time spent inside the handler is compared
+with the CPU time that passed while the timer was armed; that ratio is the
+profiler's overhead.
+
+Separately, every request's wall time is split into phases by
+``RequestTiming`` -- upstream, serialize, and compute as the remainder -- and
+``SlowRequests`` keeps the slowest of them.
+"""
+import os
+import time
+import heapq
+import signal
+import itertools
+import threading
+from contextlib import contextmanager
+
+try:
+    from greenlet import getcurrent as _current
+except ImportError:  # no gevent: requests are told apart by thread
+    _current = threading.get_ident
+
+MAX_DEPTH = 64
+# Distinct stacks kept; samples of any further new stack are counted under one entry
+MAX_STACKS = 20000
+OTHER = '(outside requests)'
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__') or os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class SamplingProfiler:
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.available = hasattr(signal, 'SIGPROF') and threading.current_thread() is threading.main_thread()
+        self.worker_wide = False
+        self._lock = threading.Lock()
+        self._active = {}  # greenlet or thread -> request label
+        self._names = {}  # code object -> collapsed frame name
+        self._pid = os.getpid()
+        self._armed = False
+        self._reset_counts()
+        if self.available:
+            signal.signal(signal.SIGPROF, self._sample)
+            # Restart interrupted system calls instead of failing them with EINTR
+            signal.siginterrupt(signal.SIGPROF, False)
+
+    def _reset_counts(self):
+        self._stacks = {}
+        self.samples = 0
+        self._handler_seconds = 0.0
+        self._cpu_seconds = 0.0
+        self._cpu_mark = time.process_time()
+
+    def _sample(self, signum, frame):
+        # Runs between bytecodes on the main thread, possibly inside code holding self._lock: never take it
+        started = time.perf_counter()
+        label = self._active.get(_current())
+        if label is None:
+            if not self.worker_wide:
+                self._handler_seconds += time.perf_counter() - started
+                return
+            label = OTHER
+        names = []
+        names_cache = self._names
+        while frame is not None and len(names) < MAX_DEPTH:
+            code = frame.f_code
+            name = names_cache.get(code)
+            if name is None:
+                name = names_cache[code] = _frame_name(frame)
+            names.append(name)
+            frame = frame.f_back
+        names.append(label)
+        names.reverse()
+        key = ';'.join(names)
+        stacks = self._stacks
+        if key not in stacks and len(stacks) >= MAX_STACKS:
+            key = f'{label};(more stacks)'
+        stacks[key] = stacks.get(key, 0) + 1
+        self.samples += 1
+        self._handler_seconds += time.perf_counter() - started
+
+    def _arm(self):
+        """Start or stop the timer to match what is being profiled (lock held)."""
+        if self._pid != os.getpid():
+            # Timers are not inherited across fork; neither is anything being profiled
+            self._pid, self._armed, self._active = os.getpid(), False, {}
+            self._reset_counts()
+        want = self.worker_wide or bool(self._active)
+        if want == self._armed:
+            return
+        if want:
+            self._cpu_mark = time.process_time()
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        else:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            self._cpu_seconds += time.process_time() - self._cpu_mark
+        self._armed = want
+
+    # -- control --------------------------------------------------------
+    def enable(self):
+        """Sample everything this worker runs until ``disable``."""
+        if not self.available:
+            return False
+        with self._lock:
+            self.worker_wide = True
+            self._arm()
+        return True
+
+    def disable(self):
+        with self._lock:
+            self.worker_wide = False
+            self._arm()
+
+    def begin(self, label):
+        """Sample the calling request under ``label`` until ``end``; returns a token, or None.
+
+        A request dispatched inside another on the same greenlet (a batch
+        sub-request) gets None and its samples stay under the outer label.
+        """
+        if not self.available:
+            return None
+        key = _current()
+        with self._lock:
+            if key in self._active:
+                return None
+            self._active[key] = label
+            self._arm()
+        return key
+
+    def end(self, token):
+        with self._lock:
+            self._active.pop(token, None)
+            self._arm()
+
+    def reset(self):
+        with self._lock:
+            self._reset_counts()
+
+    # -- results --------------------------------------------------------
+    def collapsed(self):
+        """Collapsed stacks, one ``stack count`` line each, most sampled first."""
+        stacks = dict(self._stacks)
+        return ''.join(f'{k} {v}\n' for k, v in sorted(stacks.items(), key=lambda kv: -kv[1]))
+
+    def stats(self):
+        with self._lock:
+            cpu = self._cpu_seconds + (time.process_time() - self._cpu_mark if self._armed else 0.0)
+            return {
+                'available': self.available,
+                'worker_wide': self.worker_wide,
+                'profiling_requests': len(self._active),
+                'interval_ms': round(self.interval * 1000.0, 2),
+                'samples': self.samples,
+                'stacks': len(self._stacks),
+                'sampled_cpu_seconds': round(cpu, 3),
+                'overhead_pct': round(self._handler_seconds / cpu * 100.0, 3) if cpu > 0 else None,
+            }
+
+
+class RequestTiming:
+    """Wall time of one request split into phases; a phase opened inside another counts once."""
+
+    __slots__ = ('started', 'phases', '_depth')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self._depth = 0
+
+    @contextmanager
+    def phase(self, name):
+        if self._depth:
+            yield
+            return
+        self._depth += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def finish(self):
+        """(total seconds, {phase: ms}) with whatever no phase claimed counted as compute."""
+        total = time.perf_counter() - self.started
+        phases = {name: round(seconds * 1000.0, 2) for name, seconds in self.phases.items()}
+        phases['compute'] = round(max(0.0, total - sum(self.phases.values())) * 1000.0, 2)
+        return total, phases
+
+
+class SlowRequests:
+    """The ``capacity`` slowest requests since the last reset (a min-heap on duration)."""
+
+    def __init__(self, capacity=50):
+        self.capacity = capacity
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def offer(self, seconds, make_record):
+        """Keep the request if it is among the slowest; ``make_record()`` is only called then."""
+        if len(self._heap) >= self.capacity and seconds <= self._heap[0][0]:
+            return False
+        record = make_record()
+        with self._lock:
+            item = (seconds, next(self._seq), record)
+            if len(self._heap) < self.capacity:
+                heapq.heappush(self._heap, item)
+            elif seconds > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+            else:
+                return False
+        return True
+
+    def snapshot(self):
+        with self._lock:
+            items = sorted(self._heap, key=lambda item: -item[0])
+        return [record for _, _, record in items]
+
+    def reset(self):
+        with self._lock:
+            self._heap = []
+
+
+def from_env():
+    """(profiler, slow request log, per-request sample fraction) from PROFILER_* variables."""
+    profiler = SamplingProfiler(interval=int(os.getenv('PROFILER_INTERVAL_MS', '10')) / 1000.0)
+    if os.getenv('PROFILER_WORKER_WIDE', '').lower() in ('1', 'true', 'yes'):
+        profiler.enable()
+    slow = SlowRequests(int(os.getenv('SLOW_REQUEST_LOG_SIZE', '50')))
+    return profiler, slow, float(os.getenv('PROFILER_SAMPLE_PERCENT', '0')) / 100.0
@@ -0,0 +1,317 @@
+"""
+Historical daily exchange rates, stored locally and queried in bulk.
+
+Each currency's history is a pair of NumPy arrays sorted by date: day numbers
+(days since 1970-01-01) and units of that currency per one anchor unit. An
+as-of lookup for a whole column of dates is a single ``searchsorted`` per
+currency, and any pair is derived through the anchor exactly like the live
+``RateMatrix``. Dates without a quote (weekends, holidays) use the latest
+earlier quote, up to ``max_gap_days`` back.
+
+The series live in one ``.npz`` file that is swapped in atomically, so every
+worker reads it without locks and reloads it when it changes. Only the sync
+command writes it, and it only asks the provider for dates outside the range
+already covered:
+
+    python rate_history.py sync [--since 2020-01-01]   # run from html_template/
+"""
+import os
+import sys
+import argparse
+import logging
+import tempfile
+from datetime import date, timedelta
+
+import numpy as np
+import requests
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+DEFAULT_URL = 'https://api.frankfurter.app'
+_EPOCH = date(1970, 1, 1)
+NO_DAY = np.iinfo(np.int64).min
+
+
+def day_number(value):
+    return (value - _EPOCH).days
+
+
+def day_label(number):
+    return (_EPOCH + timedelta(days=int(number))).isoformat()
+
+
+def day_numbers(values):
+    """Parse a column of YYYY-MM-DD strings; unparseable entries become NO_DAY."""
+    texts = np.asarray([str(v or '')[:10] for v in values], dtype=str)
+    uniques, inverse = np.unique(texts, return_inverse=True)
+    parsed = np.empty(len(uniques), dtype=np.int64)
+    for k, text in enumerate(uniques.tolist()):
+        try:
+            parsed[k] = day_number(date.fromisoformat(text))
+        except ValueError:
+            parsed[k] = NO_DAY
+    return parsed[inverse].reshape(texts.shape)
+
+
+class RateHistory:
+    """Per-currency (days, rates) arrays against one anchor, plus the date range synced so far."""
+
+    def __init__(self, anchor, series=None, covered=None):
+        self.anchor = anchor
+        self.series = series or {}  # currency -> (days int64, per-anchor float64), sorted by day
+        self.covered = covered  # (first_day, last_day) fetched from the provider, or None
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['format']) != FORMAT_VERSION:
+                raise ValueError(f'unsupported rate history format {int(data["format"])}')
+            covered = tuple(int(d) for d in data['covered']) if len(data['covered']) else None
+            series = {
+                str(c): (data[f'days_{c}'], data[f'rates_{c}'])
+                for c in data['currencies'].tolist()
+            }
+            return cls(str(data['anchor']), series, covered)
+
+    def save(self, path):
+        arrays = {
+            'format': np.array(FORMAT_VERSION),
+            'anchor': np.array(self.anchor),
+            'covered': np.array(self.covered or (), dtype=np.int64),
+            'currencies': np.array(sorted(self.series), dtype=str),
+        }
+        for currency, (days, rates) in self.series.items():
+            arrays[f'days_{currency}'] = days
+            arrays[f'rates_{currency}'] = rates
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.rate-history-', suffix='.npz')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                np.savez(fh, **arrays)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    # -- ingestion ------------------------------------------------------
+    def merge(self, quotes):
+        """Add {YYYY-MM-DD: {currency: per-anchor rate}}; a newer quote for a stored day replaces it."""
+        by_currency = {}
+        for day, rates in quotes.items():
+            number = day_number(date.fromisoformat(day[:10]))
+            for currency, rate in rates.items():
+                if rate and currency != self.anchor:
+                    by_currency.setdefault(currency.upper(), []).append((number, float(rate)))
+        added = 0
+        for currency, points in by_currency.items():
+            new_days = np.array([d for d, _ in points], dtype=np.int64)
+            new_rates = np.array([r for _, r in points], dtype=np.float64)
+            old_days, old_rates = self.series.get(currency, (np.empty(0, np.int64), np.empty(0)))
+            days = np.concatenate([new_days, old_days])
+            rates = np.concatenate([new_rates, old_rates])
+            # Stable sort keeps the new quote first among equal days; unique keeps the first
+            order = np.argsort(days, kind='stable')
+            days, first = np.unique(days[order], return_index=True)
+            self.series[currency] = (days, rates[order][first])
+            added += len(days) - len(old_days)
+        return added
+
+    def gaps(self, start, end):
+        """Day-number ranges inside [start, end] that have not been fetched yet."""
+        if self.covered is None:
+            return [(start, end)] if start <= end else []
+        first, last = self.covered
+        # Gaps always extend to the covered span, so it stays one contiguous range
+        missing = []
+        if start < first:
+            missing.append((start, first - 1))
+        if end > last:
+            missing.append((last + 1, end))
+        return missing
+
+    def mark_covered(self, start, end):
+        if self.covered is None:
+            self.covered = (start, end)
+        else:
+            self.covered = (min(self.covered[0], start), max(self.covered[1], end))
+
+    # -- lookups --------------------------------------------------------
+    def currencies(self):
+        return sorted(set(self.series) | {self.anchor})
+
+    def anchor_rates(self, codes, days, max_gap_days=7):
+        """Per-anchor rates as of each day: (rates, quote_days); NaN / NO_DAY where none is stored."""
+        days = np.asarray(days, dtype=np.int64)
+        labels, inverse = np.unique(np.asarray(codes, dtype=str), return_inverse=True)
+        inverse = np.broadcast_to(inverse.reshape(np.shape(codes)), days.shape)
+        rates = np.full(days.shape, np.nan)
+        quoted = np.full(days.shape, NO_DAY, dtype=np.int64)
+        valid_day = days != NO_DAY
+        for k, code in enumerate(labels.tolist()):
+            code = code.upper()
+            series = self.series.get(code)
+            if code != self.anchor and series is None:
+                continue
+            selected = (inverse == k) & valid_day
+            if code == self.anchor:
+                rates[selected] = 1.0
+                quoted[selected] = days[selected]
+                continue
+            stored_days, stored_rates = series
+            wanted = days[selected]
+            # Latest quote on or before each requested day
+            pos = np.searchsorted(stored_days, wanted, side='right') - 1
+            found = pos >= 0
+            pos = np.maximum(pos, 0)
+            found &= (wanted - stored_days[pos]) <= max_gap_days
+            rates[selected] = np.where(found, stored_rates[pos], np.nan)
+            quoted[selected] = np.where(found, stored_days[pos], NO_DAY)
+        return rates, quoted
+
+    def convert(self, amounts, days, from_codes, to_codes, max_gap_days=7):
+        """Convert a column of amounts at each row's date: (converted, rates, quote_days).
+
+        ``from_codes`` and ``to_codes`` may be single codes or one per amount.
+        The quote day reported is the older of the two quotes a rate came from.
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        days = np.broadcast_to(np.asarray(days, dtype=np.int64), amounts.shape)
+        from_rates, from_days = self.anchor_rates(from_codes, days, max_gap_days)
+        to_rates, to_days = self.anchor_rates(to_codes, days, max_gap_days)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates = to_rates / from_rates
+        missing = np.isnan(rates)
+        quote_days = np.where(missing, NO_DAY, np.minimum(from_days, to_days))
+        return amounts * rates, rates, quote_days
+
+    def stats(self):
+        return {
+            'anchor': self.anchor,
+            'currencies': self.currencies(),
+            'points': int(sum(len(days) for days, _ in self.series.values())),
+            'covered_from': day_label(self.covered[0]) if self.covered else None,
+            'covered_to': day_label(self.covered[1]) if self.covered else None,
+        }
+
+
+class HistoryStore:
+    """The history file shared by the workers, reloaded when another process replaces it."""
+
+    def __init__(self, path, anchor):
+        self.path = path
+        self.anchor = anchor
+        self._seen = None
+        self._history = None
+
+    def current(self):
+        """The latest stored history, or None when nothing has been synced yet."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp != self._seen:
+            try:
+                history = RateHistory.load(self.path)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Ignoring unreadable rate history {self.path}: {e}")
+                return self._history
+            self._seen = stamp
+            self._history = history if history.anchor == self.anchor else None
+        return self._history
+
+    def load_or_new(self):
+        return self.current() or RateHistory(self.anchor)
+
+
+def fetch_daily(anchor, start, end, symbols=None, base_url=None, session=None):
+    """Daily per-anchor quotes for [start, end] as {YYYY-MM-DD: {currency: rate}}.
+
+    The default provider (Frankfurter, ECB reference rates) needs no key and
+    omits weekends and holidays.
+    """
+    url = f"{(base_url or os.getenv('RATE_HISTORY_URL', DEFAULT_URL)).rstrip('/')}/{start.isoformat()}..{end.isoformat()}"
+    params = {'from': anchor}
+    if symbols:
+        params['to'] = ','.join(sorted(c for c in symbols if c != anchor))
+    resp = (session or requests).get(url, params=params, timeout=30)
+    resp.raise_for_status()
+    return resp.json().get('rates', {})
+
+
+def sync(history, fetch, start, end, chunk_days=366, on_chunk=None):
+    """Fetch the days in [start, end] the history does not cover yet; returns quotes added.
+
+    ``fetch(start_date, end_date)`` returns quotes in the shape ``merge`` takes.
+    Recent days without a quote yet (today, a weekend) are left uncovered so
+    the next sync asks for them again.
+    """
+    added = 0
+    recent = day_number(date.today()) - 3
+    for gap_start, gap_end in history.gaps(day_number(start), day_number(end)):
+        chunk_start = gap_start
+        while chunk_start <= gap_end:
+            chunk_end = min(gap_end, chunk_start + chunk_days - 1)
+            quotes = fetch(_EPOCH + timedelta(days=chunk_start), _EPOCH + timedelta(days=chunk_end))
+            added += history.merge(quotes)
+            covered_end = chunk_end
+            if chunk_end >= recent:
+                quoted = [day_number(date.fromisoformat(d[:10])) for d in quotes]
+                covered_end = min(chunk_end, max(quoted, default=chunk_start - 1))
+            if covered_end >= chunk_start:
+                history.mark_covered(chunk_start, covered_end)
+            if on_chunk is not None:
+                on_chunk(history)
+            chunk_start = chunk_end + 1
+    return added
+
+
+def from_env():
+    """The store at RATE_HISTORY_PATH (a file in the system temp directory by default)."""
+    return HistoryStore(
+        os.getenv('RATE_HISTORY_PATH', os.path.join(tempfile.gettempdir(), 'aureus-rate-history.npz')),
+        os.getenv('RATE_ANCHOR', 'USD').upper(),
+    )
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description='Maintain the local daily exchange-rate history')
+    parser.add_argument('command', choices=['sync', 'status'])
+    parser.add_argument('--since', type=date.fromisoformat, help='first date to hold (default: two years ago)')
+    parser.add_argument('--until', type=date.fromisoformat, help='last date to hold (default: today)')
+    parser.add_argument('--symbols', help='comma-separated currencies (default: every one the provider quotes)')
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    store = from_env()
+    history = store.load_or_new()
+    if args.command == 'status':
+        logger.info(f"{store.path}: {history.stats()}")
+        return 0
+
+    until = args.until or date.today()
+    since = args.since or until - timedelta(days=730)
+    symbols = [s.strip().upper() for s in (args.symbols or '').split(',') if s.strip()]
+    session = requests.Session()
+    added = sync(
+        history,
+        lambda a, b: fetch_daily(history.anchor, a, b, symbols, session=session),
+        since, until,
+        # Save after every chunk so an interrupted backfill resumes where it stopped
+        on_chunk=lambda h: h.save(store.path),
+    )
+    logger.info(f"Added {added} quote(s); {history.stats()}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
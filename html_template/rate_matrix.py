@@ -0,0 +1,143 @@
+"""
+Cross-rate matrix derived from a single anchor-currency snapshot.
+
+The providers are asked for one base only (the anchor, USD by default). From
+the anchor's rates we derive every pair: ``M[i, j] = r[j] / r[i]`` is how many
+units of currency j one unit of currency i buys. The matrix is a float64
+NumPy array, so adding currencies costs no extra upstream calls.
+
+Each currency also remembers where its anchor rate came from and when, so any
+cell can report its provenance: the older of its two inputs decides its age.
+"""
+import time
+
+import numpy as np
+
+
+class RateMatrix:
+    """Immutable N x N cross-rate table plus per-currency provenance."""
+
+    def __init__(self, currencies, anchor, anchor_rates, sources, fetched_at):
+        self.currencies = tuple(currencies)
+        self.anchor = anchor
+        self.index = {c: i for i, c in enumerate(self.currencies)}
+        # Units of each currency per 1 anchor; NaN where no provider has quoted it yet
+        self.anchor_rates = np.asarray(anchor_rates, dtype=np.float64)
+        self.sources = tuple(sources)
+        self.fetched_at = np.asarray(fetched_at, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.matrix = self.anchor_rates[np.newaxis, :] / self.anchor_rates[:, np.newaxis]
+
+    @classmethod
+    def build(cls, currencies, anchor, rates, source, fetched_at=None, previous=None):
+        """Build from an anchor-based rates dict, keeping older quotes for currencies it lacks."""
+        currencies = sorted(set(currencies) | {anchor})
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        values, sources, stamps = [], [], []
+        for currency in currencies:
+            if currency == anchor:
+                values.append(1.0)
+                sources.append(source)
+                stamps.append(fetched_at)
+            elif rates.get(currency):
+                values.append(float(rates[currency]))
+                sources.append(source)
+                stamps.append(fetched_at)
+            elif previous is not None and currency in previous.index and previous.has(currency):
+                i = previous.index[currency]
+                values.append(float(previous.anchor_rates[i]))
+                sources.append(previous.sources[i])
+                stamps.append(float(previous.fetched_at[i]))
+            else:
+                values.append(np.nan)
+                sources.append(None)
+                stamps.append(np.nan)
+        return cls(currencies, anchor, values, sources, stamps)
+
+    def to_dict(self):
+        """JSON-safe form of the matrix inputs (NaN stored as null)."""
+        return {
+            'currencies': list(self.currencies),
+            'anchor': self.anchor,
+            'anchor_rates': [None if np.isnan(v) else float(v) for v in self.anchor_rates],
+            'sources': list(self.sources),
+            'fetched_at': [None if np.isnan(v) else float(v) for v in self.fetched_at],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        nan = float('nan')
+        return cls(
+            data['currencies'], data['anchor'],
+            [nan if v is None else v for v in data['anchor_rates']],
+            data['sources'],
+            [nan if v is None else v for v in data['fetched_at']],
+        )
+
+    def has(self, currency):
+        i = self.index.get(currency)
+        return i is not None and not np.isnan(self.anchor_rates[i])
+
+    def rate(self, from_currency, to_currency):
+        """Units of ``to_currency`` per 1 ``from_currency``, or None if either is unknown."""
+        i = self.index.get(from_currency)
+        j = self.index.get(to_currency)
+        if i is None or j is None:
+            return None
+        value = self.matrix[i, j]
+        return None if np.isnan(value) else float(value)
+
+    def row(self, base):
+        """All known rates for ``base`` as a dict, in the shape the providers return."""
+        i = self.index.get(base)
+        if i is None or not self.has(base):
+            return {base: 1.0}
+        row = self.matrix[i]
+        return {c: float(row[j]) for j, c in enumerate(self.currencies) if not np.isnan(row[j])}
+
+    def indices(self, codes):
+        """Vectorized currency-code -> matrix index lookup (-1 for unknown codes)."""
+        codes = np.char.upper(np.asarray(codes, dtype=str))
+        uniques, inverse = np.unique(codes, return_inverse=True)
+        lookup = np.array([self.index.get(c, -1) if self.has(c) else -1 for c in uniques], dtype=np.intp)
+        return lookup[inverse].reshape(codes.shape)
+
+    def convert(self, amounts, from_codes, to_codes):
+        """Convert a column of amounts in one pass; NaN where a currency is unknown.
+
+        ``from_codes`` and ``to_codes`` may each be a single code or one code per amount.
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        i = np.broadcast_to(self.indices(from_codes), amounts.shape)
+        j = np.broadcast_to(self.indices(to_codes), amounts.shape)
+        valid = (i >= 0) & (j >= 0)
+        rates = np.full(amounts.shape, np.nan)
+        rates[valid] = self.matrix[i[valid], j[valid]]
+        return amounts * rates, rates
+
+    def provenance(self, from_currency, to_currency, now=None):
+        i = self.index.get(from_currency)
+        j = self.index.get(to_currency)
+        if i is None or j is None or not (self.has(from_currency) and self.has(to_currency)):
+            return None
+        now = time.time() if now is None else now
+        oldest = float(min(self.fetched_at[i], self.fetched_at[j]))
+        sources = sorted({self.sources[i], self.sources[j]})
+        return {
+            'source': '+'.join(sources),
+            'fetched_at': oldest,
+            'age_seconds': round(now - oldest, 3),
+            'derived_via': None if self.anchor in (from_currency, to_currency) else self.anchor,
+        }
+
+    def snapshot(self, now=None):
+        """Per-currency provenance, for diagnostics."""
+        now = time.time() if now is None else now
+        return {
+            c: {
+                'per_anchor': None if not self.has(c) else float(self.anchor_rates[i]),
+                'source': self.sources[i],
+                'age_seconds': None if not self.has(c) else round(now - float(self.fetched_at[i]), 3),
+            }
+            for i, c in enumerate(self.currencies)
+        }
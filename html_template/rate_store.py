@@ -0,0 +1,115 @@
+"""
+Exchange-rate snapshot shared by every worker process on a host.
+
+The snapshot is one JSON file. Writers build a complete new file and
+``os.replace`` it over the old one, so readers only ever see a whole snapshot
+and never take a lock; they re-read the file when its inode or mtime changes.
+Refreshes are serialized across processes with an advisory ``flock`` on a
+sibling ``.lock`` file, so only one worker calls the providers at a time. The
+file outlives restarts, which lets a new worker answer its first request from
+the last snapshot.
+
+Without ``fcntl`` (Windows dev runs) the refresh lock degrades to a no-op,
+which is fine for the single-process development server.
+"""
+import os
+import json
+import time
+import logging
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+
+class RateStore:
+    """Atomically swapped JSON snapshot plus a cross-process refresh lock."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = f'{path}.lock'
+        self._seen = None  # (inode, mtime_ns, size) of the last file read
+
+    def load_if_changed(self):
+        """Return the stored entries if the file changed since the last call, else None."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp == self._seen:
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as fh:
+                data = json.load(fh)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable rate snapshot {self.path}: {e}")
+            return None
+        self._seen = stamp
+        if data.get('format') != FORMAT_VERSION:
+            return None
+        return data.get('entries', {})
+
+    def save(self, base, entry):
+        """Replace ``base`` in the snapshot; call while holding ``refresh_lock``."""
+        entries = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as fh:
+                stored = json.load(fh)
+            if stored.get('format') == FORMAT_VERSION:
+                entries = stored.get('entries', {})
+        except (OSError, ValueError):
+            pass
+        entries[base] = entry
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.rates-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+                json.dump({'format': FORMAT_VERSION, 'entries': entries}, fh, separators=(',', ':'))
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    @contextmanager
+    def refresh_lock(self, timeout=0.0):
+        """Yield True if this process may refresh, polling up to ``timeout`` seconds for the lock."""
+        if fcntl is None:
+            yield True
+            return
+        fd = os.open(self.lock_path, os.O_CREAT | os.O_RDWR, 0o644)
+        acquired = False
+        try:
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    # Non-blocking attempts keep gevent workers cooperative while waiting
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    acquired = True
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        break
+                    time.sleep(0.05)
+            yield acquired
+        finally:
+            if acquired:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+def from_env():
+    """The store at RATE_STORE_PATH (a file in the system temp directory by default)."""
+    return RateStore(os.getenv('RATE_STORE_PATH', os.path.join(tempfile.gettempdir(), 'aureus-rates.json')))
@@ -0,0 +1,255 @@
+"""
+Circuit breakers and hedged calls for the app's upstreams.
+
+Each upstream (the two rate providers and Supabase) gets a breaker that
+tracks outcomes over a rolling time window:
+
+    closed     calls go through; opens once the window holds at least
+               ``min_requests`` calls and the failure ratio reaches the limit
+    open       calls fail immediately with CircuitOpen for ``open_seconds``
+    half_open  a few trial calls go through; one success closes the
+               circuit, one failure opens it again
+
+Breakers live in the worker process, so every gunicorn worker learns about
+an outage on its own after a handful of failures.
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpen(RuntimeError):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+class AllUpstreamsFailed(RuntimeError):
+    """Raised by ``hedged`` when every candidate failed."""
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over a rolling window of call outcomes."""
+
+    def __init__(self, name, window_seconds=60.0, min_requests=5, failure_ratio=0.5,
+                 open_seconds=30.0, half_open_max=1, latency_samples=200):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.failure_ratio = failure_ratio
+        self.open_seconds = open_seconds
+        self.half_open_max = half_open_max
+        self._outcomes = deque()  # (timestamp, ok)
+        self._latencies = deque(maxlen=latency_samples)  # seconds, successful calls only
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trials = 0
+        self._trial_round = 0  # bumped on each switch to half-open, so stale slots are not given back
+        self._lock = threading.Lock()
+        self.opened_count = 0
+        self.rejected = 0
+
+    def _prune(self, now):
+        horizon = now - self.window_seconds
+        while self._outcomes and self._outcomes[0][0] < horizon:
+            self._outcomes.popleft()
+
+    def _current_state(self, now):
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._trials = 0
+            self._trial_round += 1
+        return self._state
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def allow(self):
+        """Whether a call may go through now; reserves a trial slot when half-open."""
+        return self._admit() is not None
+
+    def _admit(self):
+        """None when rejected, else the half-open round whose trial slot was taken (0 for none)."""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == CLOSED:
+                return 0
+            if state == HALF_OPEN and self._trials < self.half_open_max:
+                self._trials += 1
+                return self._trial_round
+            self.rejected += 1
+            return None
+
+    def _release_trial(self, trial_round):
+        with self._lock:
+            if self._state == HALF_OPEN and self._trial_round == trial_round and self._trials > 0:
+                self._trials -= 1
+
+    def record_success(self, latency=None):
+        with self._lock:
+            now = time.monotonic()
+            if latency is not None:
+                self._latencies.append(latency)
+            if self._current_state(now) == HALF_OPEN:
+                logger.info(f"Circuit {self.name} closed after a successful trial call")
+                self._state = CLOSED
+                self._outcomes.clear()
+            self._outcomes.append((now, True))
+            self._prune(now)
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            self._outcomes.append((now, False))
+            self._prune(now)
+            if state == HALF_OPEN:
+                self._trip(now)
+            elif state == CLOSED and len(self._outcomes) >= self.min_requests:
+                failures = sum(1 for _, ok in self._outcomes if not ok)
+                if failures / len(self._outcomes) >= self.failure_ratio:
+                    self._trip(now)
+
+    def _trip(self, now):
+        logger.warning(f"Circuit {self.name} opened for {self.open_seconds:g}s")
+        self._state = OPEN
+        self._opened_at = now
+        self.opened_count += 1
+
+    def call(self, fn, *args, is_failure=None, **kwargs):
+        """Run ``fn`` through the breaker.
+
+        ``is_failure(exc)`` decides whether an exception says something about
+        the upstream's health; by default every exception counts. A call cut
+        short by a BaseException (a gevent Timeout, GreenletExit) records no
+        outcome but gives its half-open trial slot back.
+        """
+        trial_round = self._admit()
+        if trial_round is None:
+            raise CircuitOpen(f'{self.name} circuit is open')
+        started = time.monotonic()
+        settled = False
+        try:
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                settled = True
+                if is_failure is None or is_failure(e):
+                    self.record_failure()
+                else:
+                    self.record_success()
+                raise
+            settled = True
+            self.record_success(time.monotonic() - started)
+            return result
+        finally:
+            if not settled and trial_round:
+                self._release_trial(trial_round)
+
+    def latency_percentile(self, pct, min_samples=20):
+        """Latency of successful calls at ``pct`` (0-100), or None with too few samples."""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < min_samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(pct / 100.0 * len(samples))) - 1))
+        return samples[index]
+
+    def snapshot(self):
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            self._prune(now)
+            calls = len(self._outcomes)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            retry_in = self.open_seconds - (now - self._opened_at) if state == OPEN else None
+        p50, p95 = self.latency_percentile(50, 1), self.latency_percentile(95, 1)
+        return {
+            'state': state,
+            'window_calls': calls,
+            'window_failures': failures,
+            'failure_ratio': round(failures / calls, 4) if calls else None,
+            'opened_count': self.opened_count,
+            'rejected': self.rejected,
+            'retry_in_seconds': round(retry_in, 3) if retry_in is not None else None,
+            'latency_p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+            'latency_p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+def hedged(candidates, hedge_after):
+    """Call ``candidates`` [(label, fn), ...] in order, returning (label, result) of the first success.
+
+    The next candidate starts as soon as the current one fails or has run for
+    ``hedge_after`` seconds without answering. A slow call that loses the race
+    keeps running in its daemon thread so its breaker still sees the outcome.
+    """
+    results = queue.Queue()
+
+    def run(label, fn):
+        try:
+            results.put((label, fn(), None))
+        except Exception as e:
+            results.put((label, None, e))
+
+    remaining = list(candidates)
+    running = 0
+    errors = []
+    while remaining or running:
+        if remaining and running == 0:
+            label, fn = remaining.pop(0)
+            threading.Thread(target=run, args=(label, fn), name=f'hedge-{label}', daemon=True).start()
+            running += 1
+        try:
+            label, value, error = results.get(timeout=hedge_after if remaining else None)
+        except queue.Empty:
+            # The current call is slow: hedge with the next candidate
+            label, fn = remaining.pop(0)
+            logger.info(f"Hedging with {label} after {hedge_after:.2f}s")
+            threading.Thread(target=run, args=(label, fn), name=f'hedge-{label}', daemon=True).start()
+            running += 1
+            continue
+        running -= 1
+        if error is None:
+            return label, value
+        errors.append(f'{label}: {error}')
+    raise AllUpstreamsFailed('; '.join(errors))
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(name, **overrides):
+    """The process-wide breaker for ``name``, configured from BREAKER_* variables.
+
+    ``overrides`` only apply when the breaker is first created.
+    """
+    with _breakers_lock:
+        instance = _breakers.get(name)
+        if instance is None:
+            options = {
+                'window_seconds': float(os.getenv('BREAKER_WINDOW_SECONDS', '60')),
+                'min_requests': int(os.getenv('BREAKER_MIN_REQUESTS', '5')),
+                'failure_ratio': float(os.getenv('BREAKER_FAILURE_RATIO', '0.5')),
+                'open_seconds': float(os.getenv('BREAKER_OPEN_SECONDS', '30')),
+                'half_open_max': int(os.getenv('BREAKER_HALF_OPEN_MAX', '1')),
+            }
+            options.update(overrides)
+            instance = _breakers[name] = CircuitBreaker(name, **options)
+        return instance
+
+
+def snapshot():
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {name: b.snapshot() for name, b in sorted(breakers.items())}
@@ -0,0 +1,177 @@
+"""
+Per-user expense rollups backing /api/dashboard.
+
+Rollups live in ``app_7433469c6a_expense_rollups`` (see supabase/migrations)
+keyed by user and bucket: the all-time total, each month, each category and
+each day. Triggers on the expenses table keep them current for every insert,
+edit and delete, whichever client made it, so the dashboard reads
+O(days + categories) rows instead of every expense the user ever recorded.
+Amounts are in the base currency (``amount_base``, see base_amounts.py).
+
+Maintenance commands (run from html_template/):
+    python rollups.py rebuild [--user USER_ID]   # backfill / repair
+    python rollups.py check [--user USER_ID]     # compare against a full scan
+"""
+import os
+import sys
+import argparse
+import logging
+from datetime import datetime, timedelta
+
+from base_amounts import aggregate_amount
+
+logger = logging.getLogger(__name__)
+
+EXPENSES_TABLE = 'app_7433469c6a_expenses'
+ROLLUP_TABLE = 'app_7433469c6a_expense_rollups'
+REBUILD_RPC = 'rpc/app_7433469c6a_rebuild_expense_rollups'
+TREND_DAYS = 7
+
+
+def _trend_days(today):
+    return [(today - timedelta(days=i)).isoformat() for i in range(TREND_DAYS)]
+
+
+def dashboard_from_rollups(request_fn, user_id, today):
+    """Build dashboard stats from rollup rows, or None if the user has none yet."""
+    month_key = today.isoformat()[:7]
+    days = _trend_days(today)
+    rows = request_fn(
+        'GET',
+        f"{ROLLUP_TABLE}?user_id=eq.{user_id}&select=bucket,bucket_key,amount,tx_count"
+        f"&or=(bucket.eq.total,bucket.eq.category,"
+        f"and(bucket.eq.month,bucket_key.eq.{month_key}),"
+        f"and(bucket.eq.day,bucket_key.in.({','.join(days)})))"
+    )
+    total = next((r for r in rows if r['bucket'] == 'total'), None)
+    if total is None:
+        return None
+
+    weekly_trend = {day: 0.0 for day in days}
+    stats = {
+        'total_expenses': float(total['amount']),
+        'monthly_total': 0.0,
+        'transaction_count': int(total['tx_count']),
+        'categories': {},
+        'weekly_trend': weekly_trend,
+    }
+    for row in rows:
+        bucket = row['bucket']
+        if bucket == 'category':
+            stats['categories'][row['bucket_key']] = float(row['amount'])
+        elif bucket == 'month':
+            stats['monthly_total'] = float(row['amount'])
+        elif bucket == 'day':
+            weekly_trend[row['bucket_key']] = float(row['amount'])
+    return stats
+
+
+def fetch_watermark(request_fn, user_id):
+    """Cheap per-user change marker: (updated_at, tx_count) of the total bucket, or None."""
+    rows = request_fn('GET', f'{ROLLUP_TABLE}?user_id=eq.{user_id}&bucket=eq.total&select=updated_at,tx_count')
+    if not rows:
+        return None
+    return rows[0].get('updated_at'), rows[0].get('tx_count')
+
+
+def fetch_data_version(request_fn, user_id):
+    """The watermark as one opaque stamp ('' for a user with no expenses).
+
+    The expenses-table triggers move it on every insert, edit and delete, so
+    anything derived from the user's expenses is current while it is unchanged.
+    """
+    watermark = fetch_watermark(request_fn, user_id)
+    return '' if watermark is None else f'{watermark[0]}|{watermark[1]}'
+
+
+def dashboard_from_expenses(expenses, today):
+    """Reference full-scan computation: one pass, no per-row date parsing."""
+    month_key = today.isoformat()[:7]
+    weekly_trend = {day: 0.0 for day in _trend_days(today)}
+    categories = {}
+    total = monthly_total = 0.0
+
+    for expense in expenses:
+        amount = aggregate_amount(expense)
+        day = str(expense.get('date') or '')[:10]
+        total += amount
+        if day[:7] == month_key:
+            monthly_total += amount
+        if day in weekly_trend:
+            weekly_trend[day] += amount
+        category = expense.get('category') or 'Other'
+        categories[category] = categories.get(category, 0) + amount
+
+    return {
+        'total_expenses': total,
+        'monthly_total': monthly_total,
+        'transaction_count': len(expenses),
+        'categories': categories,
+        'weekly_trend': weekly_trend,
+    }
+
+
+def rebuild(request_fn, user_id=None):
+    """Recompute rollups server-side for one user (or everyone when None)."""
+    return request_fn('POST', REBUILD_RPC, {'p_user_id': user_id})
+
+
+def check_user(request_fn, user_id, today, tolerance=0.005):
+    """Return a list of human-readable differences between rollups and a full scan."""
+    expected = dashboard_from_expenses(
+        request_fn('GET', f'{EXPENSES_TABLE}?user_id=eq.{user_id}&select=amount,amount_base,category,date'), today
+    )
+    actual = dashboard_from_rollups(request_fn, user_id, today)
+    if actual is None:
+        return [] if expected['transaction_count'] == 0 else ['no rollups recorded']
+
+    problems = []
+    for key in ('total_expenses', 'monthly_total', 'transaction_count'):
+        if abs(expected[key] - actual[key]) > tolerance:
+            problems.append(f'{key}: expected {expected[key]}, rollup has {actual[key]}')
+    for key in ('categories', 'weekly_trend'):
+        for name in set(expected[key]) | set(actual[key]):
+            want, got = expected[key].get(name, 0.0), actual[key].get(name, 0.0)
+            if abs(want - got) > tolerance:
+                problems.append(f'{key}[{name}]: expected {want}, rollup has {got}')
+    return problems
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    from supabase_client import get_client
+
+    parser = argparse.ArgumentParser(description='Maintain per-user expense rollups')
+    parser.add_argument('command', choices=['rebuild', 'check'])
+    parser.add_argument('--user', help='limit to one user id (default: all users)')
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    client = get_client(
+        os.getenv('SUPABASE_URL', 'https://pqatgaqjvyzfohdrbrtb.supabase.co'),
+        os.getenv('SUPABASE_SERVICE_KEY'),
+    )
+
+    if args.command == 'rebuild':
+        affected = rebuild(client.request, args.user)
+        logger.info(f"Rebuilt rollups for {args.user or 'all users'} ({affected} rows)")
+        return 0
+
+    if args.user:
+        users = [args.user]
+    else:
+        users = [r['user_id'] for r in client.request('GET', f'{ROLLUP_TABLE}?bucket=eq.total&select=user_id')]
+    today = datetime.now().date()
+    failed = 0
+    for user_id in users:
+        problems = check_user(client.request, user_id, today)
+        if problems:
+            failed += 1
+            logger.error(f"Rollups for {user_id} are inconsistent: " + '; '.join(problems))
+    logger.info(f"Checked {len(users)} user(s), {failed} inconsistent")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
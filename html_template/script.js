@@ -65,18 +65,49 @@ async function initializeDashboard() {
         // Load user preferences
         loadUserPreferences();
         
-        // Load expenses and update dashboard
-        await loadExpenses();
-        await loadExchangeRates();
+        // Expenses, rates and insights in one round trip; anything the batch
+        // could not serve is loaded the old way
+        let batch = {};
+        try {
+            batch = await loadDashboardBatch();
+        } catch (error) {
+            console.warn('Batched dashboard load failed, loading separately:', error);
+        }
+
+        const expensesResult = batch.expenses;
+        if (expensesResult && expensesResult.status === 200 && !expensesResult.body.next_cursor) {
+            expenses = expensesResult.body.expenses || [];
+            updateDashboardStats();
+        } else {
+            await loadExpenses();
+        }
+
+        const ratesResult = batch.rates;
+        if (ratesResult && ratesResult.status === 200 && ratesResult.body.success) {
+            exchangeRates = { ...ratesResult.body.rates };
+            exchangeRatesBase = 'INR';
+            updateCurrencyConverter();
+        } else {
+            await loadExchangeRates();
+        }
         
         // Initialize charts
         initializeCharts();
         
-        // Generate AI insights
-        await generateAIInsights();
+        // Show AI insights
+        const insightsResult = batch.insights;
+        const insightsContainer = document.getElementById('aiInsights');
+        if (insightsContainer && insightsResult && insightsResult.status === 200 && insightsResult.body.insights) {
+            renderAIInsights(insightsContainer, insightsResult.body.insights);
+        } else {
+            await generateAIInsights();
+        }
         
         // Setup event listeners
         setupEventListeners();
+
+        // Later changes arrive as deltas instead of full reloads
+        openDashboardStream();
         
         console.log('Dashboard initialized successfully');
     } catch (error) {
@@ -84,6 +115,76 @@ async function initializeDashboard() {
     }
 }
 
+// Everything a cold dashboard needs from the API, as one POST /api/batch.
+// Returns {id: {status, body}}; each item has to be checked on its own.
+async function loadDashboardBatch() {
+    const response = await fetch(`${API_BASE_URL}/api/batch`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'X-User-ID': currentUser.id },
+        body: JSON.stringify({
+            requests: [
+                { id: 'expenses', route: '/api/expenses', params: { limit: 1000 } },
+                { id: 'rates', route: '/api/rates', params: { base: 'INR' } },
+                { id: 'insights', route: '/api/ai-insights' }
+            ]
+        })
+    });
+    if (!response.ok) {
+        throw new Error(`Batch request failed with status ${response.status}`);
+    }
+    const data = await response.json();
+    const results = {};
+    data.results.forEach(item => {
+        results[item.id] = item;
+    });
+    return results;
+}
+
+// Live updates from /api/stream. EventSource reconnects by itself and resumes
+// after the last event it saw; a 'reload' event means the deltas were lost.
+let dashboardStream = null;
+
+function openDashboardStream() {
+    if (dashboardStream || !window.EventSource || !currentUser) return;
+    dashboardStream = new EventSource(`${API_BASE_URL}/api/stream?user_id=${encodeURIComponent(currentUser.id)}`);
+
+    dashboardStream.addEventListener('expenses', event => {
+        const data = JSON.parse(event.data);
+        mergeExpenses(data.expenses || []);
+        updateDashboardStats();
+        updateCharts();
+    });
+
+    dashboardStream.addEventListener('rates', event => {
+        const data = JSON.parse(event.data);
+        if (data.base === exchangeRatesBase) {
+            exchangeRates = { ...data.rates };
+            updateCurrencyConverter();
+            updateDashboardStats();
+        }
+    });
+
+    dashboardStream.addEventListener('reload', () => {
+        loadExpenses();
+    });
+}
+
+// Add or replace expenses, newest first; a row queued by the server has no id
+// yet and is matched to its stored copy by idempotency key
+function mergeExpenses(rows) {
+    rows.forEach(row => {
+        const index = expenses.findIndex(expense =>
+            (row.id != null && expense.id === row.id) ||
+            (row.idempotency_key && expense.idempotency_key === row.idempotency_key));
+        if (index >= 0) {
+            expenses[index] = row;
+        } else {
+            expenses.push(row);
+        }
+    });
+    expenses.sort((a, b) => (a.date < b.date ? 1 : a.date > b.date ? -1 : 0));
+}
+
 function setupEventListeners() {
     // Modal close functionality
     document.querySelectorAll('.close').forEach(closeBtn => {
@@ -422,32 +523,35 @@ async function generateAIInsights() {
     try {
         const expensesSummary = prepareExpensesForAI();
         const insights = await getMockAIInsights(expensesSummary);
-        
-        insightsContainer.innerHTML = `
-            <div class="insight-item">
-                <h4>💡 Spending Pattern</h4>
-                <p>${insights.spendingPattern}</p>
-            </div>
-            <div class="insight-item">
-                <h4>💰 Budget Recommendation</h4>
-                <p>${insights.budgetRecommendation}</p>
-            </div>
-            <div class="insight-item">
-                <h4>📈 Savings Tip</h4>
-                <p>${insights.savingsTip}</p>
-            </div>
-            ${insights.locationInsight ? `
-            <div class="insight-item">
-                <h4>📍 Location Insight</h4>
-                <p>${insights.locationInsight}</p>
-            </div>` : ''}
-        `;
+        renderAIInsights(insightsContainer, insights);
     } catch (error) {
         console.error('Error generating AI insights:', error);
         insightsContainer.innerHTML = '<div class="error">Failed to generate insights. Please try again.</div>';
     }
 }
 
+function renderAIInsights(insightsContainer, insights) {
+    insightsContainer.innerHTML = `
+        <div class="insight-item">
+            <h4>💡 Spending Pattern</h4>
+            <p>${insights.spendingPattern}</p>
+        </div>
+        <div class="insight-item">
+            <h4>💰 Budget Recommendation</h4>
+            <p>${insights.budgetRecommendation}</p>
+        </div>
+        <div class="insight-item">
+            <h4>📈 Savings Tip</h4>
+            <p>${insights.savingsTip}</p>
+        </div>
+        ${insights.locationInsight ? `
+        <div class="insight-item">
+            <h4>📍 Location Insight</h4>
+            <p>${insights.locationInsight}</p>
+        </div>` : ''}
+    `;
+}
+
 function prepareExpensesForAI() {
     const currentMonth = new Date().getMonth();
     const monthlyExpenses = expenses.filter(expense => {
@@ -634,16 +738,22 @@ async function handleExpenseSubmit(e) {
     };
     
     try {
-        const { error } = await supabase
-            .from('app_7433469c6a_expenses')
-            .insert([expenseData]);
-        if (!error) {
-            showMessage('Expense added successfully!', 'success');
-            closeModals();
-            await loadExpenses();
-            return;
+        // Through the API so other open dashboards hear about it on /api/stream
+        const response = await fetch(`${API_BASE_URL}/api/expenses`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'X-User-ID': userId },
+            body: JSON.stringify(expenseData)
+        });
+        if (!response.ok) {
+            throw new Error(`Failed to add expense (status ${response.status})`);
         }
-        throw error;
+        const result = await response.json();
+        showMessage('Expense added successfully!', 'success');
+        closeModals();
+        mergeExpenses(result.expense || []);
+        updateDashboardStats();
+        updateCharts();
+        return;
     } catch (error) {
         // Fallback: save locally so Quick Action works without auth
         try {
@@ -0,0 +1,246 @@
+"""
+Per-user spatial index over expense coordinates for /api/expenses/nearby.
+
+A uniform grid: every point gets a cell key (row-major over lat/lng cells),
+and the points are kept sorted by that key, so the cells of one grid row
+inside a query box are one contiguous slice found with two binary searches.
+Candidates from those slices are filtered exactly against the box or, for
+radius and nearest-k queries, by haversine distance. Cell size adapts to the
+user's spread of points so a cell holds a handful of them on average.
+
+Indexes are built from the cached expense snapshot and stamped with the
+snapshot cache's invalidation generation. Expenses created in this process
+are appended to a small unsorted buffer that is scanned alongside the grid,
+so a write does not force a rebuild; any invalidation the index did not see
+(an import, another worker's write, an edit made outside the app that moved
+the rollup watermark) does. Longitudes are not wrapped at the antimeridian.
+"""
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+# Average points per occupied cell the grid is sized for
+TARGET_PER_CELL = 16
+MIN_CELL_DEG = 0.0005
+MAX_CELL_DEG = 1.0
+# Above this many grid rows a box query scans one contiguous key range instead
+MAX_ROW_SLICES = 32
+# Appended points are merged into the grid once there are this many
+MERGE_THRESHOLD = 256
+
+
+def haversine_m(lat, lng, lats, lngs):
+    """Great-circle distance in meters from one point to arrays of points."""
+    p1, p2 = math.radians(lat), np.radians(lats)
+    dp = p2 - p1
+    dl = np.radians(lngs) - math.radians(lng)
+    a = np.sin(dp / 2) ** 2 + math.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def radius_bbox(lat, lng, radius_m):
+    """(south, west, north, east) enclosing a circle, clamped to valid coordinates."""
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    south, north = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    cos_lat = math.cos(math.radians(max(abs(south), abs(north))))
+    dlng = 180.0 if cos_lat < 1e-9 else min(180.0, dlat / cos_lat)
+    return south, max(-180.0, lng - dlng), north, min(180.0, lng + dlng)
+
+
+def _located(rows):
+    """(lat, lng, rows) for rows with valid coordinates."""
+    lat, lng, kept = [], [], []
+    for row in rows:
+        try:
+            a, b = float(row.get('latitude')), float(row.get('longitude'))
+        except (TypeError, ValueError):
+            continue
+        if -90 <= a <= 90 and -180 <= b <= 180:
+            lat.append(a)
+            lng.append(b)
+            kept.append(row)
+    return np.array(lat, dtype=np.float64), np.array(lng, dtype=np.float64), kept
+
+
+class GridIndex:
+    """Grid over one user's located expenses; ``rows`` are the snapshot dicts, newest first."""
+
+    def __init__(self, rows, generation=None):
+        self.generation = generation
+        lat, lng, kept = _located(rows)
+        # Rank orders results newest first: snapshot position, then appended rows before it
+        self._build(lat, lng, np.arange(len(kept), dtype=np.int64), kept)
+        self._pending = []  # (lat, lng, rank, row) created since the build
+        self._next_rank = -1
+
+    def _build(self, lat, lng, ranks, rows):
+        n = len(lat)
+        if n:
+            area = max(np.ptp(lat), MIN_CELL_DEG) * max(np.ptp(lng), MIN_CELL_DEG)
+            cell = math.sqrt(area * TARGET_PER_CELL / n)
+        else:
+            cell = MAX_CELL_DEG
+        self.cell_deg = min(MAX_CELL_DEG, max(MIN_CELL_DEG, cell))
+        self._cols = int(math.ceil(360.0 / self.cell_deg)) + 1
+        keys = self._keys(lat, lng)
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.lat = lat[order]
+        self.lng = lng[order]
+        self.ranks = ranks[order]
+        self.rows = [rows[i] for i in order.tolist()]
+
+    def _keys(self, lat, lng):
+        row = np.floor((np.asarray(lat) + 90.0) / self.cell_deg).astype(np.int64)
+        col = np.floor((np.asarray(lng) + 180.0) / self.cell_deg).astype(np.int64)
+        return row * self._cols + col
+
+    def __len__(self):
+        return len(self.lat) + len(self._pending)
+
+    def extended(self, rows, generation):
+        """A copy with newly created rows appended; queries running on this one are unaffected.
+
+        The appended buffer is merged into the grid once it grows past MERGE_THRESHOLD.
+        """
+        index = object.__new__(GridIndex)
+        index.__dict__.update(self.__dict__)
+        index.generation = generation
+        index._pending = list(self._pending)
+        lat, lng, kept = _located(rows)
+        for a, b, row in zip(lat.tolist(), lng.tolist(), kept):
+            index._pending.append((a, b, index._next_rank, row))
+            index._next_rank -= 1
+        if len(index._pending) >= MERGE_THRESHOLD:
+            pending = index._pending
+            index._build(
+                np.concatenate([self.lat, [p[0] for p in pending]]),
+                np.concatenate([self.lng, [p[1] for p in pending]]),
+                np.concatenate([self.ranks, np.array([p[2] for p in pending], dtype=np.int64)]),
+                self.rows + [p[3] for p in pending],
+            )
+            index._pending = []
+        return index
+
+    # -- queries --------------------------------------------------------
+    def _candidates(self, bbox):
+        """Positions in the sorted arrays whose cells intersect ``bbox``."""
+        south, west, north, east = bbox
+        r0, r1 = (int(math.floor((v + 90.0) / self.cell_deg)) for v in (south, north))
+        c0, c1 = (int(math.floor((v + 180.0) / self.cell_deg)) for v in (west, east))
+        if r1 - r0 >= MAX_ROW_SLICES:
+            lo = np.searchsorted(self.keys, r0 * self._cols + c0, side='left')
+            hi = np.searchsorted(self.keys, r1 * self._cols + c1, side='right')
+            return np.arange(lo, hi)
+        starts = np.arange(r0, r1 + 1, dtype=np.int64) * self._cols
+        lo = np.searchsorted(self.keys, starts + c0, side='left')
+        hi = np.searchsorted(self.keys, starts + c1, side='right')
+        if len(lo) == 1:
+            return np.arange(lo[0], hi[0])
+        return np.concatenate([np.arange(a, b) for a, b in zip(lo.tolist(), hi.tolist()) if b > a] or [[]]).astype(np.int64)
+
+    def _gather(self, bbox):
+        """(lat, lng, ranks, refs) of every point inside ``bbox``, grid and buffer together.
+
+        A ref is a position in the grid arrays, or ``-1 - i`` for the i-th buffered row.
+        """
+        south, west, north, east = bbox
+        pos = self._candidates(bbox)
+        lat, lng = self.lat[pos], self.lng[pos]
+        inside = (lat >= south) & (lat <= north) & (lng >= west) & (lng <= east)
+        refs = pos[inside]
+        lat, lng, ranks = lat[inside], lng[inside], self.ranks[refs]
+        extra = [i for i, p in enumerate(self._pending) if south <= p[0] <= north and west <= p[1] <= east]
+        if extra:
+            lat = np.concatenate([lat, [self._pending[i][0] for i in extra]])
+            lng = np.concatenate([lng, [self._pending[i][1] for i in extra]])
+            ranks = np.concatenate([ranks, np.array([self._pending[i][2] for i in extra], dtype=np.int64)])
+            refs = np.concatenate([refs, -1 - np.array(extra, dtype=np.int64)])
+        return lat, lng, ranks, refs
+
+    def _row(self, ref):
+        return self.rows[ref] if ref >= 0 else self._pending[-1 - ref][3]
+
+    def within_bbox(self, bbox, limit=None):
+        """(total, rows) inside ``bbox``, newest first."""
+        _, _, ranks, refs = self._gather(bbox)
+        order = np.argsort(ranks, kind='stable')[:limit]
+        return len(refs), [self._row(r) for r in refs[order].tolist()]
+
+    def within_radius(self, lat, lng, radius_m, limit=None):
+        """(total, [(distance_m, row)]) within ``radius_m`` meters, nearest first."""
+        lats, lngs, _, refs = self._gather(radius_bbox(lat, lng, radius_m))
+        distances = haversine_m(lat, lng, lats, lngs)
+        hits = np.flatnonzero(distances <= radius_m)
+        order = hits[np.argsort(distances[hits], kind='stable')][:limit]
+        return len(hits), [(float(distances[i]), self._row(refs[i])) for i in order.tolist()]
+
+    def nearest(self, lat, lng, k, max_radius_m=None):
+        """The ``k`` closest points as [(distance_m, row)], optionally no farther than ``max_radius_m``."""
+        limit = max_radius_m if max_radius_m is not None else math.pi * EARTH_RADIUS_M
+        # Grow a search circle until it holds k points; those include the k nearest
+        radius = min(limit, max(1.0, self.cell_deg * 111320.0))
+        while True:
+            total, found = self.within_radius(lat, lng, radius, limit=k)
+            if total >= k or radius >= limit:
+                return found
+            radius = min(limit, radius * 4)
+
+
+class IndexCache:
+    """Small LRU of per-user grids, each valid for one snapshot-cache generation."""
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.appends = 0
+
+    def get(self, user_id, generation, load_rows):
+        """The user's grid for ``generation``, built from ``load_rows()`` if missing or stale."""
+        with self._lock:
+            index = self._entries.get(user_id)
+            if index is not None and generation is not None and index.generation == generation:
+                self._entries.move_to_end(user_id)
+                return index
+        index = GridIndex(load_rows(), generation)
+        with self._lock:
+            self.builds += 1
+            self._entries[user_id] = index
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def add(self, user_id, rows, before, after):
+        """Append rows written by this process between generations ``before`` and ``after``.
+
+        Only an index that saw exactly ``before``, with this write the one
+        invalidation since, is extended; anything else is dropped and rebuilt.
+        """
+        with self._lock:
+            index = self._entries.get(user_id)
+            if index is None:
+                return
+            if before is None or after != before + 1 or index.generation != before:
+                del self._entries[user_id]
+                return
+            self._entries[user_id] = index.extended(rows, after)
+            self.appends += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'points': sum(len(i) for i in self._entries.values()),
+                'builds': self.builds,
+                'appends': self.appends,
+            }
@@ -0,0 +1,69 @@
+-- Per-user expense rollups maintained on the write path.
+-- One row per (user, bucket, key): the all-time total, each month (YYYY-MM),
+-- each category and each day (YYYY-MM-DD). The dashboard reads these instead
+-- of scanning app_7433469c6a_expenses.
+
+create table if not exists public.app_7433469c6a_expense_rollups (
+    user_id     text        not null,
+    bucket      text        not null check (bucket in ('total', 'month', 'category', 'day')),
+    bucket_key  text        not null,
+    amount      numeric     not null default 0,
+    tx_count    integer     not null default 0,
+    updated_at  timestamptz not null default now(),
+    primary key (user_id, bucket, bucket_key)
+);
+
+-- Add one expense (or a pre-aggregated group of them) to every bucket it touches.
+create or replace function public.app_7433469c6a_apply_expense_rollup(
+    p_user_id  text,
+    p_date     date,
+    p_category text,
+    p_amount   numeric,
+    p_count    integer default 1
+) returns void
+language sql
+as $$
+    insert into public.app_7433469c6a_expense_rollups (user_id, bucket, bucket_key, amount, tx_count)
+    values
+        (p_user_id, 'total',    'all',                        p_amount, p_count),
+        (p_user_id, 'month',    to_char(p_date, 'YYYY-MM'),   p_amount, p_count),
+        (p_user_id, 'category', coalesce(p_category, 'Other'), p_amount, p_count),
+        (p_user_id, 'day',      to_char(p_date, 'YYYY-MM-DD'), p_amount, p_count)
+    on conflict (user_id, bucket, bucket_key) do update
+        set amount     = public.app_7433469c6a_expense_rollups.amount + excluded.amount,
+            tx_count   = public.app_7433469c6a_expense_rollups.tx_count + excluded.tx_count,
+            updated_at = now();
+$$;
+
+-- Recompute rollups from the expenses table in one transaction.
+-- Pass NULL to rebuild every user (backfill after applying this migration).
+create or replace function public.app_7433469c6a_rebuild_expense_rollups(
+    p_user_id text default null
+) returns integer
+language plpgsql
+as $$
+declare
+    affected integer;
+begin
+    delete from public.app_7433469c6a_expense_rollups
+    where p_user_id is null or user_id = p_user_id;
+
+    insert into public.app_7433469c6a_expense_rollups (user_id, bucket, bucket_key, amount, tx_count)
+    select user_id, bucket, bucket_key, sum(amount), count(*)
+    from (
+        select e.user_id::text as user_id, x.bucket, x.bucket_key, e.amount
+        from public.app_7433469c6a_expenses e
+        cross join lateral (values
+            ('total',    'all'),
+            ('month',    to_char(e.date, 'YYYY-MM')),
+            ('category', coalesce(e.category, 'Other')),
+            ('day',      to_char(e.date, 'YYYY-MM-DD'))
+        ) as x(bucket, bucket_key)
+        where p_user_id is null or e.user_id::text = p_user_id
+    ) expanded
+    group by user_id, bucket, bucket_key;
+
+    get diagnostics affected = row_count;
+    return affected;
+end;
+$$;
@@ -0,0 +1,10 @@
+-- Content hash for imported expenses, so re-importing a statement is a no-op.
+-- Bulk imports insert with on_conflict=user_id,content_hash and
+-- resolution=ignore-duplicates. Rows entered one at a time leave it null,
+-- and nulls never conflict, so identical manual entries are still allowed.
+
+alter table public.app_7433469c6a_expenses
+    add column if not exists content_hash text;
+
+create unique index if not exists app_7433469c6a_expenses_user_content_hash
+    on public.app_7433469c6a_expenses (user_id, content_hash);
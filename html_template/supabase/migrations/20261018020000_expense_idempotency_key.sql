@@ -0,0 +1,10 @@
+-- Idempotency key for expenses written through the write-behind journal.
+-- A journal replayed after a crash re-sends rows that may already be stored;
+-- inserting with on_conflict=idempotency_key and resolution=ignore-duplicates
+-- makes the replay a no-op for them. Synchronous writes leave the key null.
+
+alter table public.app_7433469c6a_expenses
+    add column if not exists idempotency_key text;
+
+create unique index if not exists app_7433469c6a_expenses_idempotency_key
+    on public.app_7433469c6a_expenses (idempotency_key);
@@ -0,0 +1,67 @@
+-- Base-currency amounts recorded when an expense is written.
+-- amount_base is the amount converted into the app's base currency with the
+-- cached rate at insert time; fx_rate and fx_rate_at record which quote was
+-- used. Sums read amount_base and fall back to amount for rows without one
+-- (run `python base_amounts.py backfill` to fill existing rows).
+
+alter table public.app_7433469c6a_expenses
+    add column if not exists amount_base   numeric,
+    add column if not exists base_currency text,
+    add column if not exists fx_rate       numeric,
+    add column if not exists fx_rate_at    timestamptz;
+
+-- Bulk update used by the backfill: p_rows is a JSON array of
+-- {id, amount_base, base_currency, fx_rate, fx_rate_at}.
+create or replace function public.app_7433469c6a_set_expense_base_amounts(
+    p_rows jsonb
+) returns integer
+language plpgsql
+as $$
+declare
+    affected integer;
+begin
+    update public.app_7433469c6a_expenses e
+    set amount_base   = r.amount_base,
+        base_currency = r.base_currency,
+        fx_rate       = r.fx_rate,
+        fx_rate_at    = r.fx_rate_at
+    from jsonb_to_recordset(p_rows)
+        as r(id uuid, amount_base numeric, base_currency text, fx_rate numeric, fx_rate_at timestamptz)
+    where e.id = r.id;
+
+    get diagnostics affected = row_count;
+    return affected;
+end;
+$$;
+
+-- Rollups now sum base amounts.
+create or replace function public.app_7433469c6a_rebuild_expense_rollups(
+    p_user_id text default null
+) returns integer
+language plpgsql
+as $$
+declare
+    affected integer;
+begin
+    delete from public.app_7433469c6a_expense_rollups
+    where p_user_id is null or user_id = p_user_id;
+
+    insert into public.app_7433469c6a_expense_rollups (user_id, bucket, bucket_key, amount, tx_count)
+    select user_id, bucket, bucket_key, sum(amount), count(*)
+    from (
+        select e.user_id::text as user_id, x.bucket, x.bucket_key, coalesce(e.amount_base, e.amount) as amount
+        from public.app_7433469c6a_expenses e
+        cross join lateral (values
+            ('total',    'all'),
+            ('month',    to_char(e.date, 'YYYY-MM')),
+            ('category', coalesce(e.category, 'Other')),
+            ('day',      to_char(e.date, 'YYYY-MM-DD'))
+        ) as x(bucket, bucket_key)
+        where p_user_id is null or e.user_id::text = p_user_id
+    ) expanded
+    group by user_id, bucket, bucket_key;
+
+    get diagnostics affected = row_count;
+    return affected;
+end;
+$$;
@@ -0,0 +1,91 @@
+-- Per-user map tiles for /api/heatmap-data, maintained on the write path.
+-- One row per (user, zoom, tile, category) for zoom 0 up to the coarse
+-- maximum the app passes in (geo_tiles.COARSE_MAX_ZOOM). Tiles are Web
+-- Mercator z/x/y; the coordinate sums give each cell's centroid.
+
+create table if not exists public.app_7433469c6a_expense_geo_cells (
+    user_id     text             not null,
+    zoom        smallint         not null,
+    tile_x      integer          not null,
+    tile_y      integer          not null,
+    category    text             not null,
+    amount      numeric          not null default 0,
+    tx_count    integer          not null default 0,
+    lat_sum     double precision not null default 0,
+    lng_sum     double precision not null default 0,
+    updated_at  timestamptz      not null default now(),
+    primary key (user_id, zoom, tile_x, tile_y, category)
+);
+
+-- Add one expense (or a pre-aggregated group in one tile) to its tile at
+-- every zoom up to p_zoom. The parent of tile (x, y) is (x >> 1, y >> 1).
+create or replace function public.app_7433469c6a_apply_expense_geo(
+    p_user_id  text,
+    p_tile_x   integer,
+    p_tile_y   integer,
+    p_zoom     integer,
+    p_category text,
+    p_amount   numeric,
+    p_count    integer default 1,
+    p_lat_sum  double precision default 0,
+    p_lng_sum  double precision default 0
+) returns void
+language sql
+as $$
+    insert into public.app_7433469c6a_expense_geo_cells
+        (user_id, zoom, tile_x, tile_y, category, amount, tx_count, lat_sum, lng_sum)
+    select p_user_id, z, p_tile_x >> (p_zoom - z), p_tile_y >> (p_zoom - z),
+           coalesce(p_category, 'Other'), p_amount, p_count, p_lat_sum, p_lng_sum
+    from generate_series(0, p_zoom) as z
+    on conflict (user_id, zoom, tile_x, tile_y, category) do update
+        set amount     = public.app_7433469c6a_expense_geo_cells.amount + excluded.amount,
+            tx_count   = public.app_7433469c6a_expense_geo_cells.tx_count + excluded.tx_count,
+            lat_sum    = public.app_7433469c6a_expense_geo_cells.lat_sum + excluded.lat_sum,
+            lng_sum    = public.app_7433469c6a_expense_geo_cells.lng_sum + excluded.lng_sum,
+            updated_at = now();
+$$;
+
+-- Recompute tiles from the expenses table in one transaction, using the same
+-- projection as geo_tiles.tile_xy. Pass NULL to rebuild every user.
+create or replace function public.app_7433469c6a_rebuild_expense_geo(
+    p_user_id  text default null,
+    p_max_zoom integer default 12
+) returns integer
+language plpgsql
+as $$
+declare
+    affected integer;
+begin
+    delete from public.app_7433469c6a_expense_geo_cells
+    where p_user_id is null or user_id = p_user_id;
+
+    insert into public.app_7433469c6a_expense_geo_cells
+        (user_id, zoom, tile_x, tile_y, category, amount, tx_count, lat_sum, lng_sum)
+    select user_id, z, tile_x >> (p_max_zoom - z), tile_y >> (p_max_zoom - z), category,
+           sum(amount), count(*), sum(latitude), sum(longitude)
+    from (
+        select e.user_id::text as user_id,
+               coalesce(e.category, 'Other') as category,
+               coalesce(e.amount_base, e.amount) as amount,
+               e.latitude::double precision as latitude,
+               e.longitude::double precision as longitude,
+               least(n - 1, greatest(0, floor((e.longitude + 180.0) / 360.0 * n)))::integer as tile_x,
+               least(n - 1, greatest(0, floor(
+                   (1.0 - ln(tan(radians(lat)) + 1.0 / cos(radians(lat))) / pi()) / 2.0 * n
+               )))::integer as tile_y
+        from public.app_7433469c6a_expenses e
+        cross join lateral (select
+            (1::bigint << p_max_zoom)::double precision as n,
+            least(85.05112878, greatest(-85.05112878, e.latitude::double precision)) as lat
+        ) as m
+        where (p_user_id is null or e.user_id::text = p_user_id)
+          and e.latitude between -90 and 90
+          and e.longitude between -180 and 180
+    ) located
+    cross join generate_series(0, p_max_zoom) as z
+    group by user_id, z, tile_x >> (p_max_zoom - z), tile_y >> (p_max_zoom - z), category;
+
+    get diagnostics affected = row_count;
+    return affected;
+end;
+$$;
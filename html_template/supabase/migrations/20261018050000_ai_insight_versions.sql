@@ -0,0 +1,9 @@
+-- Precomputed insights (insight_type 'precomputed') carry the rollup watermark
+-- they were computed at, so the app can tell whether they are still current.
+-- Each user keeps only their latest precomputed row.
+
+alter table public.app_7433469c6a_ai_insights
+    add column if not exists data_version text;
+
+create index if not exists app_7433469c6a_ai_insights_latest
+    on public.app_7433469c6a_ai_insights (user_id, insight_type, created_at desc);
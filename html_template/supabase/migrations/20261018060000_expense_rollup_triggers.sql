@@ -0,0 +1,137 @@
+-- Keep rollups and map tiles in step with every write to the expenses table.
+-- The app used to add to them from its own insert paths only, so edits,
+-- deletes and inserts made straight through supabase-js (expenses.html, the
+-- sample data in script.js) left the dashboard and heatmap totals drifting.
+-- Statement-level triggers now subtract the old rows and add the new ones,
+-- aggregated per bucket, so a 1000-row insert costs one upsert per touched
+-- bucket rather than one per row. Buckets whose count drops to zero are
+-- removed. The triggers are the only writers, so the per-row apply RPCs the
+-- app used to call are dropped: replaying rows through them would now count
+-- every expense twice.
+
+drop function if exists public.app_7433469c6a_apply_expense_rollup(text, date, text, numeric, integer);
+drop function if exists public.app_7433469c6a_apply_expense_geo(
+    text, integer, integer, integer, text, numeric, integer, double precision, double precision);
+
+-- Add (p_sign 1) or remove (p_sign -1) expense rows, given as a JSON array
+-- of expenses-table records, from the rollups and the map tiles. Internal to
+-- the trigger below, so it is not exposed through the API.
+create or replace function public.app_7433469c6a_apply_expense_changes(
+    p_rows jsonb,
+    p_sign integer
+) returns void
+language plpgsql
+as $$
+begin
+    if p_rows is null or jsonb_array_length(p_rows) = 0 then
+        return;
+    end if;
+
+    -- Same buckets as rebuild_expense_rollups
+    insert into public.app_7433469c6a_expense_rollups (user_id, bucket, bucket_key, amount, tx_count)
+    select user_id, bucket, bucket_key, p_sign * sum(amount), p_sign * count(*)
+    from (
+        select r.user_id, x.bucket, x.bucket_key, coalesce(r.amount_base, r.amount) as amount
+        from jsonb_to_recordset(p_rows)
+            as r(user_id text, date date, category text, amount numeric, amount_base numeric)
+        cross join lateral (values
+            ('total',    'all'),
+            ('month',    to_char(r.date, 'YYYY-MM')),
+            ('category', coalesce(r.category, 'Other')),
+            ('day',      to_char(r.date, 'YYYY-MM-DD'))
+        ) as x(bucket, bucket_key)
+    ) expanded
+    group by user_id, bucket, bucket_key
+    on conflict (user_id, bucket, bucket_key) do update
+        set amount     = public.app_7433469c6a_expense_rollups.amount + excluded.amount,
+            tx_count   = public.app_7433469c6a_expense_rollups.tx_count + excluded.tx_count,
+            updated_at = now();
+
+    -- Same projection as rebuild_expense_geo, at geo_tiles.COARSE_MAX_ZOOM (12)
+    insert into public.app_7433469c6a_expense_geo_cells
+        (user_id, zoom, tile_x, tile_y, category, amount, tx_count, lat_sum, lng_sum)
+    select user_id, z, tile_x >> (12 - z), tile_y >> (12 - z), category,
+           p_sign * sum(amount), p_sign * count(*), p_sign * sum(latitude), p_sign * sum(longitude)
+    from (
+        select r.user_id,
+               coalesce(r.category, 'Other') as category,
+               coalesce(r.amount_base, r.amount) as amount,
+               r.latitude,
+               r.longitude,
+               least(n - 1, greatest(0, floor((r.longitude + 180.0) / 360.0 * n)))::integer as tile_x,
+               least(n - 1, greatest(0, floor(
+                   (1.0 - ln(tan(radians(lat)) + 1.0 / cos(radians(lat))) / pi()) / 2.0 * n
+               )))::integer as tile_y
+        from jsonb_to_recordset(p_rows)
+            as r(user_id text, category text, amount numeric, amount_base numeric,
+                 latitude double precision, longitude double precision)
+        cross join lateral (select
+            (1::bigint << 12)::double precision as n,
+            least(85.05112878, greatest(-85.05112878, r.latitude)) as lat
+        ) as m
+        where r.latitude between -90 and 90
+          and r.longitude between -180 and 180
+    ) located
+    cross join generate_series(0, 12) as z
+    group by user_id, z, tile_x >> (12 - z), tile_y >> (12 - z), category
+    on conflict (user_id, zoom, tile_x, tile_y, category) do update
+        set amount     = public.app_7433469c6a_expense_geo_cells.amount + excluded.amount,
+            tx_count   = public.app_7433469c6a_expense_geo_cells.tx_count + excluded.tx_count,
+            lat_sum    = public.app_7433469c6a_expense_geo_cells.lat_sum + excluded.lat_sum,
+            lng_sum    = public.app_7433469c6a_expense_geo_cells.lng_sum + excluded.lng_sum,
+            updated_at = now();
+
+    if p_sign < 0 then
+        delete from public.app_7433469c6a_expense_rollups
+        where user_id in (select distinct r.user_id from jsonb_to_recordset(p_rows) as r(user_id text))
+          and tx_count <= 0;
+        delete from public.app_7433469c6a_expense_geo_cells
+        where user_id in (select distinct r.user_id from jsonb_to_recordset(p_rows) as r(user_id text))
+          and tx_count <= 0;
+    end if;
+end;
+$$;
+
+create or replace function public.app_7433469c6a_sync_expense_rollups()
+returns trigger
+language plpgsql
+as $$
+begin
+    -- Transition tables only exist for the operations that have them; plpgsql
+    -- plans each statement when it first runs, so the other branch is never planned
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform public.app_7433469c6a_apply_expense_changes(
+            (select jsonb_agg(to_jsonb(o)) from old_rows o), -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform public.app_7433469c6a_apply_expense_changes(
+            (select jsonb_agg(to_jsonb(n)) from new_rows n), 1);
+    end if;
+    return null;
+end;
+$$;
+
+revoke execute on function public.app_7433469c6a_apply_expense_changes(jsonb, integer)
+    from public, anon, authenticated;
+
+drop trigger if exists app_7433469c6a_expenses_rollups_insert on public.app_7433469c6a_expenses;
+create trigger app_7433469c6a_expenses_rollups_insert
+    after insert on public.app_7433469c6a_expenses
+    referencing new table as new_rows
+    for each statement execute function public.app_7433469c6a_sync_expense_rollups();
+
+drop trigger if exists app_7433469c6a_expenses_rollups_update on public.app_7433469c6a_expenses;
+create trigger app_7433469c6a_expenses_rollups_update
+    after update on public.app_7433469c6a_expenses
+    referencing old table as old_rows new table as new_rows
+    for each statement execute function public.app_7433469c6a_sync_expense_rollups();
+
+drop trigger if exists app_7433469c6a_expenses_rollups_delete on public.app_7433469c6a_expenses;
+create trigger app_7433469c6a_expenses_rollups_delete
+    after delete on public.app_7433469c6a_expenses
+    referencing old table as old_rows
+    for each statement execute function public.app_7433469c6a_sync_expense_rollups();
+
+-- Start from a consistent state: whatever drifted before the triggers existed is recomputed
+select public.app_7433469c6a_rebuild_expense_rollups(null);
+select public.app_7433469c6a_rebuild_expense_geo(null, 12);
@@ -0,0 +1,36 @@
+-- The user's latest stored insight of one type together with their current
+-- data version, so /api/ai-insights decides whether it is still fresh in one
+-- round trip. current_version is the rollup watermark in the form the app
+-- stamps insights with (rollups.fetch_data_version): the total bucket's
+-- updated_at as PostgREST renders it, '|', tx_count; '' without expenses.
+-- Returns one row even when nothing is stored (insight columns NULL).
+
+create or replace function public.app_7433469c6a_latest_insight(
+    p_user_id      text,
+    p_insight_type text default 'precomputed'
+) returns table (
+    id              uuid,
+    insight_text    text,
+    data_version    text,
+    created_at      timestamptz,
+    current_version text
+)
+language sql
+stable
+as $$
+    select i.id, i.insight_text, i.data_version, i.created_at,
+           coalesce((
+               select (to_jsonb(r.updated_at) #>> '{}') || '|' || r.tx_count
+               from public.app_7433469c6a_expense_rollups r
+               where r.user_id = p_user_id and r.bucket = 'total' and r.bucket_key = 'all'
+           ), '') as current_version
+    from (select 1) as one
+    left join lateral (
+        select a.id, a.insight_text, a.data_version, a.created_at
+        from public.app_7433469c6a_ai_insights a
+        where a.user_id = p_user_id::uuid
+          and a.insight_type = p_insight_type
+        order by a.created_at desc
+        limit 1
+    ) as i on true;
+$$;
@@ -0,0 +1,127 @@
+"""
+Pooled, keep-alive HTTP client for the Supabase PostgREST API.
+
+One client is kept per worker process. It reuses TCP/TLS connections through a
+bounded urllib3 pool, builds the auth headers once, applies connect/read
+timeouts to every call and retries idempotent verbs with jittered backoff.
+"""
+import os
+import random
+import time
+import logging
+from threading import Lock
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Verbs that are safe to replay when the upstream fails mid-request
+_IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'})
+# Gateway-style statuses that usually mean "try again shortly"
+_RETRY_STATUSES = frozenset({502, 503, 504})
+
+
+class SupabaseClient:
+    """Thin PostgREST client over a shared ``requests.Session``."""
+
+    def __init__(self, base_url, service_key, pool_size=10, connect_timeout=3.05,
+                 read_timeout=10.0, max_retries=2, backoff_seconds=0.2, backoff_max=2.0):
+        self.rest_url = f"{base_url.rstrip('/')}/rest/v1"
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max = backoff_max
+        # Built once and reused for every call
+        self.headers = {
+            'apikey': service_key or '',
+            'Authorization': f'Bearer {service_key or ""}',
+            'Content-Type': 'application/json',
+            'Connection': 'keep-alive',
+        }
+        self.session = requests.Session()
+        # Retries are handled here so they can be limited to idempotent verbs
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0, pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @classmethod
+    def from_env(cls, base_url, service_key):
+        return cls(
+            base_url,
+            service_key,
+            pool_size=int(os.getenv('SUPABASE_POOL_SIZE', '10')),
+            connect_timeout=float(os.getenv('SUPABASE_CONNECT_TIMEOUT', '3.05')),
+            read_timeout=float(os.getenv('SUPABASE_READ_TIMEOUT', '10')),
+            max_retries=int(os.getenv('SUPABASE_MAX_RETRIES', '2')),
+            backoff_seconds=float(os.getenv('SUPABASE_BACKOFF_SECONDS', '0.2')),
+        )
+
+    def _backoff(self, attempt):
+        # Full jitter: spreads retries from many workers instead of syncing them up
+        time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_seconds * (2 ** attempt))))
+
+    def send(self, method, endpoint, data=None, headers=None, timeout=None, stream=False):
+        """Issue a request and return the raw ``requests.Response``."""
+        method = method.upper()
+        url = f"{self.rest_url}/{endpoint}"
+        request_headers = {**self.headers, **headers} if headers else self.headers
+        replayable = method in _IDEMPOTENT_METHODS
+
+        for attempt in range(self.max_retries + 1):
+            can_retry = attempt < self.max_retries
+            try:
+                response = self.session.request(
+                    method, url,
+                    json=data,
+                    headers=request_headers,
+                    timeout=timeout or self.timeout,
+                    stream=stream,
+                )
+            except requests.exceptions.ConnectTimeout:
+                # Nothing reached the server, so even POST is safe to resend
+                if not can_retry:
+                    raise
+                logger.warning(f"Supabase connect timeout on {method} {endpoint}, retrying")
+                self._backoff(attempt)
+                continue
+            except (requests.exceptions.ConnectionError, requests.exceptions.ReadTimeout) as e:
+                if not (can_retry and replayable):
+                    raise
+                logger.warning(f"Supabase {method} {endpoint} failed ({e}), retrying")
+                self._backoff(attempt)
+                continue
+
+            if response.status_code in _RETRY_STATUSES and can_retry and replayable:
+                logger.warning(f"Supabase {method} {endpoint} returned {response.status_code}, retrying")
+                response.close()
+                self._backoff(attempt)
+                continue
+            response.raise_for_status()
+            return response
+
+    def request(self, method, endpoint, data=None, headers=None, timeout=None):
+        """Issue a request and return the decoded JSON body ({} when empty)."""
+        response = self.send(method, endpoint, data=data, headers=headers, timeout=timeout)
+        return response.json() if response.content else {}
+
+    def close(self):
+        self.session.close()
+
+
+_clients = {}
+_clients_lock = Lock()
+
+
+def get_client(base_url, service_key):
+    """Return the client for this worker process, creating it on first use."""
+    # Keyed by pid so a client created before a fork is never shared with children
+    key = (os.getpid(), base_url, service_key)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = SupabaseClient.from_env(base_url, service_key)
+                _clients[key] = client
+    return client
@@ -0,0 +1,116 @@
+"""
+Shared fixtures: the app wired to the in-process PostgREST and rate-provider
+stand-ins from benchmarks/, so no test touches the network or the shared
+files under /tmp.
+
+The stand-ins have no triggers; tests that need the rollup watermark to move
+after a write call the ``move_watermark`` fixture, which does what the
+expenses-table triggers do to the total bucket.
+"""
+import os
+
+import pytest
+
+import expense_cache
+import spatial_index
+from benchmarks.fake_upstreams import parse_overrides, serve
+
+EXPENSES_TABLE = 'app_7433469c6a_expenses'
+ROLLUP_TABLE = 'app_7433469c6a_expense_rollups'
+INSIGHTS_TABLE = 'app_7433469c6a_ai_insights'
+
+
+@pytest.fixture(scope='session')
+def upstreams(tmp_path_factory):
+    services, urls = serve([], parse_overrides(None, 0.0, 0.0))
+    workdir = str(tmp_path_factory.mktemp('aureus'))
+    # app.py reads its configuration at import time, so this must come first
+    os.environ.update(
+        SUPABASE_URL=urls['postgrest'],
+        SUPABASE_SERVICE_KEY='test',
+        EXCHANGE_API_KEY='test',
+        RATES_PRIMARY_URL=urls['rates_primary'],
+        RATES_FALLBACK_URL=urls['rates_fallback'],
+        RATE_HISTORY_URL=urls['rates_primary'],
+        NOMINATIM_URL=urls['geocoder'],
+        EXPENSE_CACHE_BACKEND='memory',
+        RATE_STORE_PATH=os.path.join(workdir, 'rates.json'),
+        RATE_HISTORY_PATH=os.path.join(workdir, 'rate-history.npz'),
+        EXPENSE_CACHE_PATH=os.path.join(workdir, 'expenses.sqlite3'),
+        GEOCODE_CACHE_PATH=os.path.join(workdir, 'geocode.sqlite3'),
+        GEOCODE_SLOT_PATH=os.path.join(workdir, 'geocode.slot'),
+        WRITE_BEHIND_DIR=os.path.join(workdir, 'write-behind'),
+        METRICS_DIR=os.path.join(workdir, 'metrics'),
+        HEALTH_STATE_PATH=os.path.join(workdir, 'health.json'),
+        EVENT_LOG_PATH=os.path.join(workdir, 'events.sqlite3'),
+    )
+    yield services
+    for service in services.values():
+        service.stop()
+
+
+@pytest.fixture(scope='session')
+def app_module(upstreams):
+    import app
+    return app
+
+
+@pytest.fixture
+def postgrest(upstreams):
+    """The PostgREST stand-in, emptied for each test."""
+    fake = upstreams['postgrest']
+    with fake._lock:
+        fake.tables.clear()
+        fake._by_user.clear()
+        fake._ids.clear()
+    return fake
+
+
+@pytest.fixture
+def request_fn(app_module, postgrest):
+    """``supabase_request`` against the stand-in."""
+    return app_module.supabase_request
+
+
+@pytest.fixture
+def client(app_module, postgrest, monkeypatch):
+    """A test client with empty per-test caches."""
+    monkeypatch.setattr(app_module, '_expense_cache', expense_cache.ExpenseCache(expense_cache.MemoryBackend(1 << 26)))
+    monkeypatch.setattr(app_module, '_spatial_indexes', spatial_index.IndexCache())
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def move_watermark(postgrest):
+    """Recompute a user's total rollup bucket the way the expenses-table triggers would."""
+    def move(user_id):
+        with postgrest._lock:
+            expenses = postgrest._by_user.get(EXPENSES_TABLE, {}).get(user_id, [])
+            amount, count = sum(float(e['amount']) for e in expenses), len(expenses)
+            rows = postgrest.tables.setdefault(ROLLUP_TABLE, [])
+            total = next((r for r in rows if r['user_id'] == user_id and r['bucket'] == 'total'), None)
+            if total is not None:
+                total.update(amount=amount, tx_count=count, updated_at=f"t{int(total['updated_at'][1:]) + 1}")
+                return
+        postgrest.insert(ROLLUP_TABLE, [{
+            'user_id': user_id, 'bucket': 'total', 'bucket_key': 'all',
+            'amount': amount, 'tx_count': count, 'updated_at': 't1',
+        }])
+    return move
+
+
+def add_expenses(postgrest, user_id, count, start_day=1, **fields):
+    """Insert ``count`` expenses on consecutive January 2025 days; returns them."""
+    rows = [
+        {
+            'user_id': user_id,
+            'title': f'expense {i}',
+            'amount': float(i),
+            'category': 'Food',
+            'date': f'2025-01-{start_day + i:02d}',
+            'currency': 'INR',
+            **fields,
+        }
+        for i in range(count)
+    ]
+    return postgrest.insert(EXPENSES_TABLE, rows)
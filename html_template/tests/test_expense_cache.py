@@ -0,0 +1,82 @@
+import pytest
+
+import expense_cache
+from conftest import add_expenses
+
+HEADERS = {'X-User-ID': 'u1'}
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def cache(request, tmp_path):
+    if request.param == 'memory':
+        backend = expense_cache.MemoryBackend(1 << 20)
+    else:
+        backend = expense_cache.SQLiteBackend(str(tmp_path / 'cache.sqlite3'), 1 << 20)
+    return expense_cache.ExpenseCache(backend)
+
+
+def test_fill_records_data_version(cache):
+    snapshot = cache.fill('u1', lambda: [{'id': 1}], 'v1')
+
+    assert snapshot['data_version'] == 'v1'
+    assert cache.peek('u1', 'v1')['expenses'] == [{'id': 1}]
+    assert cache.peek('u1')['version'] == snapshot['version']
+
+
+def test_outdated_snapshot_is_dropped(cache):
+    cache.fill('u1', lambda: [{'id': 1}], 'v1')
+    generation = cache.generation('u1')
+
+    assert cache.peek('u1', 'v2') is None
+    assert cache.generation('u1') != generation
+    assert cache.peek('u1') is None
+    assert cache.stats()['outdated'] == 1
+
+
+def test_get_reloads_at_new_version(cache):
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return [{'id': len(loads)}]
+
+    assert cache.get('u1', loader, 'v1')['expenses'] == [{'id': 1}]
+    assert cache.get('u1', loader, 'v1')['expenses'] == [{'id': 1}]
+    assert cache.get('u1', loader, 'v2')['expenses'] == [{'id': 2}]
+    assert len(loads) == 2
+
+
+def test_put_skipped_after_invalidation(cache):
+    cache.fill('u1', lambda: [], 'v1')
+    generation = cache.generation('u1')
+    cache.invalidate('u1')
+
+    cache.put('u1', {'expenses': [{'id': 1}], 'version': 'x', 'data_version': 'v1'}, generation)
+
+    assert cache.peek('u1') is None
+
+
+def test_dashboard_sees_writes_from_other_clients(client, app_module, postgrest, move_watermark):
+    add_expenses(postgrest, 'u1', 3)
+    move_watermark('u1')
+    # Analytics leaves a full snapshot in the cache, which the dashboard then serves from
+    assert client.get('/api/analytics?from=2025-01-01&to=2025-01-31', headers=HEADERS).get_json()['count'] == 3
+    assert client.get('/api/dashboard', headers=HEADERS).get_json()['transaction_count'] == 3
+
+    # supabase-js writes straight to the table; only the triggers notice
+    add_expenses(postgrest, 'u1', 2, start_day=10)
+    move_watermark('u1')
+
+    assert client.get('/api/dashboard', headers=HEADERS).get_json()['transaction_count'] == 5
+    assert client.get('/api/analytics?from=2025-01-01&to=2025-01-31', headers=HEADERS).get_json()['count'] == 5
+    assert app_module._expense_cache.stats()['outdated'] == 1
+
+
+def test_snapshot_reused_while_watermark_holds(client, app_module, postgrest, move_watermark):
+    add_expenses(postgrest, 'u1', 3)
+    move_watermark('u1')
+    client.get('/api/analytics?from=2025-01-01&to=2025-01-31', headers=HEADERS)
+
+    before = postgrest.request_count
+    assert client.get('/api/analytics?from=2025-01-01&to=2025-01-31', headers=HEADERS).get_json()['count'] == 3
+    assert postgrest.request_count - before == 1  # the watermark read only
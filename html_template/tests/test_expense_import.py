@@ -0,0 +1,148 @@
+import io
+
+import pytest
+
+import expense_import
+from conftest import EXPENSES_TABLE
+
+HEADERS = {'X-User-ID': 'u1'}
+VALID = {'title': 'Lunch', 'amount': 12.5, 'category': 'Food', 'date': '2025-01-02', 'currency': 'INR'}
+
+
+def csv_stream(text):
+    return io.BytesIO(text.encode('utf-8'))
+
+
+def stored(postgrest):
+    return postgrest.query(EXPENSES_TABLE, [('user_id', 'eq.u1')])
+
+
+def test_normalize_row_parses_statement_formats():
+    row = expense_import.normalize_row(
+        {'date': '02/01/2025', 'amount': '(1,234.50)', 'title': '  Rent ', 'currency': 'eur'},
+        'u1', amount_sign='negative',
+    )
+    assert row['date'] == '2025-01-02'
+    assert row['amount'] == 1234.5
+    assert row['title'] == 'Rent'
+    assert row['category'] == 'Other'
+    assert row['currency'] == 'EUR'
+    assert row['content_hash'] == expense_import.content_hash('2025-01-02', 1234.5, 'rent')
+
+
+@pytest.mark.parametrize('sign, amount, expected', [
+    ('positive', '40', 40.0),
+    ('negative', '-40', 40.0),
+])
+def test_signed_amounts(sign, amount, expected):
+    row = expense_import.normalize_row({'date': '2025-01-02', 'amount': amount, 'title': 'x'}, 'u1', amount_sign=sign)
+    assert row['amount'] == expected
+
+
+@pytest.mark.parametrize('sign, amount', [('positive', '-40'), ('negative', '40')])
+def test_credits_are_not_expenses(sign, amount):
+    with pytest.raises(expense_import.NotAnExpense):
+        expense_import.normalize_row({'date': '2025-01-02', 'amount': amount, 'title': 'x'}, 'u1', amount_sign=sign)
+
+
+def test_debit_and_credit_columns():
+    rows = list(expense_import.iter_csv_rows(csv_stream(
+        'Txn Date,Narration,Amount,Credit\n'
+        '2025-01-02,Coffee,-3.50,\n'
+        '2025-01-03,Salary,,5000\n'
+        '\n'
+    )))
+    assert rows == [
+        {'date': '2025-01-02', 'title': 'Coffee', 'debit': '-3.50', 'credit': ''},
+        {'date': '2025-01-03', 'title': 'Salary', 'debit': '', 'credit': '5000'},
+    ]
+    assert expense_import.normalize_row(rows[0], 'u1')['amount'] == 3.5
+    with pytest.raises(expense_import.NotAnExpense):
+        expense_import.normalize_row(rows[1], 'u1')
+
+
+def test_csv_without_amount_column_is_rejected():
+    with pytest.raises(ValueError):
+        expense_import.iter_csv_rows(csv_stream('Date,Description\n2025-01-02,Coffee\n'))
+
+
+@pytest.mark.parametrize('change, problem', [
+    ({'title': ' '}, 'title is required'),
+    ({'category': None}, 'category is required'),
+    ({'amount': 'lots'}, 'amount must be a number'),
+    ({'amount': float('nan')}, 'amount must be a number'),
+    ({'amount': 1e8}, 'amount is too large'),
+    ({'date': '2025-02-30'}, 'date must be a YYYY-MM-DD date'),
+    ({'latitude': 95}, 'latitude must be a number between -90 and 90'),
+    ({'longitude': '-190'}, 'longitude must be a number between -180 and 180'),
+    ({'currency': 'EURO'}, 'currency must be a 3-letter code'),
+    ({'currency': 'E1R'}, 'currency must be a 3-letter code'),
+])
+def test_expense_problem(change, problem):
+    assert expense_import.expense_problem(VALID) is None
+    assert expense_import.expense_problem({**VALID, **change}) == problem
+
+
+def test_ingest_counts_and_dedupes(postgrest, request_fn):
+    rows = [
+        {'date': '2025-01-02', 'amount': '-12', 'title': 'Lunch'},
+        {'date': '2025-01-02', 'amount': '-12', 'title': 'LUNCH '},  # same hash
+        {'date': '2025-01-03', 'amount': '500', 'title': 'Refund'},
+        {'date': '2025-01-04', 'amount': '-123,456,789.00', 'title': 'Typo'},
+        {'date': 'someday', 'amount': '-5', 'title': 'Bus'},
+        {'date': '2025-01-05', 'amount': '-7', 'title': 'Bus'},
+    ]
+
+    result = expense_import.ingest(request_fn, 'u1', rows, batch_size=2, amount_sign='auto')
+
+    assert result.as_dict() | {'errors': None} == {
+        'received': 6, 'inserted': 2, 'duplicates': 1, 'invalid': 2, 'skipped': 1, 'failed': 0,
+        'errors': None, 'errors_truncated': False, 'aborted': None,
+    }
+    assert [e['row'] for e in result.errors] == [3, 4, 5]
+    assert sorted(r['title'] for r in stored(postgrest)) == ['Bus', 'Lunch']
+
+    again = expense_import.ingest(request_fn, 'u1', rows, batch_size=2, amount_sign='auto')
+    assert again.inserted == 0 and again.duplicates == 3
+
+
+@pytest.fixture
+def import_client(client, app_module, monkeypatch):
+    # Imports queue an insight job; keep its worker threads out of later tests' data
+    monkeypatch.setattr(app_module._insight_jobs, 'schedule', lambda user_id: None)
+    return client
+
+
+def test_bulk_reports_rejected_rows(import_client, postgrest):
+    response = import_client.post('/api/expenses/bulk', headers=HEADERS, json=[
+        {**VALID, 'amount': 12.5},
+        {**VALID, 'title': 'Dinner', 'latitude': 95},
+        {**VALID, 'title': 'Taxi', 'currency': 'EURO'},
+    ])
+
+    body = response.get_json()
+    assert response.status_code == 201
+    assert body['success'] is False
+    assert (body['inserted'], body['invalid']) == (1, 2)
+    assert [e['row'] for e in body['errors']] == [2, 3]
+    assert [r['title'] for r in stored(postgrest)] == ['Lunch']
+
+
+def test_import_csv_upload(import_client, postgrest):
+    response = import_client.post(
+        '/api/expenses/import?currency=inr', headers={**HEADERS, 'Content-Type': 'text/csv'},
+        data='Date,Description,Amount\n2025-01-02,Coffee,-3.50\n2025-01-03,Salary,5000\n2025-01-04,Tea,-2\n',
+    )
+
+    body = response.get_json()
+    assert response.status_code == 201
+    assert body['success'] is True
+    assert (body['inserted'], body['skipped']) == (2, 1)
+    assert {r['currency'] for r in stored(postgrest)} == {'INR'}
+
+
+@pytest.mark.parametrize('query', ['currency=EURO', 'currency=E1', 'amount_sign=sideways'])
+def test_import_rejects_bad_options(import_client, query):
+    response = import_client.post(f'/api/expenses/import?{query}', headers={**HEADERS, 'Content-Type': 'text/csv'},
+                                  data='Date,Amount\n2025-01-02,3\n')
+    assert response.status_code == 400
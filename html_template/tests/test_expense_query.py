@@ -0,0 +1,118 @@
+import pytest
+
+import expense_query
+from conftest import add_expenses
+
+HEADERS = {'X-User-ID': 'u1'}
+
+
+def keyset_sorted(rows):
+    dated = sorted((r for r in rows if r['date'] is not None), key=lambda r: (r['date'], r['id']), reverse=True)
+    undated = sorted((r for r in rows if r['date'] is None), key=lambda r: r['id'], reverse=True)
+    return dated + undated
+
+
+def seed(postgrest):
+    """Same-day ties, several days and a couple of undated rows."""
+    rows = add_expenses(postgrest, 'u1', 4)
+    rows += add_expenses(postgrest, 'u1', 3, start_day=2)
+    rows += add_expenses(postgrest, 'u1', 2, date=None)
+    add_expenses(postgrest, 'u2', 3)
+    return keyset_sorted(rows)
+
+
+def test_cursor_round_trip():
+    for after in (('2025-01-02', 17), (None, 3)):
+        cursor = expense_query.encode_cursor(after)
+        assert '=' not in cursor
+        assert expense_query.decode_cursor(cursor) == after
+
+
+@pytest.mark.parametrize('cursor', ['not a cursor', 'e30', '!!!'])
+def test_malformed_cursor(cursor):
+    with pytest.raises(expense_query.InvalidCursor):
+        expense_query.decode_cursor(cursor)
+
+
+def test_keyset_filter():
+    assert expense_query.keyset_filter(None) is None
+    assert expense_query.keyset_filter(('2025-01-02', 7)) == (
+        'or=(date.lt.2025-01-02,and(date.eq.2025-01-02,id.lt.7),date.is.null)'
+    )
+    assert expense_query.keyset_filter((None, 7)) == 'and=(date.is.null,id.lt.7)'
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 9, 20])
+def test_pages_cover_history_in_keyset_order(postgrest, request_fn, limit):
+    expected = seed(postgrest)
+
+    pages = list(expense_query.iter_pages(request_fn, 'u1', limit))
+
+    assert all(len(page) <= limit for page in pages)
+    assert [r['id'] for page in pages for r in page] == [r['id'] for r in expected]
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 9, 20])
+def test_page_from_rows_matches_fetch_page(postgrest, request_fn, limit):
+    rows = seed(postgrest)
+    after = None
+    while True:
+        fetched, fetched_after = expense_query.fetch_page(request_fn, 'u1', limit, after, select='id,date')
+        sliced, sliced_after = expense_query.page_from_rows(rows, limit, after, select='id,date')
+        assert sliced == fetched
+        # fetch_page cannot tell a full last page from a partial one; the snapshot can
+        if sliced_after is None:
+            break
+        assert sliced_after == fetched_after
+        after = sliced_after
+
+
+def test_api_pages_through_next_cursor(client, postgrest):
+    expected = seed(postgrest)
+    seen, cursor = [], None
+    while True:
+        query = '/api/expenses?limit=2&fields=title' + (f'&after={cursor}' if cursor else '')
+        body = client.get(query, headers=HEADERS).get_json()
+        assert set(body['expenses'][0]) == {'id', 'date', 'title'}
+        seen += [r['id'] for r in body['expenses']]
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+    assert seen == [r['id'] for r in expected]
+
+
+def test_api_rejects_bad_cursor_and_fields(client):
+    assert client.get('/api/expenses?after=!!!', headers=HEADERS).status_code == 400
+    assert client.get('/api/expenses?fields=password', headers=HEADERS).status_code == 400
+    assert client.get('/api/expenses?limit=ten', headers=HEADERS).status_code == 400
+
+
+def test_etag_revalidates_without_reading_a_page(client, postgrest, move_watermark):
+    add_expenses(postgrest, 'u1', 3)
+    move_watermark('u1')
+    first = client.get('/api/expenses', headers=HEADERS)
+    assert first.status_code == 200 and first.headers['ETag']
+
+    before = postgrest.request_count
+    cached = client.get('/api/expenses', headers={**HEADERS, 'If-None-Match': first.headers['ETag']})
+    assert cached.status_code == 304
+    assert cached.headers['ETag'] == first.headers['ETag']
+    assert postgrest.request_count - before == 1  # the watermark read only
+
+    other_query = client.get('/api/expenses?limit=2', headers={**HEADERS, 'If-None-Match': first.headers['ETag']})
+    assert other_query.status_code == 200
+
+
+def test_etag_changes_when_watermark_moves(client, postgrest, move_watermark):
+    add_expenses(postgrest, 'u1', 3)
+    move_watermark('u1')
+    etag = client.get('/api/expenses', headers=HEADERS).headers['ETag']
+
+    # A write from another client: the triggers move the watermark
+    add_expenses(postgrest, 'u1', 1, start_day=20)
+    move_watermark('u1')
+    response = client.get('/api/expenses', headers={**HEADERS, 'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()['count'] == 4
@@ -0,0 +1,71 @@
+import csv
+import io
+
+import pytest
+
+from conftest import EXPENSES_TABLE, add_expenses
+
+HEADERS = {'X-User-ID': 'u1'}
+
+
+def csv_rows(text):
+    return list(csv.reader(io.StringIO(text)))
+
+
+@pytest.mark.parametrize('query', ['from=2025-13-01', 'to=yesterday', 'from=2025-01-01&to=01/31/2025'])
+def test_bad_dates_are_rejected_up_front(client, query):
+    for fmt in ('csv', 'json'):
+        response = client.get(f'/api/csv-export?format={fmt}&{query}', headers=HEADERS)
+        assert response.status_code == 400
+        assert 'YYYY-MM-DD' in response.get_json()['error']
+
+
+def test_streamed_export_pages_through_everything(client, app_module, postgrest, monkeypatch):
+    monkeypatch.setattr(app_module, '_EXPORT_PAGE_SIZE', 2)
+    add_expenses(postgrest, 'u1', 5)
+    add_expenses(postgrest, 'u2', 3)
+
+    response = client.get('/api/csv-export?format=csv', headers=HEADERS)
+
+    assert response.status_code == 200
+    rows = csv_rows(response.get_data(as_text=True))
+    assert rows[0] == app_module._CSV_HEADERS
+    assert sorted(r[1] for r in rows[1:]) == [f'expense {i}' for i in range(5)]
+
+
+def test_export_filters_by_date_and_category(client, app_module, postgrest, monkeypatch):
+    monkeypatch.setattr(app_module, '_EXPORT_PAGE_SIZE', 2)
+    add_expenses(postgrest, 'u1', 6)
+    add_expenses(postgrest, 'u1', 2, start_day=3, category='Travel')
+
+    response = client.get('/api/csv-export?format=csv&from=2025-01-02&to=2025-01-04&category=Food', headers=HEADERS)
+
+    rows = csv_rows(response.get_data(as_text=True))[1:]
+    assert sorted(r[0] for r in rows) == ['2025-01-02', '2025-01-03', '2025-01-04']
+    assert {r[3] for r in rows} == {'Food'}
+
+
+def test_failed_stream_ends_with_marker_row(client, app_module, postgrest, monkeypatch):
+    monkeypatch.setattr(app_module, '_EXPORT_PAGE_SIZE', 2)
+    add_expenses(postgrest, 'u1', 5)
+    request = app_module.supabase_request
+    pages = []
+
+    def flaky(method, endpoint, *args, **kwargs):
+        if endpoint.startswith(EXPENSES_TABLE):
+            pages.append(endpoint)
+            if len(pages) == 2:
+                raise ConnectionError('upstream went away')
+        return request(method, endpoint, *args, **kwargs)
+
+    monkeypatch.setattr(app_module, 'supabase_request', flaky)
+    response = client.get('/api/csv-export?format=csv', headers=HEADERS, buffered=False)
+    assert response.status_code == 200
+
+    chunks = []
+    with pytest.raises(ConnectionError):
+        for chunk in response.response:
+            chunks.append(chunk.decode() if isinstance(chunk, bytes) else chunk)
+    rows = csv_rows(''.join(chunks))
+    assert len(rows) == 1 + 2 + 1
+    assert rows[-1] == app_module._CSV_INCOMPLETE_ROW
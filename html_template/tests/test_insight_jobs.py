@@ -0,0 +1,117 @@
+import time
+
+import pytest
+
+import insight_jobs
+from conftest import add_expenses
+
+HEADERS = {'X-User-ID': 'u1'}
+
+
+class Counted:
+    """A request function that counts its calls and can be made to fail."""
+
+    def __init__(self, request_fn):
+        self.request_fn = request_fn
+        self.calls = 0
+        self.broken = False
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        if self.broken:
+            raise ConnectionError('database unavailable')
+        return self.request_fn(*args, **kwargs)
+
+
+@pytest.fixture
+def request_counter(request_fn):
+    return Counted(request_fn)
+
+
+def make_jobs(request_fn, compute=None, **options):
+    def record(user_id):
+        version = insight_jobs.load_latest(request_fn, user_id)[1]
+        return {'insights': {}, 'summary': {}, 'data_version': version, 'generated_at': 'now'}
+    return insight_jobs.InsightJobs(request_fn, compute or record, **options)
+
+
+def test_latest_without_insights(postgrest, request_counter):
+    jobs = make_jobs(request_counter)
+
+    assert jobs.latest('u1') == (None, False)
+    assert jobs.stats()['misses'] == 1
+
+
+def test_latest_reads_record_and_version_in_one_request(postgrest, request_counter, move_watermark):
+    move_watermark('u1')
+    jobs = make_jobs(request_counter)
+    stored = jobs.run_now('u1')
+
+    request_counter.calls = 0
+    record, fresh = jobs.latest('u1')
+
+    assert request_counter.calls == 1
+    assert fresh and record['data_version'] == stored['data_version'] != ''
+
+    move_watermark('u1')
+    record, fresh = jobs.latest('u1')
+    assert not fresh and record['data_version'] == stored['data_version']
+    assert (jobs.stats()['hits'], jobs.stats()['stale']) == (1, 1)
+
+
+def test_only_the_latest_record_is_kept(postgrest, request_fn, move_watermark):
+    jobs = make_jobs(request_fn)
+    jobs.run_now('u1')
+    move_watermark('u1')
+    jobs.run_now('u1')
+
+    assert len(postgrest.query(insight_jobs.INSIGHTS_TABLE, [('user_id', 'eq.u1')])) == 1
+    assert jobs.latest('u1')[1] is True
+
+
+def test_latest_falls_back_to_local_copy(postgrest, request_counter):
+    jobs = make_jobs(request_counter)
+    stored = jobs.run_now('u1')
+
+    request_counter.broken = True
+    record, fresh = jobs.latest('u1')
+
+    assert record == stored
+    assert fresh  # no version to compare against
+
+
+def test_failed_job_is_counted(postgrest, request_fn):
+    def compute(user_id):
+        raise RuntimeError('no data')
+
+    jobs = make_jobs(request_fn, compute, delay=0.0, max_delay=0.0, workers=1)
+    jobs.schedule('u1')
+
+    deadline = time.monotonic() + 5
+    while jobs.stats()['failures'] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert jobs.stats()['failures'] == 1
+    assert jobs.stats()['runs'] == 0
+
+
+def test_ai_insights_endpoint(client, app_module, postgrest, move_watermark, monkeypatch):
+    jobs = insight_jobs.InsightJobs(app_module.supabase_request, app_module._compute_insights)
+    scheduled = []
+    monkeypatch.setattr(jobs, 'schedule', scheduled.append)
+    monkeypatch.setattr(app_module, '_insight_jobs', jobs)
+    add_expenses(postgrest, 'u1', 3)
+    move_watermark('u1')
+
+    first = client.get('/api/ai-insights', headers=HEADERS).get_json()
+    assert first['stale'] is False and first['summary']['total_spent'] == 3.0
+
+    before = postgrest.request_count
+    second = client.get('/api/ai-insights', headers=HEADERS).get_json()
+    assert postgrest.request_count - before == 1
+    assert second['stale'] is False and second['data_version'] == first['data_version']
+
+    add_expenses(postgrest, 'u1', 1, start_day=20)
+    move_watermark('u1')
+    third = client.get('/api/ai-insights', headers=HEADERS).get_json()
+    assert third['stale'] is True and third['data_version'] == first['data_version']
+    assert scheduled == ['u1']
@@ -0,0 +1,55 @@
+import os
+from datetime import date
+
+import rollups
+from conftest import ROLLUP_TABLE, add_expenses
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'supabase', 'migrations')
+TODAY = date(2025, 1, 10)
+
+
+def trigger_rollups(user_id, expenses):
+    """Rollup rows as the expenses-table triggers leave them."""
+    table = {}
+    for expense in expenses:
+        day = expense['date']
+        for bucket, key in (('total', 'all'), ('month', day[:7]), ('category', expense['category']), ('day', day)):
+            cell = table.setdefault((bucket, key), [0.0, 0])
+            cell[0] += expense['amount']
+            cell[1] += 1
+    return [
+        {'user_id': user_id, 'bucket': bucket, 'bucket_key': key, 'amount': amount,
+         'tx_count': count, 'updated_at': '2025-01-10T00:00:00+00:00'}
+        for (bucket, key), (amount, count) in table.items()
+    ]
+
+
+def test_migration_versions_are_unique():
+    versions = [name.split('_', 1)[0] for name in os.listdir(MIGRATIONS) if name.endswith('.sql')]
+    assert len(versions) == len(set(versions))
+
+
+def test_dashboard_from_rollups_matches_full_scan(postgrest, request_fn):
+    expenses = add_expenses(postgrest, 'u1', 9)
+    expenses += add_expenses(postgrest, 'u1', 2, category='Travel')
+    add_expenses(postgrest, 'u2', 3)
+    postgrest.insert(ROLLUP_TABLE, trigger_rollups('u1', expenses))
+
+    assert rollups.dashboard_from_rollups(request_fn, 'u1', TODAY) == rollups.dashboard_from_expenses(expenses, TODAY)
+    assert rollups.check_user(request_fn, 'u1', TODAY) == []
+
+
+def test_dashboard_from_rollups_without_rollups(postgrest, request_fn):
+    assert rollups.dashboard_from_rollups(request_fn, 'u1', TODAY) is None
+
+
+def test_data_version_follows_total_bucket(postgrest, request_fn, move_watermark):
+    assert rollups.fetch_data_version(request_fn, 'u1') == ''
+
+    move_watermark('u1')
+    first = rollups.fetch_data_version(request_fn, 'u1')
+    move_watermark('u1')
+    second = rollups.fetch_data_version(request_fn, 'u1')
+
+    assert first and second and first != second
+    assert rollups.fetch_data_version(request_fn, 'u2') == ''
@@ -0,0 +1,323 @@
+"""
+Write-behind queue for expense inserts, backed by a local append-only journal.
+
+``submit`` appends the row to the worker's journal segment (fsynced), queues
+it in memory and returns; a background flusher sends queued rows to
+PostgREST as multi-row inserts once ``max_rows`` are waiting or the oldest
+has waited ``max_age`` seconds. After a successful flush the journal segments
+that held those rows are deleted.
+
+Every row carries an ``idempotency_key`` and inserts use
+``on_conflict=idempotency_key`` with ``resolution=ignore-duplicates``, so a
+row is stored once even if it is sent again. That makes recovery simple: a
+worker that starts up adopts journal segments no live process holds a lock
+on (left behind by a crash or restart) and queues their rows again.
+
+Only transient failures (5xx, 408/429, timeouts, connection errors) are
+retried. A chunk PostgREST rejects with any other 4xx is split in halves
+until the offending rows are isolated; those are appended to
+``rejected.jsonl`` in the journal directory with the error, and the rest
+are stored. Each chunk is handed to ``on_flushed`` as soon as it lands and
+is not sent again if a later chunk has to be retried.
+"""
+import os
+import glob
+import json
+import time
+import uuid
+import atexit
+import logging
+import tempfile
+import threading
+from collections import deque
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+EXPENSES_TABLE = 'app_7433469c6a_expenses'
+INSERT_ENDPOINT = f'{EXPENSES_TABLE}?on_conflict=idempotency_key'
+INSERT_HEADERS = {'Prefer': 'resolution=ignore-duplicates,return=representation'}
+REJECTED_FILE = 'rejected.jsonl'
+# Client errors that say "try again later" rather than "this row is wrong"
+_TRANSIENT_STATUSES = {408, 425, 429}
+
+
+def new_key():
+    return uuid.uuid4().hex
+
+
+def _rejected(exc):
+    """True when PostgREST refused the rows themselves, so sending them again cannot help."""
+    status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    return status is not None and 400 <= status < 500 and status not in _TRANSIENT_STATUSES
+
+
+class _Segment:
+    """One journal file, locked for as long as this process owns it."""
+
+    def __init__(self, path):
+        self.path = path
+        self.fh = open(path, 'a', encoding='utf-8')
+        if fcntl is not None:
+            fcntl.flock(self.fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def append(self, line, sync):
+        self.fh.write(line)
+        self.fh.flush()
+        if sync:
+            os.fsync(self.fh.fileno())
+
+    def discard(self):
+        self.fh.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class WriteBehindQueue:
+    """Journalled in-memory queue drained by one flusher thread per process."""
+
+    def __init__(self, request_fn, directory, max_rows=500, max_age=0.2, fsync=True,
+                 retry_seconds=1.0, on_flushed=None):
+        self.request_fn = request_fn
+        self.directory = directory
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.fsync = fsync
+        self.retry_seconds = retry_seconds
+        # Called with the rows of each chunk PostgREST actually inserted (duplicates excluded)
+        self.on_flushed = on_flushed
+        self._cond = threading.Condition()
+        self._pending = []  # (enqueued_at, row)
+        self._segment = None
+        self._sealed = []
+        self._seq = 0
+        self._pid = None
+        self._run_id = None
+        self._flush_ms = deque(maxlen=500)
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.duplicates = 0
+        self.failures = 0
+        self.rejected = 0
+        self.replayed = 0
+        self.last_error = None
+
+    # -- lifecycle ------------------------------------------------------
+    def _ensure_started(self):
+        # One journal and one flusher per worker process, started on first use
+        if self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._pending, self._sealed, self._seq = [], [], 0
+            # Pids are reused across container restarts; never reopen an old segment as our own
+            self._run_id = uuid.uuid4().hex[:8]
+            self._segment = self._open_segment()
+            self._pid = os.getpid()
+            self._adopt_orphans()
+        threading.Thread(target=self._run, name='write-behind-flusher', daemon=True).start()
+        atexit.register(self.drain, 10.0)
+
+    def _open_segment(self):
+        self._seq += 1
+        return _Segment(os.path.join(self.directory, f'journal-{os.getpid()}-{self._run_id}-{self._seq:06d}.jsonl'))
+
+    def _adopt_orphans(self):
+        """Queue rows from segments left by processes that are gone (called with the lock held)."""
+        for path in sorted(glob.glob(os.path.join(self.directory, 'journal-*.jsonl'))):
+            if path == self._segment.path:
+                continue
+            try:
+                fh = open(path, 'r+', encoding='utf-8')
+            except FileNotFoundError:
+                continue
+            try:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue  # a live worker still owns it
+                rows = []
+                for line in fh:
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError:
+                        # A torn final line from a crash mid-append was never acknowledged
+                        break
+                now = time.monotonic()
+                for row in rows:
+                    self._segment.append(json.dumps(row, separators=(',', ':')) + '\n', False)
+                    self._pending.append((now, row))
+                if rows:
+                    os.fsync(self._segment.fh.fileno())
+                    logger.info(f"Replaying {len(rows)} journalled expense(s) from {os.path.basename(path)}")
+                self.replayed += len(rows)
+                os.unlink(path)
+            finally:
+                fh.close()
+        if self._pending:
+            self._cond.notify()
+
+    # -- producer -------------------------------------------------------
+    def submit(self, row):
+        """Journal ``row`` (which must have an idempotency_key) and queue it for insertion."""
+        self._ensure_started()
+        line = json.dumps(row, separators=(',', ':')) + '\n'
+        with self._cond:
+            self._segment.append(line, self.fsync)
+            self._pending.append((time.monotonic(), row))
+            if len(self._pending) >= self.max_rows or len(self._pending) == 1:
+                self._cond.notify()
+
+    # -- consumer -------------------------------------------------------
+    def _due(self):
+        if not self._pending:
+            return None
+        if len(self._pending) >= self.max_rows:
+            return 0.0
+        return max(0.0, self._pending[0][0] + self.max_age - time.monotonic())
+
+    def _take(self):
+        """Seal the current segment and hand over every queued row (lock held)."""
+        batch = self._pending
+        self._pending = []
+        self._sealed.append(self._segment)
+        self._segment = self._open_segment()
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                wait = self._due()
+                while wait is None or wait > 0:
+                    self._cond.wait(timeout=wait)
+                    wait = self._due()
+                batch = self._take()
+            self._flush(batch)
+
+    def _flush(self, batch):
+        started = time.monotonic()
+        work = [batch[i:i + self.max_rows] for i in range(0, len(batch), self.max_rows)]
+        while work:
+            chunk = work.pop(0)
+            rows = [row for _, row in chunk]
+            try:
+                inserted = self.request_fn('POST', INSERT_ENDPOINT, rows, headers=INSERT_HEADERS) or []
+            except Exception as e:
+                if _rejected(e):
+                    if len(chunk) > 1:
+                        # Narrow down which rows are refused; the others still go in
+                        middle = len(chunk) // 2
+                        work[:0] = [chunk[:middle], chunk[middle:]]
+                    else:
+                        self._reject(rows[0], e)
+                    continue
+                remaining = chunk + [item for rest in work for item in rest]
+                self.failures += 1
+                self.last_error = str(e)
+                logger.warning(f"Write-behind flush of {len(remaining)} row(s) failed, retrying: {e}")
+                with self._cond:
+                    # Keep arrival order; sealed segments stay on disk until a flush succeeds
+                    self._pending = remaining + self._pending
+                time.sleep(self.retry_seconds)
+                return False
+            with self._cond:
+                self.flushed_rows += len(rows)
+                self.duplicates += len(rows) - len(inserted)
+            if self.on_flushed and inserted:
+                try:
+                    self.on_flushed(inserted)
+                except Exception as e:
+                    logger.warning(f"Write-behind post-flush hook failed: {e}")
+        elapsed_ms = (time.monotonic() - started) * 1000.0
+        with self._cond:
+            sealed, self._sealed = self._sealed, []
+            self.flushes += 1
+            self._flush_ms.append(elapsed_ms)
+            self._cond.notify_all()
+        for segment in sealed:
+            segment.discard()
+        return True
+
+    def _reject(self, row, exc):
+        """Set aside a row PostgREST refused; it was acknowledged, so it must not vanish silently."""
+        detail = getattr(getattr(exc, 'response', None), 'text', '') or str(exc)
+        logger.error(f"Write-behind row {row.get('idempotency_key')} rejected, moved to {REJECTED_FILE}: {detail[:500]}")
+        record = json.dumps({'rejected_at': time.time(), 'error': detail[:2000], 'row': row}, separators=(',', ':'))
+        try:
+            # One write per line with O_APPEND, so workers sharing the directory do not interleave
+            fd = os.open(os.path.join(self.directory, REJECTED_FILE), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, (record + '\n').encode('utf-8'))
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logger.error(f"Could not record rejected write-behind row: {e}; row was {record}")
+        with self._cond:
+            self.rejected += 1
+
+    def drain(self, timeout=10.0):
+        """Wait until everything queued so far has been flushed, up to ``timeout`` seconds."""
+        if self._pid != os.getpid():
+            return True
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify()
+            while self._pending or self._sealed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(timeout=remaining)
+        return True
+
+    def stats(self):
+        with self._cond:
+            depth = len(self._pending)
+            oldest = time.monotonic() - self._pending[0][0] if self._pending else None
+            samples = sorted(self._flush_ms)
+            segments = len(self._sealed) + (1 if self._segment else 0)
+
+        def pct(p):
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, max(0, int(round(p / 100.0 * len(samples))) - 1))], 2)
+
+        return {
+            'enabled': True,
+            'queue_depth': depth,
+            'oldest_pending_ms': round(oldest * 1000.0, 1) if oldest is not None else None,
+            'journal_segments': segments,
+            'flushes': self.flushes,
+            'flushed_rows': self.flushed_rows,
+            'duplicates_skipped': self.duplicates,
+            'failures': self.failures,
+            'rejected': self.rejected,
+            'replayed': self.replayed,
+            'last_error': self.last_error,
+            'flush_latency_p50_ms': pct(50),
+            'flush_latency_p99_ms': pct(99),
+            'max_rows': self.max_rows,
+            'max_age_ms': round(self.max_age * 1000.0, 1),
+        }
+
+
+def from_env(request_fn, on_flushed=None):
+    """The queue configured by WRITE_BEHIND_* variables, or None when write-behind is off."""
+    if os.getenv('WRITE_BEHIND', '').lower() not in ('1', 'true', 'yes', 'on'):
+        return None
+    return WriteBehindQueue(
+        request_fn,
+        os.getenv('WRITE_BEHIND_DIR', os.path.join(tempfile.gettempdir(), 'aureus-journal')),
+        max_rows=int(os.getenv('WRITE_BEHIND_MAX_ROWS', '500')),
+        max_age=int(os.getenv('WRITE_BEHIND_MAX_AGE_MS', '200')) / 1000.0,
+        fsync=os.getenv('WRITE_BEHIND_FSYNC', '1').lower() not in ('0', 'false', 'no', 'off'),
+        on_flushed=on_flushed,
+    )